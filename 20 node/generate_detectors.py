@@ -0,0 +1,108 @@
+import os
+import sys
+import xml.etree.ElementTree as ET
+
+# Input/Output Files: mỗi file mạng có file detector riêng (ID làn khác nhau giữa hai mạng).
+# Không đăng ký vào 20e.sumocfg vì các chương trình chạy cfg đó với --net-file khác;
+# truyền file detector khớp với mạng qua --additional-files.
+NET_DETECTOR_FILES = [
+    (r"C:\Users\Admin\Downloads\sumo test\New folder\20 node\20e.net.xml",
+     r"C:\Users\Admin\Downloads\sumo test\New folder\20 node\20e.det.add.xml"),
+    (r"C:\Users\Admin\Downloads\sumo test\New folder\20 node\20e_with_tls.net.xml",
+     r"C:\Users\Admin\Downloads\sumo test\New folder\20 node\20e_with_tls.det.add.xml"),
+]
+sumocfgfile = None
+
+# Detector geometry (meters) and output
+STOP_LINE_DISTANCE = 1.0    # Khoảng cách từ cuối detector tới vạch dừng
+DETECTOR_LENGTH = 50.0      # Chiều dài tối đa, bị cắt theo chiều dài làn
+MIN_DETECTOR_LENGTH = 5.0   # Làn ngắn hơn mức này vẫn có detector phủ toàn bộ làn
+PERIOD = 60                 # Chu kỳ ghi output (s)
+OUTPUT_FILE = "e2_output.xml"
+DETECTOR_PREFIX = "e2_"
+
+
+def scan_controlled_lanes(path):
+    """
+    Stream the net file once and return {lane_id: (tl_id, length)} for every incoming
+    lane controlled by a traffic light (internal lanes excluded).
+    """
+    lengths = {}
+    controlled = {}
+    context = ET.iterparse(path, events=('start', 'end'))
+    _, root = next(context)
+    for event, elem in context:
+        if event != 'end':
+            continue
+        if elem.tag == 'edge':
+            if elem.get('function') is None:
+                for lane in elem.findall('lane'):
+                    lengths[lane.get('id')] = float(lane.get('length', 0))
+            root.clear()
+        elif elem.tag == 'connection':
+            tl = elem.get('tl')
+            if tl is not None:
+                controlled.setdefault(f"{elem.get('from')}_{elem.get('fromLane')}", tl)
+            root.clear()
+        elif elem.tag in ('junction', 'tlLogic', 'type', 'roundabout', 'location'):
+            root.clear()
+    return {lane: (tl, lengths[lane]) for lane, tl in controlled.items() if lane in lengths}
+
+
+def detector_span(lane_length, distance=STOP_LINE_DISTANCE, length=DETECTOR_LENGTH):
+    """(pos, length) of a detector ending `distance` m before the stop line, clipped to the lane."""
+    end = lane_length - distance
+    if end < MIN_DETECTOR_LENGTH:
+        end = lane_length
+    pos = max(0.0, end - length)
+    return round(pos, 2), round(end - pos, 2)
+
+
+def generate(net_path, det_path, distance=STOP_LINE_DISTANCE, length=DETECTOR_LENGTH,
+             period=PERIOD, output=OUTPUT_FILE):
+    lanes = scan_controlled_lanes(net_path)
+    with open(det_path, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write('<additional>\n')
+        for lane_id in sorted(lanes):
+            tl_id, lane_length = lanes[lane_id]
+            pos, det_length = detector_span(lane_length, distance, length)
+            f.write(f'    <laneAreaDetector id="{DETECTOR_PREFIX}{lane_id}" lane="{lane_id}" pos="{pos}" '
+                    f'length="{det_length}" period="{period}" file="{output}"/>  <!-- {tl_id} -->\n')
+        f.write('</additional>\n')
+    return len(lanes)
+
+
+def register_additional(sumocfg_path, det_path):
+    """Add det_path to the <additional-files> of a .sumocfg (kept relative to it), once."""
+    tree = ET.parse(sumocfg_path)
+    root = tree.getroot()
+    inputs = root.find('input')
+    if inputs is None:
+        inputs = ET.SubElement(root, 'input')
+    name = os.path.relpath(os.path.abspath(det_path), os.path.dirname(os.path.abspath(sumocfg_path)))
+    node = inputs.find('additional-files')
+    if node is None:
+        last = inputs[-1] if len(inputs) else None
+        node = ET.SubElement(inputs, 'additional-files', value='')
+        if last is not None:
+            # Giữ nguyên thụt lề của file cấu hình
+            node.tail, last.tail = last.tail, inputs.text
+    files = [p for p in node.get('value', '').replace(',', ' ').split() if p]
+    if name not in files:
+        node.set('value', ','.join(files + [name]))
+        tree.write(sumocfg_path, encoding='UTF-8', xml_declaration=True)
+    return name
+
+
+if __name__ == "__main__":
+    # Tùy chọn: python generate_detectors.py <net.xml> <det.add.xml> [sumocfg]
+    pairs = NET_DETECTOR_FILES
+    if len(sys.argv) >= 3:
+        pairs = [(sys.argv[1], sys.argv[2])]
+        sumocfgfile = sys.argv[3] if len(sys.argv) >= 4 else None
+    for netfile, detfile in pairs:
+        count = generate(netfile, detfile)
+        print(f"Generated {detfile} with {count} lane area detectors.")
+        if sumocfgfile:
+            print(f"Registered {register_additional(sumocfgfile, detfile)} in {sumocfgfile}")
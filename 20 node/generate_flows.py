@@ -1,43 +1,142 @@
+import os
+import sys
+import itertools
 import xml.etree.ElementTree as ET
-import random
+
+import numpy as np
 
 netfile = r"C:\Users\Admin\Downloads\sumo test\New folder\20 node\20e.net.xml"
 routefile = r"C:\Users\Admin\Downloads\sumo test\New folder\20 node\flows.rou.xml"
 
 # Parameters
-normal_rate = 300
-congested_rate = 30
-normal_duration = 1800
-congested_duration = 1800
-congested_start = 1800
-
-# Parse network to get edge IDs
-tree = ET.parse(netfile)
-root = tree.getroot()
-
-edges = []
-for edge in root.findall('edge'):
-    if edge.get('function') is None:
-        edges.append(edge.get('id'))
-
-with open(routefile, "w") as f:
-    f.write('<routes>\n')
-    f.write('  <vType id="car" accel="1.0" decel="4.5" sigma="0.5" length="5" maxSpeed="13.89" color="1,0,0"/>\n')
-
-    # Normal flows
-    for i, edge_id in enumerate(edges):
-        # pick a random destination edge for each flow that is not the same as the source
-        to_edge = edge_id
-        while to_edge == edge_id:
-            to_edge = random.choice(edges)
-        f.write(f'  <flow id="normal_{edge_id}" type="car" from="{edge_id}" to="{to_edge}" begin="0" end="{normal_duration}" period="{normal_rate}" />\n')
-
-    # Congested flows
-    for i, edge_id in enumerate(edges):
-        to_edge = edge_id
-        while to_edge == edge_id:
-            to_edge = random.choice(edges)
-        f.write(f'  <flow id="congested_{edge_id}" type="car" from="{edge_id}" to="{to_edge}" begin="{congested_start}" end="{congested_start+congested_duration}" period="{congested_rate}" />\n')
-
-    f.write('</routes>\n')
-print(f"Generated {routefile} with flows for {len(edges)} edges.")
\ No newline at end of file
+SEED = 42
+WRITE_BUFFER = 1 << 20
+
+# Demand profile: (name, begin, end, period) - one flow per edge and block,
+# period = seconds between vehicles (smaller = heavier demand)
+DEMAND_PROFILE = [
+    ('normal', 0, 1800, 300),
+    ('congested', 1800, 3600, 30),
+]
+
+# Hệ số nhu cầu theo giờ trong ngày (1.0 = base_period), cao điểm sáng và chiều
+DAY_FACTORS = [0.2, 0.1, 0.1, 0.1, 0.2, 0.5, 1.2, 2.5, 3.0, 1.8, 1.2, 1.1,
+               1.3, 1.2, 1.1, 1.3, 1.8, 2.8, 3.0, 2.0, 1.2, 0.8, 0.5, 0.3]
+
+VTYPE = '  <vType id="car" accel="1.0" decel="4.5" sigma="0.5" length="5" maxSpeed="13.89" color="1,0,0"/>\n'
+
+
+def load_edges(path):
+    """
+    Stream the net and return the non-internal edges as arrays: id, lanes, speed,
+    length and priority (for weighting origins / destinations).
+    """
+    ids, lanes, speed, length, priority = [], [], [], [], []
+    context = ET.iterparse(path, events=('start', 'end'))
+    _, root = next(context)
+    for event, elem in context:
+        if event != 'end' or elem.tag != 'edge':
+            continue
+        if elem.get('function') is None:
+            edge_lanes = elem.findall('lane')
+            ids.append(elem.get('id'))
+            lanes.append(len(edge_lanes))
+            speed.append(float(edge_lanes[0].get('speed', 13.89)) if edge_lanes else 13.89)
+            length.append(float(edge_lanes[0].get('length', 0)) if edge_lanes else 0.0)
+            priority.append(float(elem.get('priority', 1)))
+        root.clear()
+    return {'id': np.array(ids, dtype=object), 'lanes': np.array(lanes, dtype=np.float64),
+            'speed': np.array(speed), 'length': np.array(length), 'priority': np.array(priority)}
+
+
+def edge_weights(edges, by=None):
+    """Sampling weights per edge: None (uniform), 'lanes', 'length', 'priority' or 'capacity' (lanes x speed)."""
+    if by is None:
+        return None
+    if by == 'capacity':
+        w = edges['lanes'] * edges['speed']
+    else:
+        w = np.asarray(edges[by], dtype=np.float64)
+    w = np.clip(w - min(w.min(), 0), 0, None) + 1e-9
+    return w / w.sum()
+
+
+def sample_destinations(n, size, rng, weights=None):
+    """
+    Destination index for each of n origins, `size` times (shape (size, n)), never equal
+    to the origin. Uniform draws skip the origin by shifting; weighted draws resample
+    only the collisions.
+    """
+    origins = np.broadcast_to(np.arange(n), (size, n))
+    if weights is None:
+        dest = rng.integers(n - 1, size=(size, n))
+        return dest + (dest >= origins)
+    dest = rng.choice(n, size=(size, n), p=weights)
+    clash = dest == origins
+    while clash.any():
+        dest[clash] = rng.choice(n, size=int(clash.sum()), p=weights)
+        clash = dest == origins
+    return dest
+
+
+def day_profile(base_period=300, factors=DAY_FACTORS, hour=3600, start_hour=0, hours=None):
+    """Time-of-day profile: one block per hour with period = base_period / factor."""
+    hours = len(factors) if hours is None else hours
+    profile = []
+    for h in range(hours):
+        factor = factors[(start_hour + h) % len(factors)]
+        if factor > 0:
+            profile.append((f"h{(start_hour + h) % 24:02d}", h * hour, (h + 1) * hour, round(base_period / factor, 2)))
+    return profile
+
+
+def generate_flows(edges, path, profile=DEMAND_PROFILE, seed=SEED, weight_by=None, origin_by=None):
+    """
+    Write one flow per (origin edge, profile block) to path. Destinations for all
+    blocks are sampled in one vectorized call; origin_by optionally scales each
+    origin's period by its relative weight (heavier edges emit more vehicles).
+    """
+    rng = np.random.default_rng(seed)
+    ids = edges['id']
+    n = len(ids)
+    dest = sample_destinations(n, len(profile), rng, edge_weights(edges, weight_by))
+    origin_scale = np.ones(n)
+    if origin_by is not None:
+        origin_scale = edge_weights(edges, origin_by) * n
+
+    lines = ['<routes>\n', VTYPE]
+    for b, (name, begin, end, period) in enumerate(profile):
+        periods = period / origin_scale
+        lines.extend(
+            f'  <flow id="{name}_{o}" type="car" from="{o}" to="{d}" begin="{begin}" end="{end}" period="{p:g}" />\n'
+            for o, d, p in zip(ids, ids[dest[b]], periods))
+    lines.append('</routes>\n')
+    with open(path, "w", buffering=WRITE_BUFFER) as f:
+        f.writelines(lines)
+    return path
+
+
+def generate_variants(net_path, output_dir, seeds=(SEED,), profiles=None, weight_by=(None,)):
+    """
+    Route files for every combination of seed x profile x weighting, parsing the net
+    only once. profiles: {name: profile}; returns the written paths (usable as
+    scenario_batch --route-files).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    edges = load_edges(net_path)
+    profiles = profiles or {'base': DEMAND_PROFILE}
+    paths = []
+    for seed, (profile_name, profile), weight in itertools.product(seeds, profiles.items(), weight_by):
+        name = f"flows_{profile_name}_{weight or 'uniform'}_s{seed}.rou.xml"
+        paths.append(generate_flows(edges, os.path.join(output_dir, name), profile, seed, weight))
+    return paths
+
+
+if __name__ == "__main__":
+    # Tùy chọn: python generate_flows.py <net.xml> <rou.xml> [seed]
+    if len(sys.argv) >= 3:
+        netfile, routefile = sys.argv[1], sys.argv[2]
+    seed = int(sys.argv[3]) if len(sys.argv) >= 4 else SEED
+    edges = load_edges(netfile)
+    generate_flows(edges, routefile, seed=seed)
+    print(f"Generated {routefile} with flows for {len(edges['id'])} edges.")
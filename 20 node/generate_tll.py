@@ -1,31 +1,112 @@
+import sys
+import math
 import xml.etree.ElementTree as ET
 
 # Input/Output Files
 netfile = r"C:\Users\Admin\Downloads\sumo test\New folder\20 node\20e.net.xml"
 tllfile = r"C:\Users\Admin\Downloads\sumo test\New folder\20 node\20e.tll.xml"
 
-# Parse the network file
-tree = ET.parse(netfile)
-root = tree.getroot()
-
-# Find all junctions of type traffic_light
-junctions = []
-for node in root.findall('junction'):
-    if node.get('type') == 'traffic_light':
-        junctions.append(node.get('id'))
-
-# Write the TLL file
-with open(tllfile, "w") as f:
-    f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-    f.write('<tlLogics>\n')
-    for jid in junctions:
-        f.write(f'    <tlLogic id="{jid}" type="static" programID="0" offset="0">\n')
-        # You may want to adjust the state length (here: 4 signals, common for 4-arm intersections)
-        f.write('        <phase duration="30" state="GrGr"/>\n')
-        f.write('        <phase duration="5" state="yryr"/>\n')
-        f.write('        <phase duration="30" state="rGrG"/>\n')
-        f.write('        <phase duration="5" state="ryry"/>\n')
-        f.write('    </tlLogic>\n')
-    f.write('</tlLogics>\n')
-
-print(f"Generated {tllfile} with {len(junctions)} traffic lights.")
\ No newline at end of file
+# Phase durations (seconds)
+GREEN_TIME = 30
+YELLOW_TIME = 5
+ALL_RED_TIME = 0        # > 0 adds an all-red phase after each yellow
+
+# Turns that must yield to oncoming traffic get a minor green ('g')
+PERMISSIVE_DIRS = ('l', 'L', 't')
+AXIS_TOLERANCE = 45     # Degrees: approaches within this of the main axis share a phase
+
+
+def _heading(shape):
+    """Heading in degrees of the last segment of a lane shape 'x1,y1 x2,y2 ...'."""
+    points = [tuple(map(float, p.split(','))) for p in shape.split()]
+    (x1, y1), (x2, y2) = points[-2], points[-1]
+    return math.degrees(math.atan2(y2 - y1, x2 - x1)) % 360
+
+
+def scan_network(path):
+    """
+    Stream the net file once and return {tl_id: {link_index: (from_edge, dir)}} and
+    {edge_id: heading}. Elements are cleared as soon as they are read, so memory
+    grows with the number of signals and edges, not with the size of the XML tree.
+    """
+    headings = {}
+    links = {}
+    context = ET.iterparse(path, events=('start', 'end'))
+    _, root = next(context)
+    for event, elem in context:
+        if event != 'end':
+            continue
+        if elem.tag == 'edge':
+            if elem.get('function') is None:
+                lane = elem.find('lane')
+                if lane is not None and lane.get('shape'):
+                    headings[elem.get('id')] = _heading(lane.get('shape'))
+            root.clear()
+        elif elem.tag == 'connection':
+            tl = elem.get('tl')
+            if tl is not None:
+                links.setdefault(tl, {})[int(elem.get('linkIndex'))] = (elem.get('from'), elem.get('dir', 's'))
+            root.clear()
+        elif elem.tag in ('junction', 'tlLogic', 'type', 'roundabout', 'location'):
+            root.clear()
+    return links, headings
+
+
+def approach_groups(edges, headings):
+    """
+    Split incoming edges into phase groups by axis: edges within AXIS_TOLERANCE of the
+    first edge's axis (either direction) form one group, the rest the other. Edges
+    without geometry get a group of their own.
+    """
+    known = [e for e in edges if e in headings]
+    if not known:
+        return [[e] for e in edges]
+    axis = headings[known[0]] % 180
+    main, cross = [], []
+    for edge in known:
+        diff = abs((headings[edge] % 180) - axis)
+        (main if min(diff, 180 - diff) < AXIS_TOLERANCE else cross).append(edge)
+    groups = [g for g in (main, cross) if g]
+    groups += [[e] for e in edges if e not in headings]
+    return groups
+
+
+def build_phases(tl_links, headings):
+    """Phases [(duration, state)] with one green / yellow (/ all-red) block per approach group."""
+    n_links = max(tl_links) + 1
+    edges = sorted({edge for edge, _ in tl_links.values()})
+    phases = []
+    for group in approach_groups(edges, headings):
+        green = ['r'] * n_links
+        yellow = ['r'] * n_links
+        for index, (edge, direction) in tl_links.items():
+            if edge in group:
+                green[index] = 'g' if direction in PERMISSIVE_DIRS else 'G'
+                yellow[index] = 'y'
+        phases.append((GREEN_TIME, ''.join(green)))
+        phases.append((YELLOW_TIME, ''.join(yellow)))
+        if ALL_RED_TIME > 0:
+            phases.append((ALL_RED_TIME, 'r' * n_links))
+    return phases
+
+
+def generate(net_path, tll_path):
+    links, headings = scan_network(net_path)
+    with open(tll_path, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write('<tlLogics>\n')
+        for tl_id in sorted(links):
+            f.write(f'    <tlLogic id="{tl_id}" type="static" programID="0" offset="0">\n')
+            for duration, state in build_phases(links[tl_id], headings):
+                f.write(f'        <phase duration="{duration}" state="{state}"/>\n')
+            f.write('    </tlLogic>\n')
+        f.write('</tlLogics>\n')
+    return len(links)
+
+
+if __name__ == "__main__":
+    # Tùy chọn: python generate_tll.py <net.xml> <tll.xml>
+    if len(sys.argv) == 3:
+        netfile, tllfile = sys.argv[1], sys.argv[2]
+    count = generate(netfile, tllfile)
+    print(f"Generated {tllfile} with {count} traffic lights.")
@@ -29,21 +29,29 @@ MAX_WAIT_TIME = 120
 LANE_SCORE_WEIGHTS = {'w1': 0.55, 'w2': 0.3, 'w3': 0.1, 'w4': 0.05}
 STATUS_WEIGHTS = {'w1': 0.8, 'w2': 0.2}
 
+# E2 detectors for 20e.net.xml, next to the .sumocfg and loaded with --additional-files
+DETECTOR_FILE = "20e.det.add.xml"
+
 def start_sumo(sumo_config_path):
     sumoBinary = os.path.join(os.environ['SUMO_HOME'], 'bin/sumo-gui')
     if not os.path.exists(sumo_config_path):
         print(f"Error: SUMO config file not found at '{sumo_config_path}'")
         sys.exit(1)
     sumoCmd = [sumoBinary, '-c', sumo_config_path, '--step-length', '0.1']
+    detector_file = os.path.join(os.path.dirname(sumo_config_path), DETECTOR_FILE)
+    if os.path.exists(detector_file):
+        sumoCmd += ['--additional-files', detector_file]
     traci.start(sumoCmd)
 
 def auto_detect_intersection_structure():
     tl_ids = traci.trafficlight.getIDList()
     lane_ids = traci.lane.getIDList()
+    detector_lanes = {det_id: traci.lanearea.getLaneID(det_id) for det_id in traci.lanearea.getIDList()}
     intersection_data = {}
     for tl_id in tl_ids:
         controlled_links = traci.trafficlight.getControlledLinks(tl_id)
         controlled_lanes = traci.trafficlight.getControlledLanes(tl_id)
+        lane_to_detector = {lane: det_id for det_id, lane in detector_lanes.items() if lane in controlled_lanes}
         approaches = {}
         for lane_id in set(controlled_lanes):
             if ':' not in lane_id:
@@ -56,19 +64,29 @@ def auto_detect_intersection_structure():
             'approaches': approaches,
             'controlled_links': controlled_links,
             'controlled_lanes': controlled_lanes,
+            'lane_to_detector': lane_to_detector,
             'total_approaches': len(approaches),
             'total_lanes': len(set(controlled_lanes))
         }
     return intersection_data
 
-def get_lane_metrics(lane_id):
-    """Get metrics for a lane using TraCI APIs."""
+def get_lane_metrics(lane_id, detector_id=None):
+    """
+    Get metrics for a lane: Q and D from the E2 detector if available, else from the lane.
+    W is the mean waiting time of the lane's halting vehicles on both paths (lane aggregates).
+    """
     try:
-        vehicles = traci.lane.getLastStepVehicleIDs(lane_id)
-        vehicle_count = len(vehicles)
+        if detector_id:
+            # E2 detector: fixed number of calls per lane, none per vehicle
+            vehicle_count = traci.lanearea.getLastStepVehicleNumber(detector_id)
+            D = traci.lanearea.getLastStepOccupancy(detector_id) / 100.0
+        else:
+            vehicle_count = traci.lane.getLastStepVehicleNumber(lane_id)
+            D = traci.lane.getLastStepOccupancy(lane_id) / 100.0
+        # Same W on both paths, from lane aggregates (the detector only covers the end of the lane)
+        halting = traci.lane.getLastStepHaltingNumber(lane_id)
+        W = traci.lane.getWaitingTime(lane_id) / halting if halting else 0
         Q = vehicle_count
-        W = max([traci.vehicle.getWaitingTime(veh) for veh in vehicles]) if vehicles else 0
-        D = traci.lane.getLastStepOccupancy(lane_id) / 100.0
         F = vehicle_count * 360
         # Downstream congestion detection
         downstream = traci.lane.getLinks(lane_id)
@@ -118,8 +136,9 @@ def aggregate_approach_priorities(intersection_data, tl_id):
     for approach_name, approach_data in approaches.items():
         lane_scores = []
         congestion_detected = False
+        lane_to_detector = intersection_data[tl_id].get('lane_to_detector', {})
         for lane_id in approach_data['lanes']:
-            metrics = get_lane_metrics(lane_id)
+            metrics = get_lane_metrics(lane_id, lane_to_detector.get(lane_id))
             score = calculate_lane_score(metrics)
             lane_scores.append(score)
             congestion_detected = congestion_detected or metrics['congestion']
@@ -1,51 +1,12 @@
-import traci
-import csv
+from dataset_exporter import export_edges
 
 SUMO_CFG = r"C:\\Users\\Admin\\Downloads\\sumo test\\dataset.sumocfg"
 base_output = r"C:\\Users\\Admin\\Downloads\\sumo test\\dataset"
 input_edges = ["E1-3", "E2-3", "E4-3", "E5-3"]
+SAMPLE_INTERVAL = 30  # Số bước giữa hai lần lấy mẫu
+CHECKPOINT_DIR = base_output + "_checkpoint"  # Chạy lại sau sự cố sẽ tiếp tục từ checkpoint cuối
 
 if __name__ == "__main__":
-    traci.start(["sumo", "-c", SUMO_CFG])
-    csvfiles = []
-    writers = []
-    # Tạo 4 file và 4 writer, lưu vào list
-    for i in range(4):
-        csvfile = open(f"{base_output}{i+1}.csv", 'w', newline='')
-        writer = csv.writer(csvfile, delimiter=';')
-        writer.writerow([
-            "step", "queue", "waitingTime", "avgSpeed", "density", "outflow", "greenTime", "redTime", "cycleTime"
-        ])
-        csvfiles.append(csvfile)   # <--- thêm vào list
-        writers.append(writer)     # <--- thêm vào list
-    for step in range(600):
-        traci.simulationStep()
-        if step % 30 != 0:
-            continue
-        tlsID = traci.trafficlight.getIDList()[0]
-        logic = traci.trafficlight.getCompleteRedYellowGreenDefinition(tlsID)[0]
-        phases = logic.getPhases()
-        greenTime = sum(ph.duration for ph in phases if "G" in ph.state)
-        redTime = sum(ph.duration for ph in phases if "r" in ph.state or "R" in ph.state)
-        cycleTime = sum(ph.duration for ph in phases)
-        # Ghi cho từng hướng vào từng file
-        for i, edge in enumerate(input_edges):
-            queue = traci.lane.getLastStepHaltingNumber(edge + "_0")
-            waitTime = traci.lane.getWaitingTime(edge + "_0")
-            avgSpeed = traci.lane.getLastStepMeanSpeed(edge + "_0")
-            total_vehicles = traci.lane.getLastStepVehicleNumber(edge + "_0")
-            length = traci.lane.getLength(edge + "_0")
-            density = total_vehicles / length if length > 0 else 0
-            outflow = total_vehicles
-            writers[i].writerow([
-                step,
-                queue,
-                waitTime,
-                str(f"{avgSpeed:.6f}").replace('.', ','),  # Đổi dấu chấm thành dấu phẩy
-                str(f"{density:.6f}").replace('.', ','),
-                outflow,greenTime,redTime,cycleTime
-                ])
-    # Đóng tất cả file
-    for csvfile in csvfiles:
-        csvfile.close()
-    traci.close()
\ No newline at end of file
+    # Ghi cho từng hướng vào từng file (dataset1.csv ... dataset4.csv), giữ cột gốc cho dataset2/3.py
+    export_edges(SUMO_CFG, input_edges, base_output, steps=600, sample_interval=SAMPLE_INTERVAL,
+                 checkpoint_dir=CHECKPOINT_DIR, legacy=True)
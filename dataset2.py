@@ -1,27 +1,27 @@
-import pandas as pd
+from dataset_io import read_dataset_csv, per_step
 
-# Đọc dữ liệu như bạn đã làm
+# Đọc dữ liệu: read_dataset_csv bỏ đơn vị trong tên cột ('queue(xe)' -> 'queue') và xử lý dấu phẩy thập phân,
+# per_step gộp các làn của cùng một bước (file xuất theo làn) thành một dòng
 dfs = [
-    pd.read_csv(r"C:\Users\Admin\Downloads\sumo test\New folder\dataset1.csv", delimiter=';'),
-    pd.read_csv(r"C:\Users\Admin\Downloads\sumo test\New folder\dataset2.csv", delimiter=';'),
-    pd.read_csv(r"C:\Users\Admin\Downloads\sumo test\New folder\dataset3.csv", delimiter=';'),
-    pd.read_csv(r"C:\Users\Admin\Downloads\sumo test\New folder\dataset4.csv", delimiter=';')
+    per_step(read_dataset_csv(r"C:\Users\Admin\Downloads\sumo test\New folder\dataset1.csv")),
+    per_step(read_dataset_csv(r"C:\Users\Admin\Downloads\sumo test\New folder\dataset2.csv")),
+    per_step(read_dataset_csv(r"C:\Users\Admin\Downloads\sumo test\New folder\dataset3.csv")),
+    per_step(read_dataset_csv(r"C:\Users\Admin\Downloads\sumo test\New folder\dataset4.csv"))
 ]
 
 # Số bước cuối cùng dùng để tính trung bình (có thể thay đổi)
 num_last_steps = 5
 
 # Lấy cycleTime và greenTime hiện tại (giả sử giống nhau ở các hướng)
-cycle_time = dfs[0]['cycleTime'].iloc[-1]
+cycle_time = dfs[0]['cycleTime'][-1]
 num_directions = 4
 
 # Tính toán chỉ số trung bình trên các bước cuối cho mỗi hướng
 stats = []
 for i, df in enumerate(dfs):
-    last = df.tail(num_last_steps)
-    avg_queue = last['queue'].mean()
-    avg_waiting = last['waitingTime'].mean()
-    avg_outflow = last['outflow'].mean()
+    avg_queue = df['queue'][-num_last_steps:].mean()
+    avg_waiting = df['waitingTime'][-num_last_steps:].mean()
+    avg_outflow = df['outflow'][-num_last_steps:].mean()
     stats.append({'dir': i+1, 'avg_queue': avg_queue, 'avg_waiting': avg_waiting, 'avg_outflow': avg_outflow})
 
 # Tính điểm ùn tắc (có thể điều chỉnh trọng số cho phù hợp mục tiêu)
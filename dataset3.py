@@ -1,17 +1,22 @@
-import pandas as pd
-import matplotlib.pyplot as plt
 import os
 
+from dataset_io import read_dataset_csv, per_step
+from plotting import pyplot, downsample
+
 # Đường dẫn thư mục chứa các file CSV
 folder = r"C:\Users\Admin\Downloads\sumo test\New folder"
 filenames = [f"dataset{i+1}.csv" for i in range(4)]
 labels = ["Hướng 1", "Hướng 2", "Hướng 3", "Hướng 4"]
+output = os.path.join(folder, "so_sanh_huong.png")
 
+plt = pyplot()
 plt.figure(figsize=(10,6))
 for i, fname in enumerate(filenames):
     path = os.path.join(folder, fname)
-    df = pd.read_csv(path, delimiter=';')
-    plt.plot(df['step'], df['waitingTime'], label=labels[i])
+    df = per_step(read_dataset_csv(path))
+    # Giảm mẫu LTTB để vẽ nhanh với chuỗi dài mà vẫn giữ các đỉnh
+    step, series = downsample(df['step'], {'waitingTime': df['waitingTime']})
+    plt.plot(step, series['waitingTime'], label=labels[i])
 
 plt.xlabel('step (bước mô phỏng)')
 plt.ylabel('queue (độ dài hàng đợi)')
@@ -19,4 +24,5 @@ plt.title('So sánh độ dài hàng đợi (queue) của 4 hướng giao thông
 plt.legend()
 plt.grid(True)
 plt.tight_layout()
-plt.show()
\ No newline at end of file
+plt.savefig(output, dpi=150)
+print(f"Đã lưu biểu đồ: {output}")
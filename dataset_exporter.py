@@ -0,0 +1,509 @@
+import os
+import sys
+import json
+import subprocess
+import multiprocessing as mp
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+if 'SUMO_HOME' in os.environ:
+    tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
+    sys.path.append(tools)
+else:
+    sys.exit("Vui lòng khai báo biến môi trường 'SUMO_HOME'")
+
+import traci
+from traci import constants as tc
+
+from dataset_io import HEADER, LEGACY_HEADER, BufferedSampleWriter, ColumnarWriter, concat_datasets
+
+# ====== CONFIGURATION ======
+SAMPLE_INTERVAL = 30    # Số bước mô phỏng giữa hai lần lấy mẫu (30 bước = 3 s với step-length 0.1)
+
+LANE_VARS = [tc.LAST_STEP_VEHICLE_HALTING_NUMBER, tc.VAR_WAITING_TIME,
+             tc.LAST_STEP_MEAN_SPEED, tc.LAST_STEP_VEHICLE_NUMBER]
+
+# Định dạng dài toàn mạng: một dòng cho mỗi (thời điểm, làn được điều khiển)
+NETWORK_HEADER = ["time(s)", "tls", "edge", "lane_id", "queue(xe)", "waitingTime(s)", "avgSpeed(m/s)",
+                  "density(m)", "outflow(xe)", "greenTime(s)", "redTime(s)", "cycleTime(s)"]
+
+CHECKPOINT_INTERVAL = 100   # Số bước giữa hai checkpoint (saveState + vị trí ghi của writer), nhỏ hơn độ dài một lần chạy
+CHECKPOINT_FILE = "checkpoint.json"
+
+GREEN_CHARS = ('G', 'g')
+RED_CHARS = ('r', 'R')
+
+
+class PlanStatsCache:
+    """
+    Green, red and cycle time per signal index of each traffic light's active program.
+    The program ID is watched through a subscription (read locally, no round trip) and
+    the statistics are keyed on it: the logic is fetched with getAllProgramLogics only
+    when a light switches program. A caller that changes a running program's logic
+    (setProgramLogic, setPhaseDuration, TimingPlan.apply) calls invalidate(tls_id).
+    """
+
+    def __init__(self, conn=traci):
+        self.conn = conn
+        self.stats = {}
+
+    def watch(self, tls_id):
+        self.conn.trafficlight.subscribe(tls_id, [tc.TL_CURRENT_PROGRAM])
+
+    def invalidate(self, tls_id=None):
+        """Drop the cached statistics of one light (all lights with None); get() fetches the logic again."""
+        if tls_id is None:
+            self.stats.clear()
+        else:
+            self.stats.pop(tls_id, None)
+
+    def _current_program(self, tls_id):
+        result = self.conn.trafficlight.getSubscriptionResults(tls_id)
+        if result and tc.TL_CURRENT_PROGRAM in result:
+            return result[tc.TL_CURRENT_PROGRAM]
+        return self.conn.trafficlight.getProgram(tls_id)
+
+    def _logic(self, tls_id, program):
+        logics = self.conn.trafficlight.getAllProgramLogics(tls_id)
+        return next((l for l in logics if l.programID == program), logics[0])
+
+    def _compute(self, tls_id, program, phases):
+        durations = np.array([ph.duration for ph in phases], dtype=np.float64)
+        states = np.array([list(ph.state) for ph in phases])
+        green = (np.isin(states, GREEN_CHARS) * durations[:, None]).sum(axis=0)
+        red = (np.isin(states, RED_CHARS) * durations[:, None]).sum(axis=0)
+        lane_signals = {}
+        for index, lane_id in enumerate(self.conn.trafficlight.getControlledLanes(tls_id)):
+            lane_signals.setdefault(lane_id, []).append(index)
+        return {
+            'program': program,
+            'green': green,
+            'red': red,
+            'cycle': durations.sum(),
+            # Giá trị toàn nút như dataset.py cũ (pha có bất kỳ 'G' / 'r')
+            'tls_green': durations[np.isin(states, ('G',)).any(axis=1)].sum(),
+            'tls_red': durations[np.isin(states, RED_CHARS).any(axis=1)].sum(),
+            'lane_signals': lane_signals,
+        }
+
+    def get(self, tls_id, program=None):
+        if program is None:
+            program = self._current_program(tls_id)
+        stats = self.stats.get(tls_id)
+        if stats is None or stats['program'] != program:
+            stats = self._compute(tls_id, program, self._logic(tls_id, program).getPhases())
+            self.stats[tls_id] = stats
+        return stats
+
+    def lane_times(self, tls_id, lane_id, program=None, stats=None):
+        """
+        (green, red, cycle) for a lane: longest green / shortest red over its signal indices.
+        Pass stats from get() to look the light up once for all of its lanes.
+        """
+        if stats is None:
+            stats = self.get(tls_id, program)
+        indices = stats['lane_signals'].get(lane_id)
+        if not indices:
+            return stats['tls_green'], stats['tls_red'], stats['cycle']
+        return stats['green'][indices].max(), stats['red'][indices].min(), stats['cycle']
+
+
+class DatasetExporter:
+    """
+    Samples lane metrics every sample_interval steps and writes them through
+    a dataset_io writer (CSV or columnar). Lane values come from subscriptions and plan times from
+    PlanStatsCache, so a sample only reads subscription results (no logic lookup unless
+    the program changes).
+
+    lanes: list of (edge_id, lane_id, writer_key); rows for each writer_key go to
+    writers[writer_key]. legacy=True writes the original dataset.py columns
+    (LEGACY_HEADER: no edge/lane, intersection-wide greenTime/redTime).
+    """
+
+    def __init__(self, tls_id, lanes, writers, sample_interval=SAMPLE_INTERVAL, conn=traci, legacy=False):
+        self.conn = conn
+        self.legacy = legacy
+        self.tls_id = tls_id
+        self.lanes = lanes
+        self.writers = writers
+        self.sample_interval = sample_interval
+        self.plans = PlanStatsCache(conn)
+        self.plans.watch(tls_id)
+        self.lengths = {}
+        for _, lane_id, _ in lanes:
+            conn.lane.subscribe(lane_id, LANE_VARS)
+            self.lengths[lane_id] = conn.lane.getLength(lane_id)
+
+    def due(self, step):
+        return step % self.sample_interval == 0
+
+    def sample(self, step):
+        results = self.conn.lane.getAllSubscriptionResults()
+        stats = self.plans.get(self.tls_id)
+        for edge_id, lane_id, key in self.lanes:
+            values = results.get(lane_id, {})
+            total_vehicles = values.get(tc.LAST_STEP_VEHICLE_NUMBER, 0)
+            length = self.lengths[lane_id]
+            if self.legacy:
+                self.writers[key].write((
+                    step,
+                    values.get(tc.LAST_STEP_VEHICLE_HALTING_NUMBER, 0),
+                    values.get(tc.VAR_WAITING_TIME, 0.0),
+                    values.get(tc.LAST_STEP_MEAN_SPEED, 0.0),
+                    total_vehicles / length if length > 0 else 0,
+                    total_vehicles,
+                    stats['tls_green'], stats['tls_red'], stats['cycle'],
+                ))
+                continue
+            green, red, cycle = self.plans.lane_times(self.tls_id, lane_id, stats=stats)
+            self.writers[key].write((
+                step, edge_id, lane_id,
+                values.get(tc.LAST_STEP_VEHICLE_HALTING_NUMBER, 0),
+                values.get(tc.VAR_WAITING_TIME, 0.0),
+                values.get(tc.LAST_STEP_MEAN_SPEED, 0.0),
+                total_vehicles / length if length > 0 else 0,
+                total_vehicles,
+                green, red, cycle,
+            ))
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+
+class NetworkExporter:
+    """
+    Long-format exporter for every lane controlled by any traffic light in the network.
+    Lanes are discovered from getControlledLanes, subscribed once, and each sample is
+    read with one lane and one traffic light getAllSubscriptionResults call (local) and
+    the simulation time (one round trip), however many lanes and lights there are; a
+    light's logic is only fetched again when it switches program. All rows go to a
+    single writer.
+    """
+
+    def __init__(self, writer, sample_interval=SAMPLE_INTERVAL, tls_ids=None, conn=traci):
+        self.conn = conn
+        self.writer = writer
+        self.sample_interval = sample_interval
+        self.plans = PlanStatsCache(conn)
+        self.lanes = discover_controlled_lanes(conn, tls_ids)
+        self.lengths = {}
+        for tls_id in {tls for tls, _, _ in self.lanes}:
+            self.plans.watch(tls_id)
+        for _, _, lane_id in self.lanes:
+            if lane_id not in self.lengths:
+                conn.lane.subscribe(lane_id, LANE_VARS)
+                self.lengths[lane_id] = conn.lane.getLength(lane_id)
+
+    def due(self, step):
+        return step % self.sample_interval == 0
+
+    @property
+    def writers(self):
+        # Cùng khóa với checkpoint.resume trong export_network
+        return {'network': self.writer}
+
+    def sample(self, step=None):
+        time = self.conn.simulation.getTime()
+        results = self.conn.lane.getAllSubscriptionResults()
+        programs = self.conn.trafficlight.getAllSubscriptionResults()
+        stats = {tls_id: self.plans.get(tls_id, programs.get(tls_id, {}).get(tc.TL_CURRENT_PROGRAM))
+                 for tls_id in {tls for tls, _, _ in self.lanes}}
+        for tls_id, edge_id, lane_id in self.lanes:
+            values = results.get(lane_id, {})
+            total_vehicles = values.get(tc.LAST_STEP_VEHICLE_NUMBER, 0)
+            length = self.lengths[lane_id]
+            green, red, cycle = self.plans.lane_times(tls_id, lane_id, stats=stats[tls_id])
+            self.writer.write((
+                time, tls_id, edge_id, lane_id,
+                values.get(tc.LAST_STEP_VEHICLE_HALTING_NUMBER, 0),
+                values.get(tc.VAR_WAITING_TIME, 0.0),
+                values.get(tc.LAST_STEP_MEAN_SPEED, 0.0),
+                total_vehicles / length if length > 0 else 0,
+                total_vehicles,
+                green, red, cycle,
+            ))
+
+    def close(self):
+        self.writer.close()
+
+
+def discover_controlled_lanes(conn=traci, tls_ids=None):
+    """(tls_id, edge_id, lane_id) for every distinct incoming lane of each traffic light."""
+    lanes = []
+    for tls_id in tls_ids or conn.trafficlight.getIDList():
+        seen = set()
+        for lane_id in conn.trafficlight.getControlledLanes(tls_id):
+            if lane_id in seen:
+                continue
+            seen.add(lane_id)
+            lanes.append((tls_id, conn.lane.getEdgeID(lane_id), lane_id))
+    return lanes
+
+
+def open_writer(base_path, fmt='csv', append=False, header=HEADER):
+    """fmt='csv' -> <base_path>.csv, fmt='columnar' -> <base_path>.cols/ (see dataset_io)."""
+    if fmt == 'csv':
+        return BufferedSampleWriter(f"{base_path}.csv", header=header, append=append)
+    if fmt == 'columnar':
+        return ColumnarWriter(f"{base_path}.cols", header=header, append=append)
+    raise ValueError(f"Unknown dataset format: {fmt}")
+
+
+class ExportCheckpoint:
+    """
+    Checkpoints of a running export in checkpoint_dir: the SUMO state (saveState) and
+    the position of every writer at the same step. Writers are flushed first and
+    checkpoint.json is replaced atomically last, so it always points at a consistent
+    pair. Resuming truncates the outputs back to the saved positions (dropping rows
+    written after the checkpoint) and reloads the state, so nothing is duplicated.
+    """
+
+    def __init__(self, checkpoint_dir, run=None):
+        self.checkpoint_dir = checkpoint_dir
+        self.run = run    # Tham số của lần chạy (cfg, steps, ...); checkpoint của lần chạy khác bị bỏ
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        self.path = os.path.join(checkpoint_dir, CHECKPOINT_FILE)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as f:
+            checkpoint = json.load(f)
+        if self.run is not None and checkpoint.get('run') != self.run:
+            print(f"Checkpoint {self.path} belongs to a different run, starting over")
+            self._discard(checkpoint)
+            return None
+        return checkpoint
+
+    def _write(self, checkpoint):
+        checkpoint['run'] = self.run
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(checkpoint, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _discard(self, checkpoint):
+        if checkpoint.get('state') and os.path.exists(checkpoint['state']):
+            os.remove(checkpoint['state'])
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def save(self, step, writers, conn=traci):
+        positions = {str(key): writer.position() for key, writer in writers.items()}
+        state_file = os.path.abspath(os.path.join(self.checkpoint_dir, f"state_{step}.xml.gz"))
+        conn.simulation.saveState(state_file)
+        previous = self.load()
+        self._write({'step': step, 'time': conn.simulation.getTime(), 'state': state_file,
+                     'positions': positions, 'complete': False})
+        if previous and previous.get('state') not in (None, state_file) and os.path.exists(previous['state']):
+            os.remove(previous['state'])
+
+    def resume(self, writers, conn=traci):
+        """Restore a saved checkpoint; returns the step to continue from (0 if there is none)."""
+        checkpoint = self.load()
+        if checkpoint is None:
+            return 0
+        conn.simulation.loadState(checkpoint['state'])
+        for key, writer in writers.items():
+            writer.truncate(checkpoint['positions'][str(key)])
+        print(f"Resuming export at step {checkpoint['step']}")
+        return checkpoint['step']
+
+    def reset(self):
+        """Forget the checkpoint (and its saved state) so the next export starts from step 0."""
+        self._discard(self.load() or {})
+
+    def complete(self, writers):
+        """Mark the export complete; call only after the writers are closed (outputs finalized)."""
+        checkpoint = self.load() or {}
+        self._discard(checkpoint)
+        outputs = {writer.path: output_size(writer.path) for writer in writers.values()}
+        self._write({'complete': True, 'outputs': outputs})
+
+    def is_complete(self):
+        """True only if the export finished and its outputs are still the ones it wrote."""
+        checkpoint = self.load()
+        if not (checkpoint and checkpoint.get('complete')):
+            return False
+        outputs = checkpoint.get('outputs') or {}
+        if outputs and all(output_size(path) == size for path, size in outputs.items()):
+            return True
+        print(f"Outputs of {self.path} are missing or changed, exporting again")
+        self.reset()
+        return False
+
+
+def output_size(path):
+    """Size in bytes of an output file, or of the column files of a .cols directory (None if missing)."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in sorted(os.listdir(path))
+                   if name.endswith('.bin'))
+    return None
+
+
+def run_export(exporter, steps, start_step=0, checkpoint=None, checkpoint_interval=CHECKPOINT_INTERVAL,
+               conn=traci):
+    """Step the simulation from start_step to steps, sampling and checkpointing on schedule."""
+    try:
+        for step in range(start_step, steps):
+            conn.simulationStep()
+            if exporter.due(step):
+                exporter.sample(step)
+            if checkpoint is not None and (step + 1) % checkpoint_interval == 0 and step + 1 < steps:
+                checkpoint.save(step + 1, exporter.writers, conn)
+    finally:
+        # Luôn đóng writer, kể cả khi mô phỏng lỗi giữa chừng
+        exporter.close()
+    if checkpoint is not None:
+        checkpoint.complete(exporter.writers)
+
+
+def export_edges(sumo_cfg, input_edges, base_output, steps=600, sample_interval=SAMPLE_INTERVAL,
+                 lane_index=0, sumo_binary="sumo", fmt='csv', checkpoint_dir=None,
+                 checkpoint_interval=CHECKPOINT_INTERVAL, legacy=False):
+    """
+    Export one file per input edge (<base_output>1.csv, 2.csv, ...), like dataset.py.
+    legacy=True keeps dataset.py's original columns (LEGACY_HEADER) for dataset2/3.py.
+    With checkpoint_dir, an interrupted export resumes from its last checkpoint.
+    """
+    run = {'sumo_cfg': os.path.abspath(sumo_cfg), 'input_edges': list(input_edges), 'steps': steps,
+           'sample_interval': sample_interval, 'lane_index': lane_index, 'fmt': fmt, 'legacy': legacy}
+    checkpoint = ExportCheckpoint(checkpoint_dir, run) if checkpoint_dir else None
+    if checkpoint is not None and checkpoint.is_complete():
+        print(f"Export already complete ({checkpoint.path})")
+        return
+    resuming = checkpoint is not None and checkpoint.load() is not None
+    header = LEGACY_HEADER if legacy else HEADER
+    traci.start([sumo_binary, "-c", sumo_cfg])
+    writers = {}
+    try:
+        tls_id = traci.trafficlight.getIDList()[0]
+        for i in range(len(input_edges)):
+            writers[i] = open_writer(f"{base_output}{i+1}", fmt, append=resuming, header=header)
+        start_step = checkpoint.resume(writers) if resuming else 0
+        lanes = [(edge, f"{edge}_{lane_index}", i) for i, edge in enumerate(input_edges)]
+        exporter = DatasetExporter(tls_id, lanes, writers, sample_interval, legacy=legacy)
+        run_export(exporter, steps, start_step, checkpoint, checkpoint_interval)
+    finally:
+        for writer in writers.values():
+            writer.close()
+        traci.close()
+
+
+def export_network(sumo_cfg, output, steps=600, sample_interval=SAMPLE_INTERVAL, fmt='csv',
+                   sumo_binary="sumo", tls_ids=None, checkpoint_dir=None, checkpoint_interval=CHECKPOINT_INTERVAL):
+    """
+    Export all controlled lanes of all (or the given) traffic lights into one long-format file.
+    With checkpoint_dir, an interrupted export resumes from its last checkpoint.
+    """
+    run = {'sumo_cfg': os.path.abspath(sumo_cfg), 'output': output, 'steps': steps,
+           'sample_interval': sample_interval, 'fmt': fmt, 'tls_ids': list(tls_ids) if tls_ids else None}
+    checkpoint = ExportCheckpoint(checkpoint_dir, run) if checkpoint_dir else None
+    if checkpoint is not None and checkpoint.is_complete():
+        print(f"Export already complete ({checkpoint.path})")
+        return
+    resuming = checkpoint is not None and checkpoint.load() is not None
+    traci.start([sumo_binary, "-c", sumo_cfg])
+    writer = None
+    try:
+        writer = open_writer(output, fmt, append=resuming, header=NETWORK_HEADER)
+        start_step = checkpoint.resume({'network': writer}) if resuming else 0
+        exporter = NetworkExporter(writer, sample_interval, tls_ids)
+        print(f"Exporting {len(exporter.lanes)} lanes of "
+              f"{len({tls for tls, _, _ in exporter.lanes})} traffic lights")
+        run_export(exporter, steps, start_step, checkpoint, checkpoint_interval)
+    finally:
+        if writer is not None:
+            writer.close()
+        traci.close()
+
+
+# ====== TIME SLICES ======
+
+def step_length_of(sumo_cfg):
+    """--step-length from a .sumocfg (SUMO's default 1 s if not set)."""
+    for node in ET.parse(sumo_cfg).getroot().iter('step-length'):
+        return float(node.get('value'))
+    return 1.0
+
+
+def save_slice_states(sumo_cfg, times, state_dir, sumo_binary="sumo"):
+    """
+    One plain SUMO run (no TraCI) that saves the simulation state at each slice
+    start time; returns the state file per time.
+    """
+    os.makedirs(state_dir, exist_ok=True)
+    files = [os.path.abspath(os.path.join(state_dir, f"slice_{t:g}.xml.gz")) for t in times]
+    if times:
+        subprocess.run([sumo_binary, "-c", sumo_cfg, "--no-step-log", "true",
+                        "--save-state.times", ",".join(f"{t:g}" for t in times),
+                        "--save-state.files", ",".join(files),
+                        "--end", f"{max(times):g}"], check=True)
+    return files
+
+
+def _export_slice(task):
+    sumo_cfg, output, start_step, end_step, state_file, sample_interval, fmt, sumo_binary, step_length = task
+    cmd = [sumo_binary, "-c", sumo_cfg, "--no-step-log", "true", "--end", f"{end_step * step_length:g}"]
+    if state_file:
+        cmd += ["--load-state", state_file, "--begin", f"{start_step * step_length:g}"]
+    label = os.path.basename(output)
+    traci.start(cmd, label=label)
+    conn = traci.getConnection(label)
+    try:
+        writer = open_writer(output, fmt, header=NETWORK_HEADER)
+        exporter = NetworkExporter(writer, sample_interval, conn=conn)
+        run_export(exporter, end_step, start_step, conn=conn)
+        return writer.rows_written
+    finally:
+        conn.close()
+
+
+def export_network_sliced(sumo_cfg, output, steps=600, n_slices=4, sample_interval=SAMPLE_INTERVAL, fmt='csv',
+                          sumo_binary="sumo", workers=None, state_dir=None):
+    """
+    Long-horizon export split into n_slices independent time slices run in parallel.
+    A warm-up run saves the state at each slice boundary (aligned to sample_interval),
+    every slice then loads its state and writes <output>_slice<k>, and the parts are
+    concatenated into <output> at the end.
+    """
+    step_length = step_length_of(sumo_cfg)
+    size = int(np.ceil(steps / n_slices / sample_interval)) * sample_interval
+    bounds = list(range(0, steps, size)) + [steps]
+    state_dir = state_dir or f"{output}_states"
+    states = [None] + save_slice_states(sumo_cfg, [b * step_length for b in bounds[1:-1]], state_dir, sumo_binary)
+    tasks = [(sumo_cfg, f"{output}_slice{k}", bounds[k], bounds[k + 1], states[k], sample_interval, fmt,
+              sumo_binary, step_length) for k in range(len(bounds) - 1)]
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=mp.get_context('spawn')) as pool:
+        rows = list(pool.map(_export_slice, tasks))
+    ext = ".cols" if fmt == 'columnar' else ".csv"
+    concat_datasets([task[1] + ext for task in tasks], output + ext)
+    print(f"Exported {sum(rows)} rows in {len(tasks)} slices -> {output}{ext}")
+    return output + ext
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Network-wide long-format dataset export")
+    parser.add_argument("sumo_cfg")
+    parser.add_argument("output", help="Output path without extension")
+    parser.add_argument("--steps", type=int, default=600)
+    parser.add_argument("--sample-interval", type=int, default=SAMPLE_INTERVAL)
+    parser.add_argument("--format", choices=['csv', 'columnar'], default='csv')
+    parser.add_argument("--sumo-binary", default="sumo")
+    parser.add_argument("--checkpoint-dir", default=None, help="Resume from / write checkpoints to this directory")
+    parser.add_argument("--checkpoint-interval", type=int, default=CHECKPOINT_INTERVAL)
+    parser.add_argument("--slices", type=int, default=1, help="Run as N parallel time slices")
+    args = parser.parse_args()
+    if args.slices > 1:
+        export_network_sliced(args.sumo_cfg, args.output, args.steps, args.slices, args.sample_interval,
+                              args.format, args.sumo_binary)
+    else:
+        export_network(args.sumo_cfg, args.output, args.steps, args.sample_interval, args.format,
+                       args.sumo_binary, checkpoint_dir=args.checkpoint_dir,
+                       checkpoint_interval=args.checkpoint_interval)
@@ -0,0 +1,388 @@
+import os
+import re
+import csv
+import json
+import argparse
+
+import numpy as np
+
+# ====== CSV FORMAT ======
+CHUNK_SIZE = 500        # Số dòng gom lại trước mỗi lần ghi xuống đĩa
+DELIMITER = ';'
+DECIMAL = ','           # Dấu thập phân cho các cột trong DECIMAL_COLUMNS (giống dataset.py)
+FLOAT_FORMAT = '%.6f'
+
+HEADER = ["step(s)", "edge", "lane_id", "queue(xe)", "waitingTime(s)", "avgSpeed(m/s)",
+          "density(m)", "outflow(xe)", "greenTime(s)", "redTime(s)", "cycleTime(s)"]
+# Định dạng gốc của dataset.py: một làn mỗi file, greenTime/redTime tính cho cả nút
+LEGACY_HEADER = ["step", "queue", "waitingTime", "avgSpeed", "density", "outflow", "greenTime", "redTime", "cycleTime"]
+DECIMAL_COLUMNS = ("avgSpeed(m/s)", "density(m)", "avgSpeed", "density")
+
+# Cột dạng chuỗi trong các file dataset; các cột còn lại là số
+STRING_COLUMNS = ('edge', 'lane_id', 'tls')
+
+# ====== COLUMNAR FORMAT ======
+# Thư mục <name>.cols/ gồm schema.json và một file nhị phân thô <column>.bin cho mỗi cột.
+# Cột chuỗi được mã hóa từ điển (int32 + danh sách giá trị trong schema).
+SCHEMA_FILE = "schema.json"
+INDEX_FILE = "index.npz"     # Chỉ mục của dataset_store, bị xóa khi ghi đè dữ liệu
+DTYPES = {
+    'step': 'int64', 'time': 'float64', 'tls': 'str', 'edge': 'str', 'lane_id': 'str', 'queue': 'int32',
+    'waitingTime': 'float64', 'avgSpeed': 'float64', 'density': 'float64', 'outflow': 'int32',
+    'greenTime': 'float64', 'redTime': 'float64', 'cycleTime': 'float64',
+}
+STRING_CODE_DTYPE = 'int32'
+
+_UNIT_SUFFIX = re.compile(r"\(.*\)$")
+
+
+def normalize_column(name):
+    """'queue(xe)' -> 'queue', 'step(s)' -> 'step'."""
+    return _UNIT_SUFFIX.sub('', name.strip())
+
+
+def parse_number(text):
+    """Numbers in the dataset CSVs may use a comma as decimal separator ('7,3676')."""
+    text = text.strip()
+    if not text:
+        return np.nan
+    return float(text.replace(',', '.'))
+
+
+def read_dataset_csv(path, delimiter=';'):
+    """
+    Read a dataset CSV (dataset.py export or csv/dataset*.csv) into a dict of
+    columns: NumPy float arrays for numeric columns, object arrays for
+    edge/lane names. Header units such as '(xe)' are dropped from the names.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        header = [normalize_column(h) for h in next(reader)]
+        rows = [row for row in reader if row]
+    columns = {}
+    for i, name in enumerate(header):
+        values = [row[i] if i < len(row) else '' for row in rows]
+        if name in STRING_COLUMNS:
+            columns[name] = np.array(values, dtype=object)
+        else:
+            columns[name] = np.array([parse_number(v) for v in values], dtype=np.float64)
+    return columns
+
+
+def per_step(columns, sums=('queue', 'waitingTime', 'outflow')):
+    """
+    Collapse a per-lane dataset (several rows per step) to one row per step: columns in
+    sums are added over the lanes, the other numeric columns take the maximum. A file
+    with one row per step (legacy dataset.py export) is returned unchanged.
+    """
+    key = 'step' if 'step' in columns else 'time'
+    steps, inverse = np.unique(columns[key], return_inverse=True)
+    if len(steps) == len(columns[key]):
+        return columns
+    result = {key: steps}
+    for name, values in columns.items():
+        if name == key or values.dtype == object:
+            continue
+        out = np.zeros(len(steps)) if name in sums else np.full(len(steps), -np.inf)
+        (np.add if name in sums else np.maximum).at(out, inverse, np.nan_to_num(values))
+        result[name] = out
+    return result
+
+
+class BufferedSampleWriter:
+    """
+    Semicolon CSV writer that keeps rows in memory and writes them CHUNK_SIZE at a
+    time. Decimal-comma columns are formatted per chunk with vectorized NumPy string
+    operations instead of a str.replace per value.
+    """
+
+    def __init__(self, path, header=HEADER, chunk_size=CHUNK_SIZE, delimiter=DELIMITER,
+                 decimal=DECIMAL, decimal_columns=DECIMAL_COLUMNS, append=False):
+        self.path = path
+        self.header = list(header)
+        self.chunk_size = chunk_size
+        self.delimiter = delimiter
+        self.decimal = decimal
+        self.decimal_indices = [self.header.index(c) for c in decimal_columns if c in self.header]
+        self.rows = []
+        self.rows_written = 0
+        exists = append and os.path.exists(path) and os.path.getsize(path) > 0
+        self.file = open(path, 'a' if append else 'w', newline='', encoding='utf-8')
+        if not exists:
+            self.file.write(delimiter.join(self.header) + '\n')
+
+    def write(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def _format_chunk(self, rows):
+        columns = [list(col) for col in zip(*rows)]
+        for i in self.decimal_indices:
+            text = np.char.mod(FLOAT_FORMAT, np.asarray(columns[i], dtype=np.float64))
+            if self.decimal != '.':
+                text = np.char.replace(text, '.', self.decimal)
+            columns[i] = text.tolist()
+        return ''.join(self.delimiter.join(map(str, row)) + '\n' for row in zip(*columns))
+
+    def flush(self):
+        if self.rows:
+            self.file.write(self._format_chunk(self.rows))
+            self.rows_written += len(self.rows)
+            self.rows = []
+        self.file.flush()
+
+    def position(self):
+        """Flush and return the checkpoint position (byte offset and row count) of the file."""
+        self.flush()
+        return {'bytes': self.file.tell(), 'rows': self.rows_written}
+
+    def truncate(self, position):
+        """Drop everything written after a position() (resuming an interrupted export)."""
+        self.rows = []
+        self.file.flush()
+        self.file.truncate(position['bytes'])
+        self.file.seek(0, os.SEEK_END)
+        self.rows_written = position['rows']
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+
+
+class ColumnarWriter:
+    """
+    Drop-in replacement for BufferedSampleWriter that stores each column as a raw
+    little-endian binary file. Rows are buffered and appended CHUNK_SIZE at a time;
+    schema.json (column dtypes, string dictionaries, row count) is rewritten
+    atomically after every chunk, so a reader never sees a partially written chunk.
+    header uses the CSV names; columns are stored under their unit-less names.
+    """
+
+    def __init__(self, path, header=HEADER, chunk_size=CHUNK_SIZE, dtypes=None, append=False):
+        self.path = path
+        self.csv_header = list(header)
+        self.names = [normalize_column(h) for h in self.csv_header]
+        self.chunk_size = chunk_size
+        dtypes = dict(DTYPES, **(dtypes or {}))
+        os.makedirs(path, exist_ok=True)
+        schema_path = os.path.join(path, SCHEMA_FILE)
+        if append and os.path.exists(schema_path):
+            with open(schema_path) as f:
+                schema = json.load(f)
+            self.dtypes = schema['dtypes']
+            self.rows_written = schema['rows']
+            self.dictionaries = {name: {v: i for i, v in enumerate(values)}
+                                 for name, values in schema['dictionaries'].items()}
+            self._truncate(self.rows_written)
+        else:
+            index_path = os.path.join(path, INDEX_FILE)
+            if os.path.exists(index_path):
+                os.remove(index_path)
+            self.dtypes = {name: dtypes.get(name, 'float64') for name in self.names}
+            self.rows_written = 0
+            self.dictionaries = {name: {} for name in self.names if self.dtypes[name] == 'str'}
+            for name in self.names:
+                open(self._column_path(name), 'wb').close()
+        self.rows = []
+
+    def _column_path(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+
+    def _storage_dtype(self, name):
+        dtype = self.dtypes[name]
+        return np.dtype(STRING_CODE_DTYPE if dtype == 'str' else dtype).newbyteorder('<')
+
+    def _truncate(self, rows):
+        """Cắt phần đuôi của chunk ghi dở (khi tiếp tục sau sự cố)."""
+        for name in self.names:
+            with open(self._column_path(name), 'r+b') as f:
+                f.truncate(rows * self._storage_dtype(name).itemsize)
+
+    def write(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            for name, values in zip(self.names, zip(*self.rows)):
+                if self.dtypes[name] == 'str':
+                    codes = self.dictionaries[name]
+                    values = [codes.setdefault(v, len(codes)) for v in values]
+                data = np.asarray(values).astype(self._storage_dtype(name))
+                with open(self._column_path(name), 'ab') as f:
+                    f.write(data.tobytes())
+            self.rows_written += len(self.rows)
+            self.rows = []
+        self._write_schema()
+
+    def _write_schema(self):
+        schema = {
+            'rows': self.rows_written,
+            'columns': self.names,
+            'csv_header': self.csv_header,
+            'dtypes': self.dtypes,
+            'dictionaries': {name: list(codes) for name, codes in self.dictionaries.items()},
+        }
+        tmp_path = os.path.join(self.path, SCHEMA_FILE + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(schema, f)
+        os.replace(tmp_path, os.path.join(self.path, SCHEMA_FILE))
+
+    def position(self):
+        self.flush()
+        return {'rows': self.rows_written}
+
+    def truncate(self, position):
+        self.rows = []
+        self.rows_written = position['rows']
+        self._truncate(self.rows_written)
+        self._write_schema()
+
+    def close(self):
+        self.flush()
+
+
+class ColumnarDataset:
+    """
+    Columns of a ColumnarWriter directory as read-only np.memmap arrays (no parsing,
+    no copy). String columns are exposed as integer codes; use strings(name) to decode.
+    """
+
+    def __init__(self, path, mmap=True):
+        self.path = path
+        with open(os.path.join(path, SCHEMA_FILE)) as f:
+            self.schema = json.load(f)
+        self.rows = self.schema['rows']
+        self.dictionaries = {name: np.array(values, dtype=object)
+                             for name, values in self.schema['dictionaries'].items()}
+        self.columns = {}
+        for name in self.schema['columns']:
+            dtype = self.schema['dtypes'][name]
+            storage = np.dtype(STRING_CODE_DTYPE if dtype == 'str' else dtype).newbyteorder('<')
+            column_path = os.path.join(path, f"{name}.bin")
+            if self.rows == 0:
+                self.columns[name] = np.empty(0, dtype=storage)
+            elif mmap:
+                self.columns[name] = np.memmap(column_path, dtype=storage, mode='r', shape=(self.rows,))
+            else:
+                self.columns[name] = np.fromfile(column_path, dtype=storage, count=self.rows)
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def strings(self, name, rows=slice(None)):
+        return self.dictionaries[name][self.columns[name][rows]]
+
+    def code(self, name, value):
+        """Integer code of a string value (-1 if it never occurs), for fast filtering."""
+        matches = np.flatnonzero(self.dictionaries[name] == value)
+        return int(matches[0]) if len(matches) else -1
+
+    def to_dict(self, decode=True):
+        return {name: (self.strings(name) if decode and name in self.dictionaries else np.asarray(col))
+                for name, col in self.columns.items()}
+
+
+def load_columnar(path, mmap=True):
+    return ColumnarDataset(path, mmap)
+
+
+def columnar_to_csv(src, dst, chunk_size=CHUNK_SIZE):
+    """Export a columnar dataset to the semicolon / decimal-comma CSV used by spreadsheets."""
+    data = load_columnar(src)
+    writer = BufferedSampleWriter(dst, header=data.schema['csv_header'], chunk_size=chunk_size)
+    for start in range(0, len(data), chunk_size):
+        rows = slice(start, start + chunk_size)
+        columns = [data.strings(name, rows) if name in data.dictionaries else data[name][rows].tolist()
+                   for name in data.schema['columns']]
+        for row in zip(*columns):
+            writer.write(row)
+    writer.close()
+    return dst
+
+
+def csv_to_columnar(src, dst, delimiter=DELIMITER):
+    """Convert an existing dataset CSV to the columnar layout."""
+    with open(src, newline='', encoding='utf-8') as f:
+        header = next(csv.reader(f, delimiter=delimiter))
+    columns = read_dataset_csv(src, delimiter)
+    names = [normalize_column(h) for h in header]
+    writer = ColumnarWriter(dst, header=header)
+    # Cột số trong CSV cũ được đọc thành float; trả về int cho cột kiểu nguyên
+    values = []
+    for name in names:
+        col = columns[name]
+        if writer.dtypes[name].startswith('int'):
+            col = np.nan_to_num(col).astype(np.int64)
+        values.append(col.tolist())
+    for row in zip(*values):
+        writer.write(row)
+    writer.close()
+    return dst
+
+
+def columnar_to_npz(src, dst):
+    """Save all columns (strings decoded) into one compressed .npz file."""
+    data = load_columnar(src)
+    np.savez_compressed(dst, **{name: np.asarray(values, dtype=str) if values.dtype == object else values
+                                for name, values in data.to_dict().items()})
+    return dst
+
+
+def concat_datasets(parts, dst):
+    """
+    Concatenate dataset parts with the same columns (e.g. time slices) into dst: CSV
+    files are joined without repeating the header; columnar directories are joined
+    column by column, remapping each part's string dictionary codes.
+    """
+    if not all(os.path.isdir(p) for p in parts):
+        with open(dst, 'w', encoding='utf-8', newline='') as out:
+            for i, path in enumerate(parts):
+                with open(path, encoding='utf-8', newline='') as f:
+                    header = f.readline()
+                    if i == 0:
+                        out.write(header)
+                    for chunk in iter(lambda: f.read(1 << 20), ''):
+                        out.write(chunk)
+        return dst
+    first = load_columnar(parts[0])
+    writer = ColumnarWriter(dst, header=first.schema['csv_header'], dtypes=first.schema['dtypes'])
+    for path in parts:
+        data = load_columnar(path)
+        for name in writer.names:
+            values = np.asarray(data[name])
+            if name in writer.dictionaries:
+                codes = writer.dictionaries[name]
+                remap = np.array([codes.setdefault(v, len(codes)) for v in data.dictionaries[name]],
+                                 dtype=STRING_CODE_DTYPE)
+                values = remap[values] if len(remap) else values
+            with open(writer._column_path(name), 'ab') as f:
+                f.write(values.astype(writer._storage_dtype(name)).tobytes())
+        writer.rows_written += len(data)
+    writer.close()
+    return dst
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert between dataset CSV and columnar formats")
+    sub = parser.add_subparsers(dest='command', required=True)
+    for command, help_text in (('to-csv', "columnar directory -> semicolon CSV"),
+                               ('from-csv', "semicolon CSV -> columnar directory"),
+                               ('to-npz', "columnar directory -> .npz")):
+        p = sub.add_parser(command, help=help_text)
+        p.add_argument('src')
+        p.add_argument('dst')
+    args = parser.parse_args(argv)
+    convert = {'to-csv': columnar_to_csv, 'from-csv': csv_to_columnar, 'to-npz': columnar_to_npz}[args.command]
+    print(f"Wrote {convert(args.src, args.dst)}")
+
+
+if __name__ == "__main__":
+    main()
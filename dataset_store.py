@@ -0,0 +1,221 @@
+import os
+import json
+import hashlib
+import argparse
+
+import numpy as np
+
+from dataset_io import INDEX_FILE, SCHEMA_FILE, load_columnar, csv_to_columnar
+
+CHUNK_ROWS = 8192       # Số dòng mỗi chunk thống kê min/max
+
+
+class DatasetStore:
+    """
+    Indexed, read-only view of an exported dataset (columnar directory; CSV files are
+    converted once to a sibling .cols directory).
+
+    The index (index.npz next to the columns, rebuilt when the schema or any column file
+    changes) holds
+    - per-chunk min/max of every numeric column, so range filters only read the chunks
+      that can match;
+    - row orders sorted by (edge, time) and (lane, time) with segment offsets, so a
+      lane/edge query is a slice of the index and tail(n) is a constant-time lookup.
+
+    Per-direction files without edge/lane_id columns (dataset.py's LEGACY_HEADER) are
+    one edge: `edge`, or the file name like surrogate.py (e.g. "dataset1.csv").
+    """
+
+    def __init__(self, path, chunk_rows=CHUNK_ROWS, edge=None):
+        source = path
+        if not os.path.isdir(path):
+            path = _columnar_copy(path)
+        self.path = path
+        self.data = load_columnar(path)
+        if 'edge' not in self.data.columns:
+            self._constant_column('edge', edge or os.path.basename(os.path.normpath(source)))
+        if 'lane_id' not in self.data.columns:
+            # Không có cột làn: mỗi hướng là một "làn"
+            self.data.columns['lane_id'] = self.data['edge']
+            self.data.dictionaries['lane_id'] = self.data.dictionaries['edge']
+        self.time_column = 'time' if 'time' in self.data.columns else 'step'
+        self.chunk_rows = chunk_rows
+        self.index = self._load_index()
+
+    def _constant_column(self, name, value):
+        """Add an in-memory string column with the same value on every row."""
+        self.data.columns[name] = np.zeros(len(self.data), dtype=np.int32)
+        self.data.dictionaries[name] = np.array([value], dtype=object)
+
+    # ====== INDEX ======
+
+    def _load_index(self):
+        index_path = os.path.join(self.path, INDEX_FILE)
+        if os.path.exists(index_path):
+            with np.load(index_path) as f:
+                index = dict(f)
+            if (int(index['rows']) == len(self.data) and int(index['chunk_rows']) == self.chunk_rows
+                    and str(index.get('signature')) == self._signature()):
+                return index
+        index = self._build_index()
+        tmp_path = os.path.join(self.path, "index.tmp.npz")
+        np.savez(tmp_path, **index)
+        os.replace(tmp_path, index_path)
+        return index
+
+    def _signature(self):
+        """Hash of schema.json and the size/mtime of every column file the index was built from."""
+        digest = hashlib.sha1()
+        with open(os.path.join(self.path, SCHEMA_FILE), 'rb') as f:
+            digest.update(f.read())
+        for name in self.data.schema['columns']:
+            stat = os.stat(os.path.join(self.path, f"{name}.bin"))
+            digest.update(json.dumps([name, stat.st_size, stat.st_mtime_ns]).encode())
+        return digest.hexdigest()
+
+    def _build_index(self):
+        rows = len(self.data)
+        index = {'rows': np.array(rows), 'chunk_rows': np.array(self.chunk_rows),
+                 'signature': np.array(self._signature())}
+        starts = np.arange(0, rows, self.chunk_rows)
+        for name, column in self.data.columns.items():
+            if name in self.data.dictionaries or rows == 0:
+                continue
+            values = np.asarray(column, dtype=np.float64)
+            index[f"min_{name}"] = np.minimum.reduceat(values, starts)
+            index[f"max_{name}"] = np.maximum.reduceat(values, starts)
+        time = np.asarray(self.data[self.time_column])
+        for key in ('edge', 'lane_id'):
+            codes = np.asarray(self.data[key])
+            order = np.lexsort((time, codes))
+            index[f"order_{key}"] = order
+            # offsets[c]:offsets[c+1] là đoạn của mã c trong order
+            index[f"offsets_{key}"] = np.searchsorted(codes[order], np.arange(len(self.data.dictionaries[key]) + 1))
+        return index
+
+    # ====== QUERIES ======
+
+    def __len__(self):
+        return len(self.data)
+
+    def values(self, key):
+        """Distinct edge / lane_id values."""
+        return self.data.dictionaries[key].tolist()
+
+    def _segment(self, key, value):
+        code = self.data.code(key, value)
+        if code < 0:
+            return np.empty(0, dtype=np.int64)
+        offsets = self.index[f"offsets_{key}"]
+        return self.index[f"order_{key}"][offsets[code]:offsets[code + 1]]
+
+    def _candidate_chunks(self, where):
+        n_chunks = len(range(0, len(self.data), self.chunk_rows))
+        keep = np.ones(n_chunks, dtype=bool)
+        for name, (lo, hi) in where.items():
+            if lo is not None:
+                keep &= self.index[f"max_{name}"] >= lo
+            if hi is not None:
+                keep &= self.index[f"min_{name}"] <= hi
+        return np.flatnonzero(keep)
+
+    def _rows_from_chunks(self, chunks):
+        if len(chunks) == 0:
+            return np.empty(0, dtype=np.int64)
+        starts = chunks * self.chunk_rows
+        ends = np.minimum(starts + self.chunk_rows, len(self.data))
+        lengths = ends - starts
+        # Ghép các khoảng [start, end) của chunk thành một mảng chỉ số dòng
+        return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+    def query(self, start=None, end=None, edges=None, lanes=None, columns=None, where=None, decode=True):
+        """
+        Rows with start <= time <= end, optionally restricted to some edges / lanes and
+        to value ranges where={column: (lo, hi)}. Returns a dict of column arrays in
+        file order. Only the index segments / chunks that can match are read.
+        """
+        where = dict(where or {})
+        if start is not None or end is not None:
+            where[self.time_column] = (start, end)
+        if lanes is not None or edges is not None:
+            key, values = ('lane_id', lanes) if lanes is not None else ('edge', edges)
+            if isinstance(values, str):
+                values = [values]
+            parts = []
+            time = self.data[self.time_column]
+            for value in values:
+                segment = self._segment(key, value)
+                # Đoạn đã sắp theo thời gian: cắt khoảng [start, end] bằng tìm kiếm nhị phân
+                seg_time = time[segment]
+                lo = 0 if start is None else np.searchsorted(seg_time, start, side='left')
+                hi = len(segment) if end is None else np.searchsorted(seg_time, end, side='right')
+                parts.append(segment[lo:hi])
+            rows = np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+            where.pop(self.time_column, None)
+            if lanes is not None and edges is not None:
+                codes = [self.data.code('edge', e) for e in ([edges] if isinstance(edges, str) else edges)]
+                rows = rows[np.isin(self.data['edge'][rows], codes)]
+        else:
+            rows = self._rows_from_chunks(self._candidate_chunks(where))
+        if where:
+            mask = np.ones(len(rows), dtype=bool)
+            for name, (lo, hi) in where.items():
+                values = self.data[name][rows]
+                if lo is not None:
+                    mask &= values >= lo
+                if hi is not None:
+                    mask &= values <= hi
+            rows = rows[mask]
+        return self.take(rows, columns, decode)
+
+    def take(self, rows, columns=None, decode=True):
+        result = {}
+        for name in columns or self.data.schema['columns']:
+            if decode and name in self.data.dictionaries:
+                result[name] = self.data.strings(name, rows)
+            else:
+                result[name] = np.asarray(self.data[name][rows])
+        return result
+
+    def tail(self, n, key='edge', value=None, columns=None):
+        """
+        Last n samples (by time) of one direction, or {value: rows} for every edge /
+        lane when value is None. Each lookup is a slice at the end of an index segment.
+        """
+        if value is not None:
+            return self.take(self._segment(key, value)[-n:], columns)
+        return {v: self.take(self._segment(key, v)[-n:], columns) for v in self.values(key)}
+
+
+def _columnar_copy(csv_path):
+    """<name>.csv -> <name>.cols, converted again only if the CSV is newer."""
+    cols_path = os.path.splitext(csv_path)[0] + ".cols"
+    schema = os.path.join(cols_path, "schema.json")
+    if not os.path.exists(schema) or os.path.getmtime(schema) < os.path.getmtime(csv_path):
+        csv_to_columnar(csv_path, cols_path)
+    return cols_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query an exported dataset")
+    parser.add_argument("path", help="Columnar .cols directory or dataset CSV")
+    parser.add_argument("--start", type=float, default=None)
+    parser.add_argument("--end", type=float, default=None)
+    parser.add_argument("--edge", nargs='*', default=None)
+    parser.add_argument("--lane", nargs='*', default=None)
+    parser.add_argument("--tail", type=int, default=None, help="Last N samples per edge")
+    args = parser.parse_args(argv)
+    store = DatasetStore(args.path)
+    if args.tail:
+        for edge, rows in store.tail(args.tail).items():
+            print(edge, {k: v.tolist() for k, v in rows.items() if k in ('step', 'time', 'queue', 'waitingTime')})
+        return
+    result = store.query(args.start, args.end, args.edge, args.lane)
+    names = list(result)
+    print(";".join(names))
+    for row in zip(*(result[name] for name in names)):
+        print(";".join(map(str, row)))
+
+
+if __name__ == "__main__":
+    main()
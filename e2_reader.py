@@ -0,0 +1,186 @@
+import os
+import glob
+import array
+import argparse
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from dataset_io import ColumnarWriter, BufferedSampleWriter
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ADDITIONAL_FILE = os.path.join(BASE_DIR, "dataset.add.xml")
+E2_GLOB = os.path.join(BASE_DIR, "e2_*.xml")
+
+# Thuộc tính số của <interval> trong output laneAreaDetector (E2) của SUMO
+E2_FIELDS = [
+    'begin', 'end', 'sampledSeconds', 'nVehEntered', 'nVehLeft', 'nVehSeen',
+    'meanSpeed', 'meanTimeLoss', 'meanOccupancy', 'maxOccupancy',
+    'meanMaxJamLengthInVehicles', 'meanMaxJamLengthInMeters',
+    'maxJamLengthInVehicles', 'maxJamLengthInMeters',
+    'jamLengthInVehiclesSum', 'jamLengthInMetersSum',
+    'meanHaltingDuration', 'maxHaltingDuration', 'haltingDurationSum',
+    'meanIntervalHaltingDuration', 'maxIntervalHaltingDuration', 'intervalHaltingDurationSum',
+    'startedHalts', 'meanVehicleNumber', 'maxVehicleNumber',
+]
+
+
+def iter_intervals(path):
+    """Yield (detector_id, {field: float}) for each <interval> of an E2 output file, one at a time."""
+    context = ET.iterparse(path, events=('start', 'end'))
+    _, root = next(context)
+    for event, elem in context:
+        if event == 'end' and elem.tag == 'interval':
+            values = {}
+            for field in E2_FIELDS:
+                text = elem.get(field)
+                values[field] = float(text) if text not in (None, '') else np.nan
+            yield elem.get('id'), values
+            # Giải phóng phần tử đã đọc để bộ nhớ không tăng theo kích thước file
+            elem.clear()
+            root.clear()
+
+
+def read_e2(paths, dedupe=True):
+    """
+    Stream any number of E2 output files into a columnar table: {'detector': object
+    array, field: float64 array, ...} in file order. Values are accumulated in
+    compact typed buffers, never as a parsed XML tree.
+    With dedupe, a (detector, begin) interval seen in several files (e.g. the same
+    detector in the outputs of two runs) is kept once, from the file read last.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    buffers = {field: array.array('d') for field in E2_FIELDS}
+    detectors = []
+    for path in paths:
+        for detector, values in iter_intervals(path):
+            detectors.append(detector)
+            for field in E2_FIELDS:
+                buffers[field].append(values[field])
+    table = {'detector': np.array(detectors, dtype=object)}
+    table.update({field: np.frombuffer(buf, dtype=np.float64) if len(buf) else np.empty(0)
+                  for field, buf in buffers.items()})
+    if dedupe:
+        table = drop_duplicate_intervals(table)
+    return table
+
+
+def drop_duplicate_intervals(table):
+    """Keep the last row of every (detector, begin) pair, in file order."""
+    if len(table['detector']) == 0:
+        return table
+    codes = np.unique(table['detector'].astype(str), return_inverse=True)[1]
+    keys = np.column_stack((codes, table['begin']))[::-1]
+    # Tìm trên mảng đảo ngược: lần xuất hiện đầu tiên ở đó là dòng cuối cùng trong file
+    _, first = np.unique(keys, axis=0, return_index=True)
+    keep = np.sort(len(codes) - 1 - first)
+    dropped = len(codes) - len(keep)
+    if dropped:
+        print(f"Warning: dropped {dropped} duplicate (detector, begin) intervals")
+    return {name: values[keep] for name, values in table.items()}
+
+
+def detector_approaches(additional_file=ADDITIONAL_FILE):
+    """{detector_id: edge_id} from the laneAreaDetector definitions (approach = the lane's edge)."""
+    approaches = {}
+    for _, elem in ET.iterparse(additional_file):
+        if elem.tag in ('laneAreaDetector', 'e2Detector'):
+            lane = elem.get('lane') or (elem.get('lanes') or '').split(' ')[0]
+            approaches[elem.get('id')] = lane.rsplit('_', 1)[0]
+    return approaches
+
+
+def approach_kpis(table, approaches):
+    """
+    Cross-detector KPIs per (approach, interval). approaches maps detector -> approach
+    name (e.g. detector_approaches() or {'NS': ..., 'EW': ...} expanded per detector);
+    detectors without an approach are skipped.
+
+    meanSpeed and meanTimeLoss are weighted by sampledSeconds / nVehSeen, occupancy is
+    the mean over detectors, jam lengths and halting durations are summed or maxed.
+    """
+    names = np.array([approaches.get(d, '') for d in table['detector']], dtype=object)
+    keep = names != ''
+    names = names[keep].astype(str)
+    begin, end = table['begin'][keep], table['end'][keep]
+    col = {field: np.nan_to_num(table[field][keep]) for field in E2_FIELDS}
+
+    approach_ids, approach_inv = np.unique(names, return_inverse=True)
+    begins, begin_inv = np.unique(begin, return_inverse=True)
+    shape = (len(approach_ids), len(begins))
+    index = (approach_inv, begin_inv)
+
+    def summed(values):
+        out = np.zeros(shape)
+        np.add.at(out, index, values)
+        return out
+
+    def maxed(values):
+        out = np.full(shape, -np.inf)
+        np.maximum.at(out, index, values)
+        return out
+
+    detectors = summed(np.ones(len(names)))
+    seconds = summed(col['sampledSeconds'])
+    seen = summed(col['nVehSeen'])
+    ends = maxed(end)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        kpis = {
+            'detectors': detectors,
+            'vehicles': summed(col['nVehEntered']),
+            'meanSpeed': summed(col['meanSpeed'] * col['sampledSeconds']) / seconds,
+            'meanTimeLoss': summed(col['meanTimeLoss'] * col['nVehSeen']) / seen,
+            'meanOccupancy': summed(col['meanOccupancy']) / detectors,
+            'maxOccupancy': maxed(col['maxOccupancy']),
+            'jamLengthInMeters': summed(col['meanMaxJamLengthInMeters']),
+            'maxJamLengthInMeters': maxed(col['maxJamLengthInMeters']),
+            'haltingDurationSum': summed(col['haltingDurationSum']),
+            'maxHaltingDuration': maxed(col['maxHaltingDuration']),
+            'startedHalts': summed(col['startedHalts']),
+        }
+    present = detectors > 0
+    a_idx, b_idx = np.nonzero(present)
+    result = {'approach': approach_ids[a_idx].astype(object), 'begin': begins[b_idx], 'end': ends[present]}
+    result.update({name: values[present] for name, values in kpis.items()})
+    return result
+
+
+def write_table(table, path, fmt='csv'):
+    """Write a read_e2 / approach_kpis table as a semicolon CSV or a columnar .cols directory."""
+    names = list(table)
+    dtypes = {name: 'str' if table[name].dtype == object else 'float64' for name in names}
+    if fmt == 'columnar':
+        writer = ColumnarWriter(path, header=names, dtypes=dtypes)
+    else:
+        writer = BufferedSampleWriter(path, header=names, decimal_columns=())
+    for row in zip(*(table[name].tolist() for name in names)):
+        writer.write(row)
+    writer.close()
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read SUMO E2 detector output and aggregate KPIs per approach")
+    parser.add_argument("files", nargs='*', help=f"E2 output files (default: {E2_GLOB})")
+    parser.add_argument("--additional", default=ADDITIONAL_FILE, help="Additional file defining the detectors")
+    parser.add_argument("--intervals", default=None, help="Write the per-detector interval table here")
+    parser.add_argument("--output", default=None, help="Write the per-approach KPI table here")
+    parser.add_argument("--format", choices=['csv', 'columnar'], default='csv')
+    args = parser.parse_args(argv)
+
+    table = read_e2(args.files or sorted(glob.glob(E2_GLOB)))
+    print(f"Read {len(table['detector'])} intervals from {len(set(table['detector']))} detectors")
+    if args.intervals:
+        print(f"Wrote {write_table(table, args.intervals, args.format)}")
+    kpis = approach_kpis(table, detector_approaches(args.additional))
+    for i in range(len(kpis['approach'])):
+        print(f"{kpis['approach'][i]} [{kpis['begin'][i]:g}-{kpis['end'][i]:g}]: "
+              f"speed={kpis['meanSpeed'][i]:.2f} m/s, occupancy={kpis['meanOccupancy'][i]:.1f}%, "
+              f"jam={kpis['jamLengthInMeters'][i]:.1f} m, halts={kpis['startedHalts'][i]:g}")
+    if args.output:
+        print(f"Wrote {write_table(kpis, args.output, args.format)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+import os
+import argparse
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from dataset_io import read_dataset_csv, load_columnar
+
+# ====== CONFIGURATION ======
+WINDOW = 5                  # Số mẫu cuối dùng để tính trung bình (như num_last_steps trong dataset2.py)
+MIN_GREEN = 10.0            # Giây
+MAX_GREEN = 90.0
+MIN_SCORE = 0.1             # Điểm ùn tắc tối thiểu của một pha (tránh chia 0 / pha không nhận xanh)
+# congestion_score = queue + waitingTime - outflow (giống dataset2.py)
+SCORE_WEIGHTS = {'queue': 1.0, 'waitingTime': 1.0, 'outflow': -1.0}
+
+GREEN_CHARS = ('G', 'g')
+
+
+# ====== SIGNAL LAYOUT ======
+
+def _is_green_phase(state):
+    return 'y' not in state.lower() and any(c in GREEN_CHARS for c in state)
+
+
+def load_phase_layout(net_file, tll_file=None, program_id=None):
+    """
+    Phase structure of every traffic light: base phases [(duration, state)], the
+    indices of the green phases, the incoming edges and which edges each green phase
+    serves (from the linkIndex of the net's <connection> elements). A tlLogic in
+    tll_file overrides the one in the net; program_id selects a specific program.
+    """
+    root = ET.parse(net_file).getroot()
+    links = {}
+    for conn in root.iter('connection'):
+        tls_id = conn.get('tl')
+        if tls_id is not None:
+            links.setdefault(tls_id, {})[int(conn.get('linkIndex'))] = conn.get('from')
+
+    logics = {}
+    sources = [root] + ([ET.parse(tll_file).getroot()] if tll_file else [])
+    for i, source in enumerate(sources):
+        for logic in source.iter('tlLogic'):
+            if program_id is not None and logic.get('programID') != program_id:
+                continue
+            if i > 0 or logic.get('id') not in logics:
+                logics[logic.get('id')] = logic
+
+    layout = {}
+    for tls_id, logic in logics.items():
+        phases = [(float(ph.get('duration')), ph.get('state')) for ph in logic.iter('phase')]
+        green = [i for i, (_, state) in enumerate(phases) if _is_green_phase(state)]
+        link_edges = links.get(tls_id, {})
+        edges = sorted(set(link_edges.values()))
+        serves = np.zeros((len(green), len(edges)), dtype=bool)
+        for row, p in enumerate(green):
+            state = phases[p][1]
+            for index, edge in link_edges.items():
+                if index < len(state) and state[index] in GREEN_CHARS:
+                    serves[row, edges.index(edge)] = True
+        layout[tls_id] = {'program': logic.get('programID'), 'phases': phases,
+                          'green': green, 'edges': edges, 'serves': serves}
+    return layout
+
+
+# ====== DATA CUBE ======
+
+class MetricCube:
+    """
+    Dataset metrics as (tls, direction, time) arrays. Lanes of the same incoming edge
+    are summed; directions a light does not have (and missing samples) are NaN.
+    """
+
+    def __init__(self, tls_ids, directions, times, data):
+        self.tls_ids = tls_ids
+        self.directions = directions    # list (per tls) of edge IDs, in direction-index order
+        self.times = times
+        self.data = data
+
+    def __getitem__(self, metric):
+        return self.data[metric]
+
+    @property
+    def shape(self):
+        return next(iter(self.data.values())).shape
+
+
+def build_cube(columns, metrics=tuple(SCORE_WEIGHTS), tls_id=None, edge=None):
+    """
+    columns: dict of arrays as returned by read_dataset_csv / ColumnarDataset.to_dict,
+    long format (time, tls, edge, ...) or per-edge dataset.py files (step, edge, ...)
+    with the traffic light given as tls_id. Legacy per-direction files have no edge
+    column; all their rows then belong to `edge`.
+    """
+    times_col = columns['time'] if 'time' in columns else columns['step']
+    if 'edge' in columns:
+        edges = np.asarray(columns['edge'], dtype=str)
+    elif edge is not None:
+        edges = np.full(len(times_col), edge, dtype=object).astype(str)
+    else:
+        raise ValueError("Dataset has no edge column; pass the direction as edge")
+    tls = np.asarray(columns['tls'], dtype=str) if 'tls' in columns else np.full(len(edges), tls_id, dtype=object).astype(str)
+
+    tls_ids, tls_inv = np.unique(tls, return_inverse=True)
+    edge_ids, edge_inv = np.unique(edges, return_inverse=True)
+    pair_ids, pair_inv = np.unique(tls_inv * len(edge_ids) + edge_inv, return_inverse=True)
+    pair_tls = pair_ids // len(edge_ids)
+    # Cặp (tls, edge) đã sắp theo tls, nên chỉ số hướng = vị trí trong nhóm của tls
+    pair_dir = np.arange(len(pair_ids)) - np.searchsorted(pair_tls, pair_tls)
+    times, time_inv = np.unique(np.asarray(times_col, dtype=np.float64), return_inverse=True)
+
+    n_dir = int(pair_dir.max()) + 1 if len(pair_dir) else 0
+    shape = (len(tls_ids), n_dir, len(times))
+    index = (tls_inv, pair_dir[pair_inv], time_inv)
+    count = np.zeros(shape)
+    np.add.at(count, index, 1)
+    data = {}
+    for metric in metrics:
+        total = np.zeros(shape)
+        np.add.at(total, index, np.nan_to_num(np.asarray(columns[metric], dtype=np.float64)))
+        data[metric] = np.where(count > 0, total, np.nan)
+
+    directions = [[] for _ in tls_ids]
+    for t, e in zip(pair_tls, pair_ids % len(edge_ids)):
+        directions[t].append(edge_ids[e])
+    return MetricCube(tls_ids.tolist(), directions, times, data)
+
+
+def load_cube(paths, tls_id=None, metrics=tuple(SCORE_WEIGHTS), edges=None):
+    """
+    Load and concatenate dataset files (.csv or columnar .cols directories) into a MetricCube.
+    Files without an edge column (dataset.py's per-direction files) are one direction
+    each: edges[i] for paths[i] if given, else the file name, like surrogate.py.
+    """
+    parts = []
+    for i, path in enumerate(paths):
+        part = load_columnar(path).to_dict() if os.path.isdir(path) else read_dataset_csv(path)
+        if 'edge' not in part:
+            edge = edges[i] if edges else os.path.basename(path)
+            part['edge'] = np.full(len(part['step']), edge, dtype=object)
+        parts.append(part)
+    names = set.intersection(*(set(p) for p in parts))
+    columns = {name: np.concatenate([p[name] for p in parts]) for name in names}
+    return build_cube(columns, metrics, tls_id)
+
+
+# ====== SCORES AND SPLITS ======
+
+def rolling_mean(x, window):
+    """Trailing NaN-aware mean over the last `window` samples along the last axis."""
+    valid = np.isfinite(x)
+    zeros = np.zeros(x.shape[:-1] + (1,))
+    sums = np.concatenate([zeros, np.cumsum(np.where(valid, x, 0.0), axis=-1)], axis=-1)
+    counts = np.concatenate([zeros, np.cumsum(valid, axis=-1)], axis=-1)
+    hi = np.arange(1, x.shape[-1] + 1)
+    lo = np.maximum(hi - window, 0)
+    n = counts[..., hi] - counts[..., lo]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(n > 0, (sums[..., hi] - sums[..., lo]) / n, np.nan)
+
+
+def congestion_scores(cube, window=WINDOW, weights=SCORE_WEIGHTS):
+    """Rolling congestion score per (tls, direction, time)."""
+    return sum(w * rolling_mean(cube[metric], window) for metric, w in weights.items())
+
+
+def phase_scores(scores, serves):
+    """
+    scores: (tls, direction, time); serves: (tls, phase, direction) bool.
+    A green phase scores as its most congested served direction.
+    """
+    masked = np.where(serves[..., None] & np.isfinite(scores[:, None]), scores[:, None], -np.inf)
+    best = masked.max(axis=2)
+    return np.where(np.isfinite(best), np.maximum(best, MIN_SCORE), MIN_SCORE)
+
+
+def split_green(scores, valid, available, min_green=MIN_GREEN, max_green=MAX_GREEN):
+    """
+    Proportional green split of `available` seconds per (tls, time), clipped to
+    [min_green, max_green]. Phases hitting a bound are fixed and the remainder is
+    re-split among the others, for all intersections and windows at once. If the
+    minimum greens alone exceed `available`, every phase gets min_green.
+
+    scores: (tls, phase, time); valid: (tls, phase) bool; available: (tls,) or (tls, time).
+    """
+    valid = np.broadcast_to(valid[..., None], scores.shape)
+    available = np.asarray(available, dtype=np.float64)
+    if available.ndim == 1:
+        available = available[:, None]
+    available = np.broadcast_to(available, (scores.shape[0], scores.shape[2]))[:, None, :]
+    weights = np.where(valid, scores, 0.0)
+    green = np.zeros(scores.shape)
+    fixed = ~valid
+    for _ in range(scores.shape[1] + 1):
+        remaining = available - np.where(valid & fixed, green, 0.0).sum(axis=1, keepdims=True)
+        free = np.where(fixed, 0.0, weights)
+        total = free.sum(axis=1, keepdims=True)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            share = np.where(total > 0, remaining * free / total, 0.0)
+        proposal = np.where(fixed, green, share)
+        low = ~fixed & (proposal < min_green)
+        high = ~fixed & (proposal > max_green)
+        green = np.where(low, min_green, np.where(high, max_green, proposal))
+        if not (low | high).any():
+            break
+        fixed = fixed | low | high
+    return np.where(valid, green, 0.0)
+
+
+class TimingPlan:
+    """
+    Green durations per (tls, green phase, time window) on top of each light's base
+    program; non-green (yellow / all-red) phases keep their base durations.
+    """
+
+    def __init__(self, tls_ids, times, layout, green):
+        self.tls_ids = tls_ids
+        self.times = times
+        self.layout = layout
+        self.green = green
+
+    def durations(self, tls_id, time_index=-1):
+        info = self.layout[tls_id]
+        row = self.tls_ids.index(tls_id)
+        durations = [d for d, _ in info['phases']]
+        for slot, phase in enumerate(info['green']):
+            durations[phase] = round(float(self.green[row, slot, time_index]), 2)
+        return durations
+
+    def table(self, time_index=None):
+        """Rows (time, tls, phase, state, duration) for one window, or all windows if time_index is None."""
+        indices = range(len(self.times)) if time_index is None else [time_index]
+        rows = []
+        for t in indices:
+            for tls_id in self.tls_ids:
+                states = [s for _, s in self.layout[tls_id]['phases']]
+                for phase, duration in enumerate(self.durations(tls_id, t)):
+                    rows.append({'time': float(self.times[t]), 'tls': tls_id, 'phase': phase,
+                                 'state': states[phase], 'duration': duration})
+        return rows
+
+    def write_tll(self, path, time_index=-1, program_id="reallocated"):
+        """Write the plan of one window as a SUMO additional file with one tlLogic per light."""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+            f.write('<additional>\n')
+            for tls_id in self.tls_ids:
+                states = [s for _, s in self.layout[tls_id]['phases']]
+                f.write(f'    <tlLogic id="{tls_id}" type="static" programID="{program_id}" offset="0">\n')
+                for duration, state in zip(self.durations(tls_id, time_index), states):
+                    f.write(f'        <phase duration="{duration:g}" state="{state}"/>\n')
+                f.write('    </tlLogic>\n')
+            f.write('</additional>\n')
+        return path
+
+    def apply(self, conn, time_index=-1, plans=None):
+        """
+        Set the new green durations on the running programs through TraCI. Phases are
+        matched by state string, so this works on whichever program of the light is
+        active. Changes take effect from the next phase switch. plans: a running
+        exporter's PlanStatsCache, invalidated for every light changed here.
+        """
+        for tls_id in self.tls_ids:
+            new = dict(zip((s for _, s in self.layout[tls_id]['phases']), self.durations(tls_id, time_index)))
+            program = conn.trafficlight.getProgram(tls_id)
+            for logic in conn.trafficlight.getAllProgramLogics(tls_id):
+                if logic.programID != program:
+                    continue
+                for phase in logic.phases:
+                    if phase.state in new and _is_green_phase(phase.state):
+                        phase.duration = new[phase.state]
+                        phase.minDur = phase.maxDur = new[phase.state]
+                conn.trafficlight.setProgramLogic(tls_id, logic)
+            if plans is not None:
+                plans.invalidate(tls_id)
+
+
+def reallocate(cube, layout, window=WINDOW, cycle=None, min_green=MIN_GREEN, max_green=MAX_GREEN,
+               weights=SCORE_WEIGHTS):
+    """
+    Congestion scores for every (tls, direction, window) and the resulting
+    proportional green splits, all in NumPy. cycle: None keeps each light's base
+    cycle length, otherwise a number or {tls_id: seconds}; the time lost in
+    non-green phases is subtracted before splitting.
+    """
+    tls_ids = [t for t in cube.tls_ids if t in layout]
+    rows = [cube.tls_ids.index(t) for t in tls_ids]
+    scores = congestion_scores(cube, window, weights)[rows]
+
+    n_phases = max((len(layout[t]['green']) for t in tls_ids), default=0)
+    serves = np.zeros((len(tls_ids), n_phases, scores.shape[1]), dtype=bool)
+    valid = np.zeros((len(tls_ids), n_phases), dtype=bool)
+    available = np.zeros(len(tls_ids))
+    for i, tls_id in enumerate(tls_ids):
+        info = layout[tls_id]
+        directions = cube.directions[cube.tls_ids.index(tls_id)]
+        for j, edge in enumerate(directions):
+            if edge in info['edges']:
+                serves[i, :len(info['green']), j] = info['serves'][:, info['edges'].index(edge)]
+        valid[i, :len(info['green'])] = True
+        base_cycle = sum(d for d, _ in info['phases'])
+        lost = base_cycle - sum(info['phases'][p][0] for p in info['green'])
+        target = base_cycle if cycle is None else cycle.get(tls_id, base_cycle) if isinstance(cycle, dict) else cycle
+        available[i] = target - lost
+
+    green = split_green(phase_scores(scores, serves), valid, available, min_green, max_green)
+    return TimingPlan(tls_ids, cube.times, layout, green)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reallocate green times from dataset samples")
+    parser.add_argument("datasets", nargs='+', help="Dataset CSV files or columnar .cols directories")
+    parser.add_argument("--net", required=True, help="Network file (.net.xml)")
+    parser.add_argument("--tll", default=None, help="Optional .tll.xml overriding the net's programs")
+    parser.add_argument("--program", default=None)
+    parser.add_argument("--tls", default=None, help="Traffic light ID for per-edge files without a tls column")
+    parser.add_argument("--edges", nargs='*', default=None,
+                        help="Edge ID of each dataset file without an edge column, in order (e.g. E1-3 E2-3 E4-3 E5-3)")
+    parser.add_argument("--window", type=int, default=WINDOW)
+    parser.add_argument("--cycle", type=float, default=None)
+    parser.add_argument("--min-green", type=float, default=MIN_GREEN)
+    parser.add_argument("--max-green", type=float, default=MAX_GREEN)
+    parser.add_argument("--output", default="reallocated.tll.xml")
+    args = parser.parse_args(argv)
+
+    layout = load_phase_layout(args.net, args.tll, args.program)
+    if args.edges and len(args.edges) != len(args.datasets):
+        parser.error("--edges needs one edge per dataset file")
+    cube = load_cube(args.datasets, args.tls, edges=args.edges)
+    plan = reallocate(cube, layout, args.window, args.cycle, args.min_green, args.max_green)
+    for row in plan.table(-1):
+        if _is_green_phase(row['state']):
+            print(f"{row['tls']} pha {row['phase']}: greenTime mới = {row['duration']:.2f} giây")
+    print(f"Wrote {plan.write_tll(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
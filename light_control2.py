@@ -2,7 +2,6 @@ import os
 import sys
 import numpy as np
 import random
-import matplotlib.pyplot as plt
 from datetime import datetime
 
 if 'SUMO_HOME' in os.environ:
@@ -13,11 +12,17 @@ else:
     sys.exit("Please declare environment variable 'SUMO_HOME'")
 
 import traci
+from vehicle_registry import VehicleRegistry
+from telemetry import TelemetryWriter
+from plotting import pyplot, submit
 
 # Cấu hình
 SUMO_CFG = r"C:\Users\Admin\Downloads\sumo test\New folder\dataset.sumocfg"
 TLS_ID = "E3"
 LANES = ["E3-2-2", "E3-2-1", "E1-3-1", "E1-3-2", "E3-4-1", "E3-4-2", "E5-3-1", "E5-3-2"]
+NS_DETECTORS = ["E3-2-1", "E3-2-2", "E5-3-1", "E5-3-2"]  # Bắc + Nam
+EW_DETECTORS = ["E3-4-1", "E3-4-2", "E1-3-1", "E1-3-2"]  # Đông + Tây
+STATE_SPACE = (5, 5, 5, 2)  # ns_queue, ew_queue, density, is_ns_green
 
 # Tham số pha đèn
 GREEN_PHASE_1 = 0
@@ -49,46 +54,53 @@ WEIGHT_MAP = {
     "emergency": 3,
 }
 
+# Cache loại xe / trọng số, cập nhật sau mỗi simulationStep()
+vehicle_registry = VehicleRegistry(WEIGHT_MAP)
+
 # Lấy trạng thái hiện tại của hệ thống
-def get_state():
+# conn: module traci (mặc định) hoặc connection có tên từ traci.getConnection(label)
+def get_state(conn=traci):
     # Lấy thông tin từng làn và lưu theo hướng
-    north_queue = traci.lanearea.getLastStepHaltingNumber("E3-2-1") + traci.lanearea.getLastStepHaltingNumber("E3-2-2")
-    south_queue = traci.lanearea.getLastStepHaltingNumber("E5-3-1") + traci.lanearea.getLastStepHaltingNumber("E5-3-2") 
-    east_queue = traci.lanearea.getLastStepHaltingNumber("E3-4-1") + traci.lanearea.getLastStepHaltingNumber("E3-4-2")
-    west_queue = traci.lanearea.getLastStepHaltingNumber("E1-3-1") + traci.lanearea.getLastStepHaltingNumber("E1-3-2")
+    north_queue = conn.lanearea.getLastStepHaltingNumber("E3-2-1") + conn.lanearea.getLastStepHaltingNumber("E3-2-2")
+    south_queue = conn.lanearea.getLastStepHaltingNumber("E5-3-1") + conn.lanearea.getLastStepHaltingNumber("E5-3-2") 
+    east_queue = conn.lanearea.getLastStepHaltingNumber("E3-4-1") + conn.lanearea.getLastStepHaltingNumber("E3-4-2")
+    west_queue = conn.lanearea.getLastStepHaltingNumber("E1-3-1") + conn.lanearea.getLastStepHaltingNumber("E1-3-2")
     
     # Tính queue theo hướng (Bắc-Nam vs Đông-Tây)
     ns_queue = north_queue + south_queue  # Bắc-Nam
     ew_queue = east_queue + west_queue    # Đông-Tây
     
     # Lấy thêm mật độ
-    total_density = sum(traci.lanearea.getLastStepOccupancy(det) for det in LANES) / len(LANES)
+    total_density = sum(conn.lanearea.getLastStepOccupancy(det) for det in LANES) / len(LANES)
+    
+    # Thêm thông tin pha đèn hiện tại vào trạng thái
+    current_phase = conn.trafficlight.getPhase(TLS_ID)
     
-    # Discretize các giá trị
+    return discretize_state(ns_queue, ew_queue, total_density, current_phase)
+
+# Rời rạc hóa các giá trị thô thành trạng thái Q-table (dùng chung cho huấn luyện và q_policy.py)
+def discretize_state(ns_queue, ew_queue, total_density, current_phase):
     ns_queue_level = min(int(ns_queue // 5), 4)  # 0-4
     ew_queue_level = min(int(ew_queue // 5), 4)  # 0-4
     density_level = min(int(total_density * 5), 4)  # 0-4
-    
-    # Thêm thông tin pha đèn hiện tại vào trạng thái
-    current_phase = traci.trafficlight.getPhase(TLS_ID)
     is_ns_green = 1 if current_phase == GREEN_PHASE_1 else 0
-    
     return (ns_queue_level, ew_queue_level, density_level, is_ns_green)
 
 # Hàm tính reward tổng hợp
-def get_reward():
+def get_reward(conn=traci, registry=None):
+    if registry is None:
+        registry = vehicle_registry
     # 1. Tổng số xe đang chờ (queue)
-    total_queue = sum(traci.lanearea.getLastStepHaltingNumber(det) for det in LANES)
+    total_queue = sum(conn.lanearea.getLastStepHaltingNumber(det) for det in LANES)
     
     # 2. Tổng thời gian chờ
     total_waiting_time = 0
     for lane in LANES:
-        vehicle_ids = traci.lanearea.getLastStepVehicleIDs(lane)
+        vehicle_ids = conn.lanearea.getLastStepVehicleIDs(lane)
         for vid in vehicle_ids:
             try:
-                veh_type = traci.vehicle.getTypeID(vid)
-                weight = WEIGHT_MAP.get(veh_type, 1)
-                waiting_time = traci.vehicle.getAccumulatedWaitingTime(vid)
+                weight = registry.weight(vid)
+                waiting_time = conn.vehicle.getAccumulatedWaitingTime(vid)
                 total_waiting_time += waiting_time * weight
             except:
                 pass  # Xe có thể đã biến mất
@@ -96,9 +108,9 @@ def get_reward():
     # 3. Tốc độ trung bình
     avg_speeds = []
     for lane in LANES:
-        vehicle_ids = traci.lanearea.getLastStepVehicleIDs(lane)
+        vehicle_ids = conn.lanearea.getLastStepVehicleIDs(lane)
         if vehicle_ids:
-            speeds = [traci.vehicle.getSpeed(vid) for vid in vehicle_ids if traci.vehicle.getSpeed(vid) > 0.1]
+            speeds = [conn.vehicle.getSpeed(vid) for vid in vehicle_ids if conn.vehicle.getSpeed(vid) > 0.1]
             if speeds:
                 avg_speeds.append(sum(speeds) / len(speeds))
     avg_speed = sum(avg_speeds) / len(avg_speeds) if avg_speeds else 0
@@ -112,6 +124,29 @@ def get_reward():
     
     return reward
 
+# Reward rẻ chỉ từ giá trị tổng hợp của detector/làn (không truy vấn từng xe), dùng cho
+# các bước bị bỏ qua giữa hai lần ra quyết định. Cùng ba thành phần với get_reward(), nhưng
+# thời gian chờ là tổng thời gian chờ hiện tại của làn (lane.getWaitingTime), không tích lũy
+# và không nhân trọng số loại xe; tốc độ là tốc độ trung bình của từng detector.
+# lanes: làn của các detector trong LANES (lấy một lần bằng detector_lanes())
+def detector_lanes(conn=traci):
+    return [conn.lanearea.getLaneID(det) for det in LANES]
+
+def get_aggregate_reward(conn=traci, lanes=None):
+    if lanes is None:
+        lanes = detector_lanes(conn)
+    total_queue = sum(conn.lanearea.getLastStepHaltingNumber(det) for det in LANES)
+    total_waiting_time = sum(conn.lane.getWaitingTime(lane) for lane in lanes)
+    # getLastStepMeanSpeed trả về -1 khi detector không có xe
+    speeds = [conn.lanearea.getLastStepMeanSpeed(det) for det in LANES]
+    speeds = [v for v in speeds if v > 0.1]
+    avg_speed = sum(speeds) / len(speeds) if speeds else 0
+    return -(
+        QUEUE_WEIGHT * total_queue +
+        WAITING_WEIGHT * (total_waiting_time / 100) -
+        SPEED_WEIGHT * avg_speed
+    )
+
 # Chọn hành động dựa trên Q-table và chính sách epsilon-greedy
 def choose_action(state, Q_table, n_actions, epsilon):
     if np.random.rand() < epsilon:
@@ -119,6 +154,65 @@ def choose_action(state, Q_table, n_actions, epsilon):
     else:
         return np.argmax(Q_table[state])
 
+# Chọn hành động cho nhiều môi trường cùng lúc (states: mảng K x 4)
+def choose_actions(states, Q_table, n_actions, epsilon):
+    states = np.asarray(states, dtype=np.int64)
+    greedy = np.argmax(Q_table[tuple(states.T)], axis=1)
+    explore = np.random.rand(len(states)) < epsilon
+    random_actions = np.random.randint(n_actions, size=len(states))
+    return np.where(explore, random_actions, greedy)
+
+# Cập nhật Q-table theo lô; mask chọn các môi trường vừa thực hiện quyết định.
+# discounts: hệ số chiết khấu riêng cho từng môi trường (gamma**số bước khi bỏ qua khung hình)
+def update_q_batch(Q_table, states, actions, rewards, next_states, mask=None, discounts=None):
+    states = np.asarray(states, dtype=np.int64)
+    next_states = np.asarray(next_states, dtype=np.int64)
+    actions = np.asarray(actions, dtype=np.int64)
+    rewards = np.asarray(rewards, dtype=np.float64)
+    discounts = np.full(len(rewards), gamma) if discounts is None else np.asarray(discounts, dtype=np.float64)
+    if mask is not None:
+        states, next_states = states[mask], next_states[mask]
+        actions, rewards, discounts = actions[mask], rewards[mask], discounts[mask]
+    if len(states) == 0:
+        return
+    idx = tuple(states.T) + (actions,)
+    target = rewards + discounts * np.max(Q_table[tuple(next_states.T)], axis=1)
+    # np.add.at để các môi trường cùng trạng thái không ghi đè lẫn nhau
+    np.add.at(Q_table, idx, alpha * (target - Q_table[idx]))
+
+def plot_results(episode_rewards, episode_avg_queues, episode_avg_waiting_times, plot_file):
+    """Reward, average queue and average waiting time per episode, saved to plot_file."""
+    plt = pyplot()
+    plt.figure(figsize=(15, 5))
+    
+    # Plot rewards
+    plt.subplot(1, 3, 1)
+    plt.plot(range(1, len(episode_rewards) + 1), episode_rewards)
+    plt.xlabel('Episode')
+    plt.ylabel('Total Reward')
+    plt.title('Reward per Episode')
+    plt.grid(True)
+    
+    # Plot average queue
+    plt.subplot(1, 3, 2)
+    plt.plot(range(1, len(episode_avg_queues) + 1), episode_avg_queues)
+    plt.xlabel('Episode')
+    plt.ylabel('Average Queue Length')
+    plt.title('Average Queue per Episode')
+    plt.grid(True)
+    
+    # Plot average waiting time
+    plt.subplot(1, 3, 3)
+    plt.plot(range(1, len(episode_avg_waiting_times) + 1), episode_avg_waiting_times)
+    plt.xlabel('Episode')
+    plt.ylabel('Average Waiting Time')
+    plt.title('Average Waiting Time per Episode')
+    plt.grid(True)
+    
+    plt.tight_layout()
+    plt.savefig(plot_file)
+    plt.close()
+
 # Hàm chính
 def main():
     # Tạo thư mục để lưu kết quả
@@ -126,7 +220,7 @@ def main():
     os.makedirs(results_dir, exist_ok=True)
     
     # Kích thước không gian trạng thái và hành động
-    state_space = (5, 5, 5, 2)  # ns_queue, ew_queue, density, is_ns_green
+    state_space = STATE_SPACE
     n_actions = 2  # 0: xanh NS, 1: xanh EW
     
     # Khởi tạo hoặc tải Q-table
@@ -143,6 +237,9 @@ def main():
     episode_avg_queues = []
     episode_avg_waiting_times = []
     
+    # Ghi telemetry theo bước/episode trong lúc huấn luyện (xem bằng telemetry_view.py)
+    telemetry = TelemetryWriter()
+    
     # Training loop
     current_epsilon = epsilon
     for episode in range(EPISODES):
@@ -151,12 +248,13 @@ def main():
         # Khởi tạo SUMO
         sumo_cmd = [SUMO_BINARY, "-c", SUMO_CFG, "--start"]
         traci.start(sumo_cmd)
+        vehicle_registry.clear()
         
         # Tracking metrics cho episode hiện tại
         step = 0
         episode_reward = 0
-        queues = []
-        waiting_times = []
+        queue_sum = 0
+        waiting_sum = 0
         
         # Khởi tạo đèn giao thông
         traci.trafficlight.setPhase(TLS_ID, GREEN_PHASE_1)
@@ -173,8 +271,13 @@ def main():
         try:
             while traci.simulation.getMinExpectedNumber() > 0 and step < MAX_STEP:
                 # Chỉ chọn action mới khi không trong trạng thái vàng và đủ thời gian pha tối thiểu
-                if not in_yellow and phase_duration >= MIN_PHASE_DURATION:
+                decision = not in_yellow and phase_duration >= MIN_PHASE_DURATION
+                if decision:
                     action = choose_action(state, Q, n_actions, current_epsilon)
+                    # Xác suất của action theo chính sách epsilon-greedy (cho offline_eval.py)
+                    behavior_prob = current_epsilon / n_actions
+                    if action == np.argmax(Q[state]):
+                        behavior_prob += 1 - current_epsilon
                     
                     # Kiểm tra xem có cần chuyển pha không
                     target_phase = GREEN_PHASE_1 if action == 0 else GREEN_PHASE_2
@@ -200,6 +303,7 @@ def main():
                 
                 # Thực hiện một bước mô phỏng
                 traci.simulationStep()
+                vehicle_registry.update()
                 
                 # Lấy trạng thái mới và reward
                 next_state = get_state()
@@ -208,7 +312,7 @@ def main():
                 
                 # Thu thập metrics
                 total_queue = sum(traci.lanearea.getLastStepHaltingNumber(det) for det in LANES)
-                queues.append(total_queue)
+                queue_sum += total_queue
                 
                 total_waiting = 0
                 for lane in LANES:
@@ -217,7 +321,12 @@ def main():
                             total_waiting += traci.vehicle.getAccumulatedWaitingTime(vid)
                         except:
                             pass
-                waiting_times.append(total_waiting)
+                waiting_sum += total_waiting
+                telemetry.log_step(episode=episode + 1, step=step, reward=reward,
+                                   queue=total_queue, waiting_time=total_waiting,
+                                   s_ns=state[0], s_ew=state[1], s_density=state[2], s_green=state[3],
+                                   action=int(action), decision=int(decision),
+                                   behavior_prob=behavior_prob if decision else '')
                 
                 # Q-learning update (chỉ khi đã chọn action mới và không phải đèn vàng)
                 if not in_yellow and phase_duration == 1:  # Vừa chuyển phase xong
@@ -233,11 +342,14 @@ def main():
                     print(f"Step {step}, Queue: {total_queue}, Reward: {reward:.2f}")
             
             # Kết thúc episode, thu thập metrics
-            if queues:
-                episode_avg_queues.append(sum(queues) / len(queues))
-            if waiting_times:
-                episode_avg_waiting_times.append(sum(waiting_times) / len(waiting_times))
+            if step:
+                episode_avg_queues.append(queue_sum / step)
+                episode_avg_waiting_times.append(waiting_sum / step)
             episode_rewards.append(episode_reward)
+            telemetry.log_episode(episode=episode + 1, steps=step, total_reward=episode_reward,
+                                  avg_queue=queue_sum / max(step, 1),
+                                  avg_waiting_time=waiting_sum / max(step, 1),
+                                  epsilon=current_epsilon)
             
             print(f"Episode {episode+1} completed. Steps: {step}, Avg Queue: {episode_avg_queues[-1]:.2f}, Total Reward: {episode_reward:.2f}")
             
@@ -253,40 +365,13 @@ def main():
         np.save(qtable_file, Q)
         print(f"Saved Q-table to {qtable_file}")
     
-    # Vẽ biểu đồ kết quả
-    plt.figure(figsize=(15, 5))
-    
-    # Plot rewards
-    plt.subplot(1, 3, 1)
-    plt.plot(range(1, EPISODES+1), episode_rewards)
-    plt.xlabel('Episode')
-    plt.ylabel('Total Reward')
-    plt.title('Reward per Episode')
-    plt.grid(True)
-    
-    # Plot average queue
-    plt.subplot(1, 3, 2)
-    plt.plot(range(1, EPISODES+1), episode_avg_queues)
-    plt.xlabel('Episode')
-    plt.ylabel('Average Queue Length')
-    plt.title('Average Queue per Episode')
-    plt.grid(True)
-    
-    # Plot average waiting time
-    plt.subplot(1, 3, 3)
-    plt.plot(range(1, EPISODES+1), episode_avg_waiting_times)
-    plt.xlabel('Episode')
-    plt.ylabel('Average Waiting Time')
-    plt.title('Average Waiting Time per Episode')
-    plt.grid(True)
-    
-    plt.tight_layout()
+    telemetry.close()
+    print(f"Telemetry saved to {telemetry.paths['step']} and {telemetry.paths['episode']}")
     
-    # Lưu biểu đồ
+    # Vẽ biểu đồ kết quả trong tiến trình nền (không chặn, không mở cửa sổ)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     plot_file = os.path.join(results_dir, f"results_{timestamp}.png")
-    plt.savefig(plot_file)
-    plt.show()
+    submit(plot_results, episode_rewards, episode_avg_queues, episode_avg_waiting_times, plot_file)
     
     print(f"Training completed. Results saved to {plot_file}")
     print("Final Q-table statistics:")
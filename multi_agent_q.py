@@ -0,0 +1,271 @@
+import os
+import sys
+import pickle
+
+import numpy as np
+
+if 'SUMO_HOME' in os.environ:
+    tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
+    sys.path.append(tools)
+else:
+    sys.exit("Vui lòng khai báo biến môi trường 'SUMO_HOME'")
+
+import traci
+from traci import constants as tc
+
+# ====== CONFIGURATION ======
+SUMO_CFG_20E = r"C:\Users\Admin\Downloads\sumo test\New folder\20 node\20e.sumocfg"
+NET_FILE_20E = r"C:\Users\Admin\Downloads\sumo test\New folder\20 node\20e_with_tls.net.xml"
+# Bộ dò E2 sinh từ chính NET_FILE_20E (generate_detectors.py); ID làn khác với 20e.net.xml
+DET_FILE_20E = r"C:\Users\Admin\Downloads\sumo test\New folder\20 node\20e_with_tls.det.add.xml"
+RESULTS_DIR = "q_learning_results"
+QTABLE_FILE = os.path.join(RESULTS_DIR, "multi_agent_qtable.pkl")
+
+MIN_GREEN_TIME = 12   # Số bước (1 s) tối thiểu của một pha xanh
+YELLOW_TIME = 4
+QUEUE_BIN = 3         # Số xe dừng cho mỗi mức hàng đợi
+QUEUE_LEVELS = 5      # Mức 0-4 cho mỗi hướng
+EPISODES = 30
+MAX_STEP = 3600
+
+# Q-learning params
+alpha = 0.2
+gamma = 0.95
+epsilon = 0.3
+epsilon_decay = 0.95
+epsilon_min = 0.05
+
+
+def detect_agents(conn=traci, tls_ids=None):
+    """
+    Build one agent per traffic light, like auto_detect_intersection_structure():
+    controlled lanes are grouped into approaches by edge, and each approach gets
+    green/yellow state strings covering its controlled links.
+    The agent's 'shape' (signal count, lanes per approach) identifies intersections
+    that can share Q-values. tls_ids restricts the agents to a subset of lights.
+    """
+    agents = []
+    for tl_id in (conn.trafficlight.getIDList() if tls_ids is None else tls_ids):
+        controlled_links = conn.trafficlight.getControlledLinks(tl_id)
+        n_lights = len(conn.trafficlight.getRedYellowGreenState(tl_id))
+        approaches = {}
+        for lane_id in set(conn.trafficlight.getControlledLanes(tl_id)):
+            if ':' not in lane_id:
+                edge_id = lane_id.rsplit('_', 1)[0]
+                approaches.setdefault(edge_id, []).append(lane_id)
+        if not approaches:
+            continue
+        approach_names = sorted(approaches)
+        states = []
+        for name in approach_names:
+            lanes = approaches[name]
+            state = ['r'] * n_lights
+            for link_i, links in enumerate(controlled_links):
+                if link_i < n_lights and any(link[0] in lanes for link in links):
+                    state[link_i] = 'G'
+            green = ''.join(state)
+            states.append({'G': green, 'y': green.replace('G', 'y')})
+        agents.append({
+            'tl_id': tl_id,
+            'approaches': approach_names,
+            'lanes': [sorted(approaches[name]) for name in approach_names],
+            'states': states,
+            'shape': (n_lights,) + tuple(len(approaches[name]) for name in approach_names),
+        })
+    return agents
+
+
+class SparseQTable:
+    """
+    Q-values stored per visited state in a dict, so memory grows with the states
+    actually seen instead of the full product space.
+    With share_parameters=True, intersections with the same shape read and write
+    the same table.
+    """
+
+    def __init__(self, share_parameters=True):
+        self.share_parameters = share_parameters
+        self.tables = {}
+
+    def namespace(self, agent):
+        return ('shape',) + agent['shape'] if self.share_parameters else ('tls', agent['tl_id'])
+
+    def row(self, namespace, state, n_actions):
+        table = self.tables.setdefault(namespace, {})
+        values = table.get(state)
+        if values is None:
+            values = np.zeros(n_actions)
+            table[state] = values
+        return values
+
+    def __len__(self):
+        return sum(len(table) for table in self.tables.values())
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump({'share_parameters': self.share_parameters, 'tables': self.tables}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+        qtable = cls(data['share_parameters'])
+        qtable.tables = data['tables']
+        return qtable
+
+
+class MultiAgentController:
+    """
+    Runs one Q-learning agent per traffic light.
+    Lane queues for the whole network come from one getAllSubscriptionResults()
+    call per step; states, rewards, epsilon-greedy selection and Q updates are
+    computed for all agents in one pass.
+    """
+
+    def __init__(self, qtable, conn=traci, seed=None, tls_ids=None):
+        self.conn = conn
+        self.qtable = qtable
+        self.rng = np.random.default_rng(seed)
+        self.agents = detect_agents(conn, tls_ids)
+        self.n_agents = len(self.agents)
+        self.namespaces = [qtable.namespace(agent) for agent in self.agents]
+        self.n_actions = np.array([len(agent['approaches']) for agent in self.agents])
+
+        # Chỉ số hướng toàn cục cho từng làn -> gộp hàng đợi bằng np.bincount
+        self.lanes = []
+        lane_approach = []
+        self.approach_offsets = [0]
+        for agent in self.agents:
+            base = self.approach_offsets[-1]
+            for a_idx, lanes in enumerate(agent['lanes']):
+                self.lanes.extend(lanes)
+                lane_approach.extend([base + a_idx] * len(lanes))
+            self.approach_offsets.append(base + len(agent['approaches']))
+        self.lane_approach = np.array(lane_approach, dtype=np.int64)
+        self.n_approaches = self.approach_offsets[-1]
+        self.agent_of_approach = np.repeat(np.arange(self.n_agents), self.n_actions)
+
+        for lane_id in self.lanes:
+            conn.lane.subscribe(lane_id, [tc.LAST_STEP_VEHICLE_HALTING_NUMBER])
+
+        self.current = np.zeros(self.n_agents, dtype=np.int64)
+        self.pending = np.zeros(self.n_agents, dtype=np.int64)
+        self.green_time = np.zeros(self.n_agents, dtype=np.int64)
+        self.yellow_timer = np.zeros(self.n_agents, dtype=np.int64)
+        self.in_yellow = np.zeros(self.n_agents, dtype=bool)
+        for i, agent in enumerate(self.agents):
+            conn.trafficlight.setRedYellowGreenState(agent['tl_id'], agent['states'][0]['G'])
+
+    def observe(self):
+        """Return (states, per-agent queue totals) after the last simulation step."""
+        results = self.conn.lane.getAllSubscriptionResults()
+        halting = np.fromiter(
+            (results.get(lane_id, {}).get(tc.LAST_STEP_VEHICLE_HALTING_NUMBER, 0) for lane_id in self.lanes),
+            dtype=np.float64, count=len(self.lanes))
+        approach_queue = np.bincount(self.lane_approach, weights=halting, minlength=self.n_approaches)
+        levels = np.minimum(approach_queue // QUEUE_BIN, QUEUE_LEVELS - 1).astype(np.int64)
+        states = [
+            tuple(levels[self.approach_offsets[i]:self.approach_offsets[i + 1]].tolist()) + (int(self.current[i]),)
+            for i in range(self.n_agents)
+        ]
+        queues = np.bincount(self.agent_of_approach, weights=approach_queue, minlength=self.n_agents)
+        return states, queues
+
+    def decidable(self):
+        return ~self.in_yellow & (self.green_time >= MIN_GREEN_TIME)
+
+    def q_rows(self, states):
+        return [self.qtable.row(ns, s, n) for ns, s, n in zip(self.namespaces, states, self.n_actions)]
+
+    def choose_actions(self, states, eps):
+        greedy = np.array([int(np.argmax(row)) for row in self.q_rows(states)], dtype=np.int64)
+        explore = self.rng.random(self.n_agents) < eps
+        random_actions = (self.rng.random(self.n_agents) * self.n_actions).astype(np.int64)
+        return np.where(explore, random_actions, greedy)
+
+    def update(self, states, actions, rewards, next_states, mask):
+        rows = self.q_rows(states)
+        next_rows = self.q_rows(next_states)
+        for i in np.flatnonzero(mask):
+            a = actions[i]
+            target = rewards[i] + gamma * next_rows[i].max()
+            rows[i][a] += alpha * (target - rows[i][a])
+
+    def apply(self, actions, mask):
+        """Start yellow for agents whose chosen approach differs from the current green."""
+        switch = mask & (actions != self.current)
+        for i in np.flatnonzero(switch):
+            agent = self.agents[i]
+            self.conn.trafficlight.setRedYellowGreenState(agent['tl_id'], agent['states'][self.current[i]]['y'])
+        self.pending[switch] = actions[switch]
+        self.in_yellow |= switch
+        self.yellow_timer[switch] = 0
+
+    def tick(self):
+        """Advance phase timers by one step and finish yellow phases that have run out."""
+        self.yellow_timer[self.in_yellow] += 1
+        self.green_time[~self.in_yellow] += 1
+        done = self.in_yellow & (self.yellow_timer >= YELLOW_TIME)
+        for i in np.flatnonzero(done):
+            agent = self.agents[i]
+            self.conn.trafficlight.setRedYellowGreenState(agent['tl_id'], agent['states'][self.pending[i]]['G'])
+        self.current[done] = self.pending[done]
+        self.green_time[done] = 0
+        self.in_yellow[done] = False
+
+
+def detector_args(det_file):
+    """--additional-files for a detector file matching the --net-file, if it exists."""
+    return ['--additional-files', det_file] if det_file and os.path.exists(det_file) else []
+
+
+def train_multi_agent(sumo_cfg=SUMO_CFG_20E, net_file=NET_FILE_20E, episodes=EPISODES,
+                      max_step=MAX_STEP, share_parameters=True, gui=False, det_file=DET_FILE_20E):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    try:
+        qtable = SparseQTable.load(QTABLE_FILE)
+        print(f"Loaded previous Q-table from {QTABLE_FILE} ({len(qtable)} states)")
+    except:
+        qtable = SparseQTable(share_parameters)
+        print("Created new sparse Q-table")
+
+    binary = 'sumo-gui' if gui else 'sumo'
+    sumo_cmd = [os.path.join(os.environ['SUMO_HOME'], 'bin', binary), '-c', sumo_cfg,
+                '--net-file', net_file, '--no-step-log', 'true'] + detector_args(det_file)
+    current_epsilon = epsilon
+    for episode in range(episodes):
+        print(f"\nEpisode {episode+1}/{episodes} (epsilon: {current_epsilon:.3f})")
+        traci.start(sumo_cmd)
+        try:
+            controller = MultiAgentController(qtable)
+            traci.simulationStep()
+            states, queues = controller.observe()
+            episode_reward = 0.0
+            step = 0
+            while traci.simulation.getMinExpectedNumber() > 0 and step < max_step:
+                mask = controller.decidable()
+                actions = np.where(mask, controller.choose_actions(states, current_epsilon), controller.current)
+                controller.apply(actions, mask)
+                traci.simulationStep()
+                controller.tick()
+                next_states, queues = controller.observe()
+                rewards = -queues
+                controller.update(states, actions, rewards, next_states, mask)
+                episode_reward += rewards.sum()
+                states = next_states
+                step += 1
+                if step % 100 == 0:
+                    print(f"Step {step}, Total queue: {queues.sum():.0f}, Q states: {len(qtable)}")
+            print(f"Episode {episode+1} completed. Agents: {controller.n_agents}, "
+                  f"Steps: {step}, Total Reward: {episode_reward:.2f}")
+        except Exception as e:
+            print(f"Error in episode {episode+1}: {e}")
+        finally:
+            traci.close()
+        current_epsilon = max(epsilon_min, current_epsilon * epsilon_decay)
+        qtable.save(QTABLE_FILE)
+        print(f"Saved Q-table to {QTABLE_FILE} ({len(qtable)} states)")
+
+
+if __name__ == "__main__":
+    train_multi_agent()
@@ -0,0 +1,178 @@
+import os
+import time
+import pickle
+import argparse
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from result_cache import config_key, scenario_files_from_sumocfg
+
+MODEL_CACHE_DIR = "network_cache"
+MODEL_VERSION = 1       # Tăng khi cấu trúc NetworkModel thay đổi để bỏ cache cũ
+
+
+class NetworkModel:
+    """
+    Static topology of a SUMO scenario compiled from .net.xml / .add.xml:
+    lanes (edge, index, length, speed), traffic lights (controlled lanes and links
+    by link index, turn directions, approaches) and lane area detectors.
+    Everything a controller used to discover through TraCI at startup.
+    """
+
+    def __init__(self):
+        self.lane_ids = []
+        self.lane_edge = []
+        self.lane_length = np.empty(0)
+        self.lane_speed = np.empty(0)
+        self.lane_index = {}
+        self.tls = {}
+        self.detectors = {}
+
+    def lane_length_of(self, lane_id):
+        return float(self.lane_length[self.lane_index[lane_id]])
+
+    def edge_of(self, lane_id):
+        return self.lane_edge[self.lane_index[lane_id]]
+
+    def tls_ids(self):
+        return sorted(self.tls)
+
+    def intersection_data(self):
+        """Same structure as universal_smart_intersection.auto_detect_intersection_structure()."""
+        data = {}
+        for tl_id, info in self.tls.items():
+            lane_to_detector = {}
+            controlled = set(info['controlled_lanes'])
+            for det_id, det in self.detectors.items():
+                if det['lane'] in controlled:
+                    lane_to_detector[det['lane']] = det_id
+            approaches = {}
+            for lane_id in sorted(controlled):
+                if lane_id.startswith(':'):
+                    continue
+                approach = approaches.setdefault(self.edge_of(lane_id), {'lanes': [], 'detectors': [], 'lane_count': 0})
+                approach['lanes'].append(lane_id)
+                approach['lane_count'] += 1
+                if lane_id in lane_to_detector:
+                    approach['detectors'].append(lane_to_detector[lane_id])
+            data[tl_id] = {
+                'approaches': approaches,
+                'controlled_links': info['controlled_links'],
+                'controlled_lanes': info['controlled_lanes'],
+                'lane_to_detector': lane_to_detector,
+                'total_approaches': len(approaches),
+                'total_lanes': len(controlled),
+            }
+        return data
+
+
+def compile_network(net_file, additional_files=()):
+    """Parse the net (streaming) and additional files once into a NetworkModel."""
+    model = NetworkModel()
+    lengths, speeds = [], []
+    links = {}
+    programs = {}
+    context = ET.iterparse(net_file, events=('start', 'end'))
+    _, root = next(context)
+    for event, elem in context:
+        if event != 'end':
+            continue
+        if elem.tag == 'edge':
+            for lane in elem.findall('lane'):
+                model.lane_index[lane.get('id')] = len(model.lane_ids)
+                model.lane_ids.append(lane.get('id'))
+                model.lane_edge.append(elem.get('id'))
+                lengths.append(float(lane.get('length', 0)))
+                speeds.append(float(lane.get('speed', 0)))
+            root.clear()
+        elif elem.tag == 'tlLogic':
+            programs.setdefault(elem.get('id'), []).append({
+                'program': elem.get('programID'),
+                'phases': [(float(ph.get('duration')), ph.get('state')) for ph in elem.findall('phase')],
+            })
+            root.clear()
+        elif elem.tag == 'connection':
+            tl = elem.get('tl')
+            if tl is not None:
+                links.setdefault(tl, {})[int(elem.get('linkIndex'))] = (
+                    f"{elem.get('from')}_{elem.get('fromLane')}", f"{elem.get('to')}_{elem.get('toLane')}",
+                    elem.get('via', ''), elem.get('dir', 's'))
+            root.clear()
+        elif elem.tag in ('junction', 'type', 'roundabout', 'location'):
+            root.clear()
+    model.lane_length = np.array(lengths)
+    model.lane_speed = np.array(speeds)
+
+    for tl_id, tl_links in links.items():
+        n_links = max(tl_links) + 1
+        controlled_lanes = [''] * n_links
+        controlled_links = [[] for _ in range(n_links)]
+        dirs = [''] * n_links
+        for index, (from_lane, to_lane, via, direction) in tl_links.items():
+            controlled_lanes[index] = from_lane
+            controlled_links[index] = [(from_lane, to_lane, via)]
+            dirs[index] = direction
+        model.tls[tl_id] = {'controlled_lanes': controlled_lanes, 'controlled_links': controlled_links,
+                            'dirs': dirs, 'programs': programs.get(tl_id, [])}
+
+    for path in additional_files:
+        for _, elem in ET.iterparse(path):
+            if elem.tag in ('laneAreaDetector', 'e2Detector'):
+                lane = elem.get('lane') or (elem.get('lanes') or '').split(' ')[0]
+                model.detectors[elem.get('id')] = {
+                    'lane': lane, 'pos': float(elem.get('pos', 0)),
+                    'length': float(elem.get('length', 0) or 0), 'file': elem.get('file'),
+                }
+    return model
+
+
+def _scenario_files(sumocfg):
+    files = scenario_files_from_sumocfg(sumocfg)
+    net = [f for f in files if f.endswith('.net.xml')]
+    additional = [f for f in files if f not in net and f != sumocfg and not f.endswith('.rou.xml')]
+    return net[0], [f for f in additional if os.path.exists(f)]
+
+
+def load_network(net_file=None, additional_files=(), sumocfg=None, cache_dir=MODEL_CACHE_DIR):
+    """
+    Return the compiled NetworkModel, from <cache_dir>/<key>.pkl when the net and
+    additional files are unchanged (key = hash of their contents), compiling and
+    caching it otherwise. Pass either net_file (+ additional_files) or a .sumocfg;
+    with a .sumocfg, additional_files are added to the ones it lists.
+    """
+    if sumocfg is not None:
+        net_file, cfg_additional = _scenario_files(sumocfg)
+        additional_files = cfg_additional + [f for f in additional_files if f not in cfg_additional]
+    files = [net_file] + list(additional_files)
+    key = config_key({'model': MODEL_VERSION}, files)
+    path = os.path.join(cache_dir, f"network_{key}.pkl")
+    if os.path.exists(path):
+        model = NetworkModel()
+        with open(path, 'rb') as f:
+            model.__dict__.update(pickle.load(f))
+        return model
+    model = compile_network(net_file, additional_files)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = path + '.tmp'
+    # Chỉ lưu dữ liệu (dict, list, ndarray), không tham chiếu tới lớp, để đọc được từ mọi module
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(model.__dict__, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return model
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile a SUMO network into a cached binary model")
+    parser.add_argument("sumocfg", help="Scenario .sumocfg (net and additional files are read from it)")
+    parser.add_argument("--cache-dir", default=MODEL_CACHE_DIR)
+    args = parser.parse_args(argv)
+    for attempt in ("compile/load", "cached load"):
+        start = time.perf_counter()
+        model = load_network(sumocfg=args.sumocfg, cache_dir=args.cache_dir)
+        print(f"{attempt}: {(time.perf_counter() - start) * 1000:.1f} ms")
+    print(f"{len(model.tls)} traffic lights, {len(model.lane_ids)} lanes, {len(model.detectors)} detectors")
+
+
+if __name__ == "__main__":
+    main()
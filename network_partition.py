@@ -0,0 +1,387 @@
+import os
+import sys
+import argparse
+import multiprocessing as mp
+from collections import deque
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from network_model import load_network
+
+if 'SUMO_HOME' in os.environ:
+    tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
+    sys.path.append(tools)
+else:
+    sys.exit("Vui lòng khai báo biến môi trường 'SUMO_HOME'")
+
+import traci
+from sumolib.miscutils import getFreeSocketPort
+
+from multi_agent_q import (SparseQTable, MultiAgentController, SUMO_CFG_20E, NET_FILE_20E, DET_FILE_20E, RESULTS_DIR,
+                           QTABLE_FILE, MAX_STEP, epsilon_min, detector_args)
+
+# ====== CONFIGURATION ======
+REGIONS = 4
+BALANCE_TOLERANCE = 0.10    # Mỗi vùng được nặng hơn trung bình tối đa 10%
+REFINE_PASSES = 10
+DEMAND_WEIGHT = 1.0         # Mức ảnh hưởng của nhu cầu so với số làn khi tính trọng số nút
+BOUNDARY_WEIGHT = 0.5       # Hệ số hàng đợi của đèn hạ lưu trong phần thưởng
+BOARD_FIELDS = 2            # Mỗi đèn trên bảng dùng chung: [hàng đợi, hướng xanh hiện tại]
+
+
+def tls_graph(model, tls_ids=None):
+    """
+    Traffic light graph of a compiled NetworkModel: (tls_ids, adjacency, downstream).
+    Two lights are adjacent when a link of one leads into a lane controlled by the
+    other; adjacency[a][b] is the number of such lanes (both directions summed) and
+    downstream[a] the lights a's traffic flows into.
+    """
+    tls_ids = model.tls_ids() if tls_ids is None else list(tls_ids)
+    lane_owner = {}
+    for tl_id in tls_ids:
+        for lane_id in model.tls[tl_id]['controlled_lanes']:
+            if lane_id and not lane_id.startswith(':'):
+                lane_owner[lane_id] = tl_id
+    adjacency = {tl_id: {} for tl_id in tls_ids}
+    downstream = {tl_id: set() for tl_id in tls_ids}
+    for tl_id in tls_ids:
+        to_lanes = {link[1] for links in model.tls[tl_id]['controlled_links'] for link in links}
+        for to_lane in to_lanes:
+            other = lane_owner.get(to_lane)
+            if other is None or other == tl_id:
+                continue
+            downstream[tl_id].add(other)
+            adjacency[tl_id][other] = adjacency[tl_id].get(other, 0) + 1
+            adjacency[other][tl_id] = adjacency[other].get(tl_id, 0) + 1
+    return tls_ids, adjacency, downstream
+
+
+def demand_from_e2(model, paths):
+    """
+    {lane_id: vehicles entered} summed over E2 output files, for detectors known to the
+    model. Raises ValueError when none of the detectors in the files is in the model
+    (e.g. the model was loaded without the matching detector file).
+    """
+    from e2_reader import read_e2
+    table = read_e2(paths)
+    demand = {}
+    unknown = set()
+    for detector, entered in zip(table['detector'].tolist(), np.nan_to_num(table['nVehEntered']).tolist()):
+        det = model.detectors.get(detector)
+        if det is None:
+            unknown.add(detector)
+        elif det['lane'] in model.lane_index:
+            demand[det['lane']] = demand.get(det['lane'], 0.0) + entered
+    if not demand:
+        raise ValueError(f"None of the {len(unknown)} detectors in the E2 files belongs to the network "
+                         f"({len(model.detectors)} detectors loaded); pass the detector file of this net")
+    if unknown:
+        print(f"Warning: {len(unknown)} detectors in the E2 files are not in the network and were ignored")
+    return demand
+
+
+def load_model(sumo_cfg=SUMO_CFG_20E, net_file=NET_FILE_20E, det_file=DET_FILE_20E):
+    """The network model with the detector file that matches net_file (or the .sumocfg's own files)."""
+    if not net_file:
+        return load_network(sumocfg=sumo_cfg)
+    return load_network(net_file, [det_file] if det_file and os.path.exists(det_file) else [])
+
+
+def node_weights(model, tls_ids, lane_demand=None, demand_weight=DEMAND_WEIGHT):
+    """
+    Load of each light: its controlled lane count, scaled by its share of the expected
+    demand (lanes * (1 + demand_weight * demand / mean demand)) when lane_demand is given.
+    """
+    lanes = np.array([len({l for l in model.tls[t]['controlled_lanes'] if l and not l.startswith(':')})
+                      for t in tls_ids], dtype=np.float64)
+    if not lane_demand:
+        return lanes
+    demand = np.array([sum(lane_demand.get(l, 0.0) for l in set(model.tls[t]['controlled_lanes']))
+                       for t in tls_ids], dtype=np.float64)
+    if demand.mean() > 0:
+        lanes = lanes * (1.0 + demand_weight * demand / demand.mean())
+    return lanes
+
+
+def _hops(adjacency, sources):
+    """BFS hop count from the nearest source (unreachable lights get len(adjacency))."""
+    dist = {node: len(adjacency) for node in adjacency}
+    queue = deque(sources)
+    for s in sources:
+        dist[s] = 0
+    while queue:
+        node = queue.popleft()
+        for other in adjacency[node]:
+            if dist[other] > dist[node] + 1:
+                dist[other] = dist[node] + 1
+                queue.append(other)
+    return dist
+
+
+def partition(tls_ids, adjacency, weights, n_regions=REGIONS, tolerance=BALANCE_TOLERANCE, passes=REFINE_PASSES):
+    """
+    Split the lights into n_regions connected-first, weight-balanced regions with few
+    cut lanes. Regions grow from mutually distant seeds (the lightest region takes the
+    frontier light most connected to it), then boundary lights move to a neighbouring
+    region whenever that cuts fewer lanes without breaking the balance limit
+    (1 + tolerance) * mean weight. Returns an int label per light.
+    """
+    n = len(tls_ids)
+    n_regions = max(1, min(n_regions, n))
+    index = {tl_id: i for i, tl_id in enumerate(tls_ids)}
+    weights = np.asarray(weights, dtype=np.float64)
+    labels = np.full(n, -1, dtype=np.int64)
+    load = np.zeros(n_regions)
+
+    seeds = [tls_ids[int(np.argmax(weights))]]
+    while len(seeds) < n_regions:
+        dist = _hops(adjacency, seeds)
+        seeds.append(max((t for t in tls_ids if t not in seeds), key=lambda t: (dist[t], weights[index[t]])))
+    for region, seed in enumerate(seeds):
+        labels[index[seed]] = region
+        load[region] += weights[index[seed]]
+
+    def links_to(node, region):
+        return sum(w for other, w in adjacency[node].items() if labels[index[other]] == region)
+
+    while (labels < 0).any():
+        grown = False
+        for region in np.argsort(load, kind='stable'):
+            frontier = {other for i in np.flatnonzero(labels == region) for other in adjacency[tls_ids[i]]
+                        if labels[index[other]] < 0}
+            if frontier:
+                node = max(frontier, key=lambda t: (links_to(t, region), weights[index[t]]))
+                labels[index[node]] = region
+                load[region] += weights[index[node]]
+                grown = True
+                break
+        if not grown:
+            # Thành phần rời rạc: giao nút nặng nhất còn lại cho vùng nhẹ nhất
+            rest = np.flatnonzero(labels < 0)
+            node = rest[int(np.argmax(weights[rest]))]
+            region = int(np.argmin(load))
+            labels[node] = region
+            load[region] += weights[node]
+
+    limit = (1.0 + tolerance) * weights.sum() / n_regions
+    for _ in range(passes):
+        moved = False
+        for i, tl_id in enumerate(tls_ids):
+            own = labels[i]
+            if (labels == own).sum() == 1:
+                continue
+            own_links = links_to(tl_id, own)
+            overloaded = load[own] > limit
+            best, best_gain = None, None
+            for region in {labels[index[other]] for other in adjacency[tl_id]} - {own}:
+                gain = links_to(tl_id, region) - own_links
+                balance = load[own] - (load[region] + weights[i])
+                if load[region] + weights[i] > limit:
+                    continue
+                # Vùng quá tải nhả nút cho láng giềng tốt nhất kể cả khi phải cắt thêm làn
+                if (overloaded or gain > 0 or (gain == 0 and balance > 0)) and (best is None or gain > best_gain):
+                    best, best_gain = region, gain
+            if best is not None:
+                labels[i] = best
+                load[own] -= weights[i]
+                load[best] += weights[i]
+                moved = True
+        if not moved:
+            break
+    return labels
+
+
+def cut_size(tls_ids, adjacency, labels):
+    """(cut lanes, cut light pairs) between regions."""
+    index = {tl_id: i for i, tl_id in enumerate(tls_ids)}
+    lanes = pairs = 0
+    for a in tls_ids:
+        for b, w in adjacency[a].items():
+            if a < b and labels[index[a]] != labels[index[b]]:
+                lanes += w
+                pairs += 1
+    return lanes, pairs
+
+
+def partition_network(model, n_regions=REGIONS, lane_demand=None, tolerance=BALANCE_TOLERANCE):
+    """Partition a NetworkModel: {'regions': [[tl_id]], 'weights': [...], 'cut_lanes', 'cut_pairs', 'graph'}."""
+    tls_ids, adjacency, downstream = tls_graph(model)
+    weights = node_weights(model, tls_ids, lane_demand)
+    labels = partition(tls_ids, adjacency, weights, n_regions, tolerance)
+    regions = [[t for t, label in zip(tls_ids, labels) if label == r] for r in range(labels.max() + 1)]
+    cut_lanes, cut_pairs = cut_size(tls_ids, adjacency, labels)
+    return {
+        'regions': regions,
+        'weights': [float(weights[labels == r].sum()) for r in range(len(regions))],
+        'cut_lanes': cut_lanes,
+        'cut_pairs': cut_pairs,
+        'graph': (tls_ids, adjacency, downstream),
+    }
+
+
+def merge_qtables(paths, share_parameters=True):
+    """Merge per-region Q-tables: states seen by several regions get the mean of their rows."""
+    merged = SparseQTable(share_parameters)
+    counts = {}
+    for path in paths:
+        table = SparseQTable.load(path)
+        for namespace, rows in table.tables.items():
+            target = merged.tables.setdefault(namespace, {})
+            for state, values in rows.items():
+                key = (namespace, state)
+                if state in target and len(target[state]) == len(values):
+                    counts[key] += 1
+                    target[state] = target[state] + (values - target[state]) / counts[key]
+                else:
+                    counts[key] = 1
+                    target[state] = np.array(values, dtype=np.float64)
+    return merged
+
+
+def run_region(region, tls_ids, port, order, board_name, board_rows, links, qtable_path, output_path,
+               max_step=MAX_STEP, eps=epsilon_min, seed=None):
+    """
+    Control one region as an additional TraCI client of a shared SUMO instance.
+    Every step the region publishes its lights' queues and current approach to the
+    shared board and shapes each agent's reward with the board queues of the lights
+    downstream of it (other regions' values may lag one step, since clients only
+    synchronise inside simulationStep).
+    """
+    conn = traci.connect(port)
+    conn.setOrder(order)
+    shared = shared_memory.SharedMemory(name=board_name)
+    try:
+        board = np.ndarray((board_rows, BOARD_FIELDS), dtype=np.float64, buffer=shared.buf)
+        try:
+            qtable = SparseQTable.load(qtable_path)
+        except Exception:
+            qtable = SparseQTable()
+        controller = MultiAgentController(qtable, conn, seed=seed, tls_ids=tls_ids)
+        rows = np.array([links['rows'][a['tl_id']] for a in controller.agents], dtype=np.int64)
+        down = [np.array(links['targets'][a['tl_id']], dtype=np.int64) for a in controller.agents]
+
+        def publish(queues):
+            board[rows, 0] = queues
+            board[rows, 1] = controller.current
+
+        def shaped(queues):
+            spill = np.array([board[d, 0].sum() if len(d) else 0.0 for d in down])
+            return -(queues + BOUNDARY_WEIGHT * spill)
+
+        conn.simulationStep()
+        states, queues = controller.observe()
+        publish(queues)
+        step = 0
+        total_reward = 0.0
+        while conn.simulation.getMinExpectedNumber() > 0 and step < max_step:
+            mask = controller.decidable()
+            actions = np.where(mask, controller.choose_actions(states, eps), controller.current)
+            controller.apply(actions, mask)
+            conn.simulationStep()
+            controller.tick()
+            next_states, queues = controller.observe()
+            publish(queues)
+            rewards = shaped(queues)
+            controller.update(states, actions, rewards, next_states, mask)
+            total_reward += rewards.sum()
+            states = next_states
+            step += 1
+        qtable.save(output_path)
+        print(f"Region {region}: {controller.n_agents} lights, {step} steps, reward {total_reward:.2f}")
+    finally:
+        shared.close()
+        conn.close()
+
+
+def run_partitioned(sumo_cfg=SUMO_CFG_20E, net_file=NET_FILE_20E, n_regions=REGIONS, lane_demand=None,
+                    max_step=MAX_STEP, eps=epsilon_min, gui=False, det_file=DET_FILE_20E):
+    """
+    Partition the network, start SUMO with --num-clients = regions + 1 and run one
+    controller process per region (spawn) plus this coordinating client, which only
+    advances the clock. The per-region Q-tables are merged into QTABLE_FILE afterwards.
+    """
+    model = load_model(sumo_cfg, net_file, det_file)
+    result = partition_network(model, n_regions, lane_demand)
+    tls_ids, _, downstream = result['graph']
+    regions = result['regions']
+    print(f"{len(regions)} regions, weights {[round(w, 1) for w in result['weights']]}, "
+          f"{result['cut_lanes']} cut lanes")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    row_of = {tl_id: i for i, tl_id in enumerate(tls_ids)}
+    board_bytes = max(1, len(tls_ids)) * BOARD_FIELDS * np.dtype(np.float64).itemsize
+    shared = shared_memory.SharedMemory(create=True, size=board_bytes)
+    board = np.ndarray((len(tls_ids), BOARD_FIELDS), dtype=np.float64, buffer=shared.buf)
+    board[:] = 0.0
+
+    port = getFreeSocketPort()
+    ctx = mp.get_context('spawn')
+    outputs = [os.path.join(RESULTS_DIR, f"multi_agent_qtable_region{r}.pkl") for r in range(len(regions))]
+    processes = []
+    for r, region_tls in enumerate(regions):
+        links = {'rows': {t: row_of[t] for t in region_tls},
+                 'targets': {t: sorted(row_of[d] for d in downstream[t]) for t in region_tls}}
+        process = ctx.Process(target=run_region, args=(r, region_tls, port, r + 2, shared.name, len(tls_ids), links,
+                                                       QTABLE_FILE, outputs[r], max_step, eps, r))
+        process.start()
+        processes.append(process)
+
+    binary = 'sumo-gui' if gui else 'sumo'
+    sumo_cmd = [os.path.join(os.environ['SUMO_HOME'], 'bin', binary), '-c', sumo_cfg,
+                '--num-clients', str(len(regions) + 1), '--no-step-log', 'true']
+    if net_file:
+        # File detector phải khớp với --net-file (ID làn của 20e.net.xml không có trong mạng này)
+        sumo_cmd += ['--net-file', net_file] + detector_args(det_file)
+    try:
+        traci.start(sumo_cmd, port=port, label='coordinator')
+        conn = traci.getConnection('coordinator')
+        conn.setOrder(1)
+        step = 0
+        while conn.simulation.getMinExpectedNumber() > 0 and step < max_step:
+            conn.simulationStep()
+            step += 1
+            if step % 100 == 0:
+                print(f"Step {step}, total queue: {board[:, 0].sum():.0f}")
+        conn.close()
+    finally:
+        for process in processes:
+            process.join()
+        shared.close()
+        shared.unlink()
+    done = [path for path in outputs if os.path.exists(path)]
+    if done:
+        merge_qtables(done).save(QTABLE_FILE)
+        print(f"Merged {len(done)} region Q-tables into {QTABLE_FILE}")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Partition the TLS graph and control each region in its own process")
+    parser.add_argument("--sumocfg", default=SUMO_CFG_20E)
+    parser.add_argument("--net-file", default=NET_FILE_20E)
+    parser.add_argument("--det-file", default=DET_FILE_20E, help="E2 detectors generated for --net-file")
+    parser.add_argument("--regions", type=int, default=REGIONS)
+    parser.add_argument("--demand", nargs='*', default=None, help="E2 output files giving the expected demand per lane")
+    parser.add_argument("--run", action="store_true", help="Run the partitioned multi-client simulation")
+    parser.add_argument("--max-step", type=int, default=MAX_STEP)
+    parser.add_argument("--gui", action="store_true")
+    args = parser.parse_args(argv)
+
+    model = load_model(args.sumocfg, args.net_file, args.det_file)
+    try:
+        lane_demand = demand_from_e2(model, args.demand) if args.demand else None
+    except ValueError as e:
+        parser.error(str(e))
+    if not args.run:
+        result = partition_network(model, args.regions, lane_demand)
+        for r, (region, weight) in enumerate(zip(result['regions'], result['weights'])):
+            print(f"Region {r}: {len(region)} lights, weight {weight:.1f}: {' '.join(region)}")
+        print(f"Cut: {result['cut_lanes']} lanes between {result['cut_pairs']} light pairs")
+        return
+    run_partitioned(args.sumocfg, args.net_file, args.regions, lane_demand, args.max_step, gui=args.gui,
+                    det_file=args.det_file)
+
+
+if __name__ == "__main__":
+    main()
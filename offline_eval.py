@@ -0,0 +1,194 @@
+import os
+import csv
+import argparse
+
+import numpy as np
+
+from telemetry_view import load_log
+
+# Phải khớp với light_control2.py (STATE_SPACE, gamma, số action)
+STATE_COLUMNS = ['s_ns', 's_ew', 's_density', 's_green']
+STATE_SPACE = (5, 5, 5, 2)
+N_ACTIONS = 2
+GAMMA = 0.95
+FQE_ITERATIONS = 500
+FQE_TOLERANCE = 1e-6
+
+
+def _build_transitions(states, actions, rewards, episodes, behavior_prob):
+    """Arrange per-decision arrays into transitions; next state is the next decision of the same episode."""
+    n = len(actions)
+    new_episode = np.ones(n, dtype=bool)
+    new_episode[1:] = episodes[1:] != episodes[:-1]
+    terminal = np.ones(n, dtype=bool)
+    terminal[:-1] = new_episode[1:]
+    next_states = np.empty_like(states)
+    next_states[:-1] = states[1:]
+    next_states[-1:] = states[-1:]
+    return {
+        'states': states,
+        'actions': actions,
+        'rewards': rewards,
+        'next_states': next_states,
+        'terminal': terminal,
+        'episode_index': np.cumsum(new_episode) - 1,
+        'behavior_prob': behavior_prob,
+    }
+
+
+def transitions_from_telemetry(path):
+    """
+    Load decision transitions from a light_control2 telemetry step log (<run>_steps.csv).
+    Each transition's reward is the sum of step rewards until the next decision or the
+    end of the episode.
+    """
+    cols = load_log(path)
+    missing = [c for c in STATE_COLUMNS + ['action', 'decision', 'behavior_prob'] if c not in cols]
+    if missing:
+        raise ValueError(f"{path} thiếu cột {missing}; cần log từ light_control2.main()")
+    decision = cols['decision'] == 1
+    episode = cols['episode']
+    episode_start = np.ones(len(episode), dtype=bool)
+    episode_start[1:] = episode[1:] != episode[:-1]
+    boundaries = np.flatnonzero(decision | episode_start)
+    segment_rewards = np.add.reduceat(np.nan_to_num(cols['reward']), boundaries)
+    keep = decision[boundaries]
+    idx = boundaries[keep]
+    states = np.stack([cols[c][idx] for c in STATE_COLUMNS], axis=1).astype(np.int64)
+    return _build_transitions(states, cols['action'][idx].astype(np.int64), segment_rewards[keep],
+                              episode[idx], cols['behavior_prob'][idx])
+
+
+def transitions_from_csv(path, state_columns, action_column, reward_column, episode_column=None,
+                         behavior_prob_column=None, delimiter=';', decimal=','):
+    """
+    Load transitions from a dataset-style CSV (semicolon separated, comma decimals by default).
+    state_columns must already hold discretized levels. Without behavior_prob_column the
+    logged policy is treated as deterministic (probability 1), which only the FQE estimate tolerates.
+    """
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f, delimiter=delimiter))
+
+    def column(name):
+        return np.array([float(row[name].replace(decimal, '.')) for row in rows])
+
+    states = np.stack([column(c) for c in state_columns], axis=1).astype(np.int64)
+    episodes = column(episode_column) if episode_column else np.zeros(len(rows))
+    behavior_prob = column(behavior_prob_column) if behavior_prob_column else np.ones(len(rows))
+    return _build_transitions(states, column(action_column).astype(np.int64), column(reward_column),
+                              episodes, behavior_prob)
+
+
+def load_candidate(path):
+    """A candidate is a Q-table (.npy, STATE_SPACE + (N_ACTIONS,)) or a greedy action table (STATE_SPACE)."""
+    table = np.load(path)
+    if table.ndim == len(STATE_SPACE) + 1:
+        table = np.argmax(table, axis=-1)
+    return table.astype(np.int64)
+
+
+def target_probs(transitions, action_table, epsilon=0.0):
+    greedy = action_table[tuple(transitions['states'].T)]
+    return np.where(transitions['actions'] == greedy, 1.0 - epsilon, 0.0) + epsilon / N_ACTIONS
+
+
+def importance_sampling(transitions, action_table, epsilon=0.0, gamma=GAMMA):
+    """
+    Per-decision (PDIS) and trajectory-weighted (WIS) importance-sampling estimates of the
+    candidate's discounted return, plus the effective sample size of the trajectory weights.
+    """
+    ep = transitions['episode_index']
+    n_episodes = ep[-1] + 1
+    rho = target_probs(transitions, action_table, epsilon) / np.maximum(transitions['behavior_prob'], 1e-12)
+
+    # Tích lũy rho trong từng episode bằng cumsum log (đếm riêng các rho = 0)
+    zero = rho == 0
+    log_rho = np.log(np.where(zero, 1.0, rho))
+    cum_log = np.cumsum(log_rho)
+    cum_zero = np.cumsum(zero)
+    starts = np.flatnonzero(np.r_[True, ep[1:] != ep[:-1]])
+    offset_log = (cum_log - log_rho)[starts][ep]
+    offset_zero = (cum_zero - zero)[starts][ep]
+    weights = np.exp(cum_log - offset_log) * ((cum_zero - offset_zero) == 0)
+
+    t = np.arange(len(ep)) - starts[ep]
+    discounted = gamma ** t * transitions['rewards']
+    pdis = np.bincount(ep, weights=weights * discounted, minlength=n_episodes).mean()
+
+    ends = np.r_[starts[1:], len(ep)] - 1
+    traj_weights = weights[ends]
+    returns = np.bincount(ep, weights=discounted, minlength=n_episodes)
+    total = traj_weights.sum()
+    wis = (traj_weights * returns).sum() / total if total > 0 else np.nan
+    ess = total ** 2 / (traj_weights ** 2).sum() if total > 0 else 0.0
+    return {'pdis': pdis, 'wis': wis, 'ess': ess}
+
+
+def fitted_q_evaluation(transitions, action_table, epsilon=0.0, gamma=GAMMA,
+                        iterations=FQE_ITERATIONS, tol=FQE_TOLERANCE):
+    """
+    Tabular fitted-Q evaluation: iterate Q(s,a) <- mean[r + gamma * V_pi(s')] over the logged
+    transitions, with each sweep computed for the whole log by np.bincount.
+    Returns the estimated value of the episodes' initial states and the fraction of visited
+    states where the candidate's action was actually logged.
+    """
+    n_states = int(np.prod(STATE_SPACE))
+    s = np.ravel_multi_index(tuple(transitions['states'].T), STATE_SPACE)
+    ns = np.ravel_multi_index(tuple(transitions['next_states'].T), STATE_SPACE)
+    sa = s * N_ACTIONS + transitions['actions']
+    counts = np.bincount(sa, minlength=n_states * N_ACTIONS)
+    pi = action_table.ravel()
+    not_terminal = ~transitions['terminal']
+    rewards = transitions['rewards']
+
+    Q = np.zeros((n_states, N_ACTIONS))
+    for _ in range(iterations):
+        v_next = (1 - epsilon) * Q[ns, pi[ns]] + epsilon * Q[ns].mean(axis=1)
+        target = rewards + gamma * not_terminal * v_next
+        new_Q = (np.bincount(sa, weights=target, minlength=n_states * N_ACTIONS)
+                 / np.maximum(counts, 1)).reshape(n_states, N_ACTIONS)
+        delta = np.abs(new_Q - Q).max()
+        Q = new_Q
+        if delta < tol:
+            break
+
+    ep = transitions['episode_index']
+    s0 = s[np.flatnonzero(np.r_[True, ep[1:] != ep[:-1]])]
+    value = ((1 - epsilon) * Q[s0, pi[s0]] + epsilon * Q[s0].mean(axis=1)).mean()
+    visited = np.unique(s)
+    coverage = (counts.reshape(n_states, N_ACTIONS)[visited, pi[visited]] > 0).mean()
+    return {'fqe': value, 'coverage': coverage}
+
+
+def evaluate_candidates(transitions, candidates, epsilon=0.0, gamma=GAMMA):
+    """Score every candidate (name -> action table); results are sorted by FQE value, best first."""
+    results = []
+    for name, action_table in candidates.items():
+        result = {'candidate': name}
+        result.update(importance_sampling(transitions, action_table, epsilon, gamma))
+        result.update(fitted_q_evaluation(transitions, action_table, epsilon, gamma))
+        results.append(result)
+    results.sort(key=lambda r: r['fqe'], reverse=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline evaluation of Q-table candidates from a telemetry log")
+    parser.add_argument('log', help="telemetry step log (<run>_steps.csv)")
+    parser.add_argument('candidates', nargs='+', help="Q-table or action-table .npy files")
+    parser.add_argument('--epsilon', type=float, default=0.0, help="evaluate epsilon-greedy versions of the candidates")
+    parser.add_argument('--gamma', type=float, default=GAMMA)
+    args = parser.parse_args(argv)
+
+    transitions = transitions_from_telemetry(args.log)
+    candidates = {os.path.basename(path): load_candidate(path) for path in args.candidates}
+    results = evaluate_candidates(transitions, candidates, args.epsilon, args.gamma)
+    print(f"{len(transitions['actions'])} transitions, {transitions['episode_index'][-1] + 1} episodes")
+    print(f"{'candidate':30s} {'FQE':>12s} {'PDIS':>12s} {'WIS':>12s} {'ESS':>8s} {'coverage':>9s}")
+    for r in results:
+        print(f"{r['candidate']:30s} {r['fqe']:12.2f} {r['pdis']:12.2f} {r['wis']:12.2f} "
+              f"{r['ess']:8.1f} {r['coverage']:9.2%}")
+
+
+if __name__ == "__main__":
+    main()
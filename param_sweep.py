@@ -0,0 +1,354 @@
+import os
+import sys
+import csv
+import copy
+import math
+import random
+import itertools
+import importlib.util
+import multiprocessing as mp
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+if 'SUMO_HOME' in os.environ:
+    tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
+    sys.path.append(tools)
+else:
+    sys.exit("Vui lòng khai báo biến môi trường 'SUMO_HOME'")
+
+import traci
+
+from result_cache import ResultCache, config_key, scenario_files_from_sumocfg
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CONTROLLER = os.path.join(BASE_DIR, "traffic_light.py")
+DEFAULT_SUMO_CFG = os.path.join(BASE_DIR, "dataset.sumocfg")
+SWEEP_DIR = "sweep_results"
+STEP_LENGTH = 0.1           # Các bộ điều khiển đều chạy với --step-length 0.1
+
+# Dừng sớm: sau PRUNE_WARMUP giây mô phỏng, cứ mỗi PRUNE_CHECK_INTERVAL giây so sánh
+# hàng đợi trung bình với PRUNE_FACTOR lần ứng viên tốt nhất hiện tại
+PRUNE_WARMUP = 300
+PRUNE_CHECK_INTERVAL = 60
+PRUNE_FACTOR = 1.5
+
+# Adaptive search (kiểu TPE): tỉ lệ ứng viên "tốt" và số mẫu thử mỗi vòng
+ADAPTIVE_INIT = 8
+ADAPTIVE_GAMMA = 0.25
+ADAPTIVE_SAMPLES = 256
+
+# Ví dụ không gian tham số cho traffic_light.py: list = giá trị rời rạc, tuple = khoảng (low, high)
+EXAMPLE_SPACE = {
+    'MIN_GREEN_TIME': (20, 60),
+    'MAX_GREEN_TIME': (80, 160),
+    'EVAL_INTERVAL': [5, 10, 15],
+    'THRESHOLD': (0.4, 0.9),
+}
+
+
+# ====== PARAMETER SPACE ======
+
+def grid_candidates(space):
+    """Cartesian product of the list-valued dimensions (ranges must be given as lists for a grid)."""
+    names = list(space)
+    for name in names:
+        if not isinstance(space[name], list):
+            raise ValueError(f"Grid search cần danh sách giá trị cho '{name}'")
+    for values in itertools.product(*(space[name] for name in names)):
+        yield dict(zip(names, values))
+
+
+def sample_candidate(space, rng):
+    params = {}
+    for name, dim in space.items():
+        if isinstance(dim, list):
+            params[name] = rng.choice(dim)
+        else:
+            low, high = dim
+            if isinstance(low, int) and isinstance(high, int):
+                params[name] = rng.randint(low, high)
+            else:
+                params[name] = rng.uniform(low, high)
+    return params
+
+
+def _encode(space, params):
+    """Map a candidate to [0, 1]^d (list values by index) for the adaptive search."""
+    x = []
+    for name, dim in space.items():
+        if isinstance(dim, list):
+            x.append(dim.index(params[name]) / max(len(dim) - 1, 1))
+        else:
+            low, high = dim
+            x.append((params[name] - low) / (high - low) if high > low else 0.0)
+    return np.array(x)
+
+
+def _kde_log_density(points, centers, bandwidth):
+    diff = (points[:, None, :] - centers[None, :, :]) / bandwidth
+    log_k = -0.5 * np.sum(diff ** 2, axis=2)
+    return np.logaddexp.reduce(log_k, axis=1) - np.log(len(centers))
+
+
+def adaptive_candidate(space, history, rng):
+    """
+    Tree-structured-Parzen-style proposal: split finished runs into the best ADAPTIVE_GAMMA
+    fraction and the rest, sample ADAPTIVE_SAMPLES random candidates and return the one with
+    the highest density ratio good/bad.
+    """
+    scored = [h for h in history if h['status'] == 'ok' and np.isfinite(h['objective'])]
+    if len(scored) < ADAPTIVE_INIT:
+        return sample_candidate(space, rng)
+    scored.sort(key=lambda h: h['objective'])
+    n_good = max(1, int(len(scored) * ADAPTIVE_GAMMA))
+    good = np.array([_encode(space, h['params']) for h in scored[:n_good]])
+    bad = np.array([_encode(space, h['params']) for h in scored[n_good:]])
+    # Ứng viên bị dừng sớm cũng là "xấu"
+    pruned = [_encode(space, h['params']) for h in history if h['status'] == 'pruned']
+    if pruned:
+        bad = np.vstack([bad, np.array(pruned)])
+    proposals = [sample_candidate(space, rng) for _ in range(ADAPTIVE_SAMPLES)]
+    x = np.array([_encode(space, p) for p in proposals])
+    bandwidth = max(0.05, 1.0 / len(scored) ** (1.0 / (len(space) + 4)))
+    score = _kde_log_density(x, good, bandwidth) - _kde_log_density(x, bad, bandwidth)
+    return proposals[int(np.argmax(score))]
+
+
+# ====== WORKER ======
+
+class PruneListener(traci.StepListener):
+    """
+    Step listener that tracks the mean number of halting vehicles and aborts the
+    run once it is clearly worse than prune_threshold.
+    """
+
+    def __init__(self, prune_threshold):
+        self.threshold = prune_threshold
+        self.edges = [e for e in traci.edge.getIDList() if not e.startswith(':')]
+        self.samples = []
+        self.next_check = PRUNE_CHECK_INTERVAL
+        self.pruned = False
+
+    def step(self, t=0):
+        now = traci.simulation.getTime()
+        if now < self.next_check:
+            return True
+        self.next_check = now + PRUNE_CHECK_INTERVAL
+        self.samples.append(sum(traci.edge.getLastStepHaltingNumber(e) for e in self.edges))
+        if self.threshold is not None and now >= PRUNE_WARMUP and np.mean(self.samples) > self.threshold:
+            self.pruned = True
+            raise RuntimeError(f"pruned at {now:.0f}s: mean queue {np.mean(self.samples):.1f} > {self.threshold:.1f}")
+        return True
+
+
+def _set_param(module, name, value):
+    """Override a module constant; 'LANE_SCORE_WEIGHTS.w1' sets one key of a dict constant."""
+    if '.' in name:
+        attr, key = name.split('.', 1)
+        table = copy.deepcopy(getattr(module, attr))
+        table[key] = value
+        setattr(module, attr, table)
+    else:
+        setattr(module, name, value)
+
+
+def parse_kpis(summary_file, statistic_file):
+    """Mean waiting time per trip, mean network queue and braking events from SUMO's own outputs."""
+    kpis = {'mean_wait': math.nan, 'mean_queue': math.nan, 'braking_events': math.nan, 'arrived': 0}
+    halting = []
+    if os.path.exists(summary_file):
+        for _, elem in ET.iterparse(summary_file):
+            if elem.tag == 'step':
+                halting.append(float(elem.get('halting', 0)))
+                kpis['arrived'] = int(elem.get('arrived', 0))
+            elem.clear()
+    if halting:
+        kpis['mean_queue'] = float(np.mean(halting))
+    if os.path.exists(statistic_file):
+        root = ET.parse(statistic_file).getroot()
+        trips = root.find('vehicleTripStatistics')
+        if trips is not None:
+            kpis['mean_wait'] = float(trips.get('waitingTime', 'nan'))
+        safety = root.find('safety')
+        if safety is not None:
+            kpis['braking_events'] = int(safety.get('emergencyBraking', 0)) + int(safety.get('emergencyStops', 0))
+    return kpis
+
+
+def run_candidate(controller_path, params, sumo_cfg, seed=None, run_function='run_simulation',
+                  run_args=(), prune_threshold=None, output_dir=SWEEP_DIR):
+    """
+    Run one controller script headless with overridden constants and return
+    (kpis, series). Runs in a worker process: the script is imported under a fresh
+    module name, its start_sumo() is replaced by a headless start with summary and
+    statistic outputs, and matplotlib is forced to the non-interactive Agg backend.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+
+    os.makedirs(output_dir, exist_ok=True)
+    tag = f"{os.getpid()}_{random.getrandbits(32):08x}"
+    summary_file = os.path.join(output_dir, f"summary_{tag}.xml")
+    statistic_file = os.path.join(output_dir, f"statistic_{tag}.xml")
+
+    spec = importlib.util.spec_from_file_location(f"sweep_controller_{tag}", controller_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    for name, value in params.items():
+        _set_param(module, name, value)
+
+    started = []
+
+    def start_headless(*args, **kwargs):
+        if started:
+            return
+        cmd = [os.path.join(os.environ['SUMO_HOME'], 'bin', 'sumo'), '-c', sumo_cfg,
+               '--step-length', str(STEP_LENGTH), '--no-step-log', 'true',
+               '--summary-output', summary_file, '--statistic-output', statistic_file]
+        if seed is not None:
+            cmd += ['--seed', str(seed)]
+        traci.start(cmd)
+        started.append(True)
+
+    module.start_sumo = start_headless
+    start_headless()
+    listener = PruneListener(prune_threshold)
+    traci.addStepListener(listener)
+    status = 'ok'
+    try:
+        getattr(module, run_function)(*run_args)
+    except Exception as e:
+        status = 'pruned' if listener.pruned else f"error: {e}"
+    finally:
+        try:
+            traci.close()
+        except Exception:
+            pass
+    if listener.pruned:
+        status = 'pruned'
+    kpis = parse_kpis(summary_file, statistic_file)
+    kpis['status'] = status
+    for path in (summary_file, statistic_file):
+        if os.path.exists(path):
+            os.remove(path)
+    return kpis, {'queue': np.array(listener.samples)}
+
+
+def _run_task(task):
+    controller_path, params, sumo_cfg, seed, run_function, run_args, prune_threshold, use_cache = task
+    if not use_cache:
+        kpis, _ = run_candidate(controller_path, params, sumo_cfg, seed, run_function, run_args, prune_threshold)
+        return params, kpis
+    config = {'controller': os.path.basename(controller_path), 'params': params,
+              'run_function': run_function, 'run_args': list(run_args)}
+    files = [controller_path] + scenario_files_from_sumocfg(sumo_cfg)
+    cache = ResultCache()
+    key = config_key(config, files, seed)
+    entry = cache.get(key)
+    if entry is not None:
+        return params, entry['kpis']
+    kpis, series = run_candidate(controller_path, params, sumo_cfg, seed, run_function, run_args, prune_threshold)
+    # Chỉ lưu các lần chạy hoàn chỉnh; kết quả bị dừng sớm phụ thuộc ngưỡng lúc đó
+    if kpis['status'] == 'ok':
+        cache.put(key, kpis, series, config={'config': config, 'seed': seed})
+    return params, kpis
+
+
+# ====== SWEEP ======
+
+def objective_value(kpis, weights):
+    return sum(w * kpis.get(name, math.nan) for name, w in weights.items())
+
+
+def run_sweep(space, strategy='random', n_candidates=32, controller_path=DEFAULT_CONTROLLER,
+              sumo_cfg=DEFAULT_SUMO_CFG, seed=None, run_function='run_simulation', run_args=(),
+              objective=None, workers=None, use_cache=True, prune=True, results_file=None, rng_seed=0,
+              candidates=None):
+    """
+    Evaluate controller constants over a parameter space on a process pool.
+    strategy: 'grid' (lists only), 'random', 'adaptive' (TPE-style proposals from finished runs)
+    or 'list' (explicit candidates, e.g. the output of surrogate.screen()).
+    Returns the results table (list of dicts, best objective first) and writes it as CSV.
+    """
+    if objective is None:
+        objective = {'mean_wait': 1.0}
+    workers = workers or os.cpu_count()
+    rng = random.Random(rng_seed)
+    history = []
+    best = [math.inf]
+
+    if strategy == 'grid':
+        pending = list(grid_candidates(space))
+    elif strategy == 'random':
+        pending = [sample_candidate(space, rng) for _ in range(n_candidates)]
+    elif strategy == 'adaptive':
+        pending = None
+    elif strategy == 'list':
+        pending = [dict(c.get('params', c)) for c in candidates]
+    else:
+        raise ValueError(f"Unknown strategy '{strategy}'")
+    total = len(pending) if pending is not None else n_candidates
+
+    def next_task():
+        if pending is not None:
+            params = pending.pop(0)
+        else:
+            params = adaptive_candidate(space, history, rng)
+        threshold = None
+        if prune and history:
+            queues = [h['mean_queue'] for h in history if h['status'] == 'ok' and np.isfinite(h['mean_queue'])]
+            if queues:
+                threshold = min(queues) * PRUNE_FACTOR
+        return (controller_path, params, sumo_cfg, seed, run_function, tuple(run_args), threshold, use_cache)
+
+    submitted = 0
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('spawn')) as pool:
+        futures = set()
+        while submitted < total and len(futures) < workers:
+            futures.add(pool.submit(_run_task, next_task()))
+            submitted += 1
+        while futures:
+            done = next(as_completed(futures))
+            futures.remove(done)
+            params, kpis = done.result()
+            row = dict(params)
+            row.update({'params': params, **kpis})
+            row['objective'] = objective_value(kpis, objective) if kpis['status'] == 'ok' else math.inf
+            if math.isnan(row['objective']):
+                # Thiếu KPI (ví dụ không có statistic-output): xếp cuối thay vì làm hỏng min/sort
+                row['objective'] = math.inf
+                row['status'] = 'missing_kpis'
+            history.append(row)
+            best[0] = min(best[0], row['objective'])
+            print(f"[{len(history)}/{total}] {row['status']}: {params} -> objective {row['objective']:.2f} (best {best[0]:.2f})")
+            if submitted < total:
+                futures.add(pool.submit(_run_task, next_task()))
+                submitted += 1
+
+    history.sort(key=lambda h: h['objective'])
+    missing = sum(h['status'] == 'missing_kpis' for h in history)
+    if missing:
+        print(f"⚠️  {missing} run(s) produced no objective (missing KPI output) and are ranked last")
+    write_results(history, space, results_file)
+    return history
+
+
+def write_results(history, space, results_file=None):
+    os.makedirs(SWEEP_DIR, exist_ok=True)
+    if results_file is None:
+        results_file = os.path.join(SWEEP_DIR, "sweep_results.csv")
+    columns = list(space) + ['objective', 'mean_wait', 'mean_queue', 'braking_events', 'arrived', 'status']
+    with open(results_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(history)
+    print(f"Saved sweep results to {results_file}")
+    return results_file
+
+
+if __name__ == "__main__":
+    results = run_sweep(EXAMPLE_SPACE, strategy='adaptive', n_candidates=24)
+    if results:
+        print(f"Best: {results[0]['params']} (objective {results[0]['objective']:.2f})")
@@ -0,0 +1,127 @@
+import atexit
+import pickle
+import traceback
+import multiprocessing as mp
+
+import numpy as np
+
+MAX_POINTS = 2000       # Số điểm tối đa mỗi chuỗi sau khi giảm mẫu
+
+_worker = None          # Một tiến trình vẽ duy nhất, sống suốt phiên, nhận việc qua hàng đợi
+_queue = None
+
+
+def pyplot():
+    """Import pyplot on first use with the non-interactive Agg backend (never opens a window)."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def lttb(x, y, n_out=MAX_POINTS):
+    """
+    Largest-Triangle-Three-Buckets: indices of n_out points that keep the visual shape
+    of (x, y) - peaks and dips survive, unlike a fixed stride. First and last point
+    are always kept.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        # Điểm trung bình của bucket kế tiếp làm đỉnh thứ ba của tam giác
+        nlo, nhi = hi, max(edges[i + 2] if i + 2 < len(edges) else n, hi + 1)
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.nanargmax(area)) if np.isfinite(area).any() else lo
+        selected[i + 1] = a
+    return selected
+
+
+def downsample(x, series, max_points=MAX_POINTS):
+    """
+    Downsample several series sharing one x axis: the union of each series' LTTB
+    points, so lines, fills and thresholds drawn against x stay aligned.
+    Returns (x, {name: y}) as NumPy arrays.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    if len(x) <= max_points:
+        return x, {name: np.asarray(y, dtype=np.float64) for name, y in series.items()}
+    keep = np.unique(np.concatenate([lttb(x, y, max_points) for y in series.values()]))
+    return x[keep], {name: np.asarray(y, dtype=np.float64)[keep] for name, y in series.items()}
+
+
+def _render(func, args, kwargs):
+    pyplot()
+    func(*args, **kwargs)
+
+
+def _worker_loop(queue):
+    """Render jobs from the queue until the None sentinel; one failing plot does not stop the rest."""
+    pyplot()
+    while True:
+        job = queue.get()
+        if job is None:
+            break
+        try:
+            _render(*pickle.loads(job))
+        except Exception:
+            traceback.print_exc()
+
+
+def _ensure_worker():
+    global _worker, _queue
+    if _worker is None or not _worker.is_alive():
+        ctx = mp.get_context('spawn')
+        _queue = ctx.Queue()
+        # daemon: không bao giờ giữ tiến trình chính lại; wait_all (gọi khi thoát) vẽ nốt hàng đợi
+        _worker = ctx.Process(target=_worker_loop, args=(_queue,), daemon=True)
+        _worker.start()
+        # Đăng ký sau khi multiprocessing đã đăng ký hàm thoát của nó, để chạy trước hàm đó
+        # (atexit chạy ngược thứ tự) và vẽ nốt hàng đợi trước khi tiến trình daemon bị dừng
+        atexit.unregister(wait_all)
+        atexit.register(wait_all)
+    return _worker
+
+
+def submit(func, *args, background=True, **kwargs):
+    """
+    Queue a plotting function for the background render process (spawn, Agg backend)
+    and return immediately, so the simulation never waits on matplotlib. The process
+    is started on the first call and reused, so the main module is imported once.
+    func must be importable by reference; otherwise (or with background=False) it
+    runs here with Agg.
+    """
+    if background:
+        try:
+            job = pickle.dumps((func, args, kwargs))
+        except (pickle.PicklingError, AttributeError, TypeError):
+            job = None
+        if job is not None:
+            worker = _ensure_worker()
+            _queue.put(job)
+            return worker
+    _render(func, args, kwargs)
+    return None
+
+
+def wait_all(timeout=None):
+    """Finish the queued renders and stop the render process (e.g. before reading the files)."""
+    global _worker, _queue
+    if _worker is None:
+        return
+    if _worker.is_alive():
+        _queue.put(None)
+        _worker.join(timeout)
+        if _worker.is_alive():
+            _worker.terminate()
+    _queue.close()
+    _worker, _queue = None, None
+
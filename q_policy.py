@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+
+# light_control2 đã thêm SUMO_HOME/tools vào sys.path khi được import
+import light_control2 as lc
+import traci
+from traci import constants as tc
+
+QTABLE_FILE = os.path.join("q_learning_results", "qtable_traffic.npy")
+
+
+class GreedyPolicy:
+    """
+    Frozen Q-policy: the argmax over actions is precomputed once for every
+    discretized state, so choosing an action is a single array lookup.
+    """
+
+    def __init__(self, Q):
+        self.actions = np.argmax(Q, axis=-1).astype(np.int8)
+
+    @classmethod
+    def load(cls, path=QTABLE_FILE):
+        return cls(np.load(path))
+
+    def __call__(self, state):
+        return int(self.actions[state])
+
+
+class DetectorObserver:
+    """
+    Computes the same state as light_control2.get_state() from subscriptions.
+    Subscribed values come back with every simulationStep(), so building a state
+    costs no extra TraCI round trips.
+    """
+
+    def __init__(self, conn=traci):
+        self.conn = conn
+        for det in lc.LANES:
+            conn.lanearea.subscribe(det, [tc.LAST_STEP_VEHICLE_HALTING_NUMBER, tc.LAST_STEP_OCCUPANCY])
+        conn.trafficlight.subscribe(lc.TLS_ID, [tc.TL_CURRENT_PHASE])
+
+    def state(self):
+        results = self.conn.lanearea.getAllSubscriptionResults()
+        halting = {det: results[det][tc.LAST_STEP_VEHICLE_HALTING_NUMBER] for det in lc.LANES}
+        ns_queue = sum(halting[det] for det in lc.NS_DETECTORS)
+        ew_queue = sum(halting[det] for det in lc.EW_DETECTORS)
+        total_density = sum(results[det][tc.LAST_STEP_OCCUPANCY] for det in lc.LANES) / len(lc.LANES)
+        current_phase = self.conn.trafficlight.getSubscriptionResults(lc.TLS_ID)[tc.TL_CURRENT_PHASE]
+        return lc.discretize_state(ns_queue, ew_queue, total_density, current_phase)
+
+
+def run_greedy(qtable_file=QTABLE_FILE, sumo_cfg=lc.SUMO_CFG, gui=True, max_step=lc.MAX_STEP):
+    """
+    Drive TLS_ID with a trained Q-table using the same yellow / minimum-green rules as
+    training, without exploration, rewards or waiting-time sums. The state is only
+    built when a decision is actually possible.
+    """
+    policy = GreedyPolicy.load(qtable_file)
+    print(f"Loaded policy from {qtable_file}")
+    binary = 'sumo-gui' if gui else 'sumo'
+    traci.start([os.path.join(os.environ['SUMO_HOME'], 'bin', binary), "-c", sumo_cfg, "--start"])
+    try:
+        observer = DetectorObserver()
+        traci.trafficlight.setPhase(lc.TLS_ID, lc.GREEN_PHASE_1)
+        phase_duration = 0
+        in_yellow = False
+        yellow_timer = 0
+        current_phase = lc.GREEN_PHASE_1
+        action = 0
+        step = 0
+        while traci.simulation.getMinExpectedNumber() > 0 and step < max_step:
+            if not in_yellow and phase_duration >= lc.MIN_PHASE_DURATION:
+                action = policy(observer.state())
+                target_phase = lc.GREEN_PHASE_1 if action == 0 else lc.GREEN_PHASE_2
+                if target_phase != current_phase:
+                    yellow_phase = lc.YELLOW_PHASE_1 if current_phase == lc.GREEN_PHASE_1 else lc.YELLOW_PHASE_2
+                    traci.trafficlight.setPhase(lc.TLS_ID, yellow_phase)
+                    in_yellow = True
+                    yellow_timer = 0
+            if in_yellow:
+                yellow_timer += 1
+                if yellow_timer >= lc.YELLOW_DURATION:
+                    current_phase = lc.GREEN_PHASE_1 if action == 0 else lc.GREEN_PHASE_2
+                    traci.trafficlight.setPhase(lc.TLS_ID, current_phase)
+                    in_yellow = False
+                    phase_duration = 0
+            else:
+                phase_duration += 1
+            traci.simulationStep()
+            step += 1
+        print(f"Greedy run finished after {step} steps")
+    finally:
+        traci.close()
+
+
+if __name__ == "__main__":
+    run_greedy()
@@ -0,0 +1,136 @@
+import os
+import json
+import hashlib
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+CACHE_DIR = "result_cache"
+MAX_ENTRIES = 500   # Số kết quả tối đa giữ trên đĩa (LRU)
+HASH_CHUNK = 1 << 20
+
+# Cache hash nội dung file trong tiến trình, khóa theo (đường dẫn, mtime, kích thước)
+_file_hashes = {}
+
+
+def file_hash(path):
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    digest = _file_hashes.get(memo_key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+                h.update(chunk)
+        digest = h.hexdigest()
+        _file_hashes[memo_key] = digest
+    return digest
+
+
+def scenario_files_from_sumocfg(sumocfg):
+    """Return the .sumocfg itself plus the net, route and additional files it references."""
+    base = os.path.dirname(os.path.abspath(sumocfg))
+    files = [sumocfg]
+    root = ET.parse(sumocfg).getroot()
+    for tag in ('net-file', 'route-files', 'additional-files'):
+        for node in root.iter(tag):
+            for name in node.get('value', '').split(','):
+                name = name.strip()
+                if name:
+                    files.append(name if os.path.isabs(name) else os.path.join(base, name))
+    return files
+
+
+def config_key(config, scenario_files=(), seed=None):
+    """
+    Hash of the controller configuration (any JSON-serialisable dict of constants),
+    the contents of the scenario files and the seed.
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps(config, sort_keys=True, default=str).encode())
+    for path in sorted(scenario_files):
+        h.update(os.path.basename(path).encode())
+        h.update(file_hash(path).encode() if os.path.exists(path) else b'missing')
+    h.update(repr(seed).encode())
+    return h.hexdigest()[:32]
+
+
+class ResultCache:
+    """
+    On-disk cache of simulation results: summary KPIs in <key>.json and the compact
+    time series in <key>.npz. Reading an entry refreshes its mtime; when more than
+    max_entries are stored the least recently used ones are removed.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_entries=MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json"), os.path.join(self.cache_dir, f"{key}.npz")
+
+    def get(self, key):
+        """Return {'kpis', 'series', 'config'} for a key, or None if it is not cached."""
+        json_path, npz_path = self._paths(key)
+        try:
+            with open(json_path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        series = {}
+        if os.path.exists(npz_path):
+            with np.load(npz_path) as data:
+                series = {name: data[name] for name in data.files}
+            os.utime(npz_path)
+        os.utime(json_path)
+        entry['series'] = series
+        return entry
+
+    def put(self, key, kpis, series=None, config=None):
+        json_path, npz_path = self._paths(key)
+        if series:
+            tmp_npz = npz_path + '.tmp'
+            with open(tmp_npz, 'wb') as f:
+                np.savez_compressed(f, **{name: np.asarray(values) for name, values in series.items()})
+            os.replace(tmp_npz, npz_path)
+        elif os.path.exists(npz_path):
+            # Kết quả mới không có chuỗi thời gian: bỏ file .npz cũ để get() không trả dữ liệu cũ
+            os.remove(npz_path)
+        tmp_path = json_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'key': key, 'kpis': kpis, 'config': config}, f, default=float)
+        os.replace(tmp_path, json_path)  # Ghi nguyên tử: tiến trình khác không đọc phải file dở
+        self._evict()
+
+    def _evict(self):
+        entries = [name for name in os.listdir(self.cache_dir) if name.endswith('.json')]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda name: os.path.getmtime(os.path.join(self.cache_dir, name)))
+        for name in entries[:len(entries) - self.max_entries]:
+            key = name[:-len('.json')]
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def __contains__(self, key):
+        return os.path.exists(self._paths(key)[0])
+
+
+def cached_run(run_fn, config, scenario_files=(), seed=None, cache=None):
+    """
+    Return run_fn(config, seed) -> (kpis, series) from the cache when the same
+    configuration, scenario contents and seed were simulated before.
+    """
+    if cache is None:
+        cache = ResultCache()
+    key = config_key(config, scenario_files, seed)
+    entry = cache.get(key)
+    if entry is not None:
+        return entry['kpis'], entry['series']
+    kpis, series = run_fn(config, seed)
+    cache.put(key, kpis, series, config={'config': config, 'seed': seed})
+    return kpis, series
@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import multiprocessing as mp
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+if 'SUMO_HOME' in os.environ:
+    tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
+    sys.path.append(tools)
+else:
+    sys.exit("Vui lòng khai báo biến môi trường 'SUMO_HOME'")
+
+import traci
+
+from dataset_exporter import NETWORK_HEADER, SAMPLE_INTERVAL, NetworkExporter, open_writer
+from result_cache import config_key, scenario_files_from_sumocfg
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SUMO_CFG = os.path.join(BASE_DIR, "dataset.sumocfg")
+BATCH_DIR = "scenario_batch"
+MANIFEST_FILE = "manifest.json"
+DURATION = 600          # Giây mô phỏng cho mỗi kịch bản
+
+# Ví dụ: ba mức nhu cầu (nhân vehsPerHour trong dataset.rou.xml) x ba seed
+EXAMPLE_DEMAND_SCALES = [0.5, 1.0, 1.5]
+EXAMPLE_SEEDS = [1, 2, 3]
+
+
+def scale_route_file(src, scale, dst):
+    """Copy a route file with every flow's vehsPerHour (and probability/period) scaled by `scale`."""
+    tree = ET.parse(src)
+    for flow in tree.getroot().iter('flow'):
+        if 'vehsPerHour' in flow.attrib:
+            flow.set('vehsPerHour', f"{float(flow.get('vehsPerHour')) * scale:g}")
+        if 'probability' in flow.attrib:
+            flow.set('probability', f"{min(1.0, float(flow.get('probability')) * scale):g}")
+        if 'period' in flow.attrib:
+            flow.set('period', f"{float(flow.get('period')) / scale:g}")
+    tree.write(dst, encoding='utf-8', xml_declaration=True)
+    return dst
+
+
+def expand_variants(route_files=None, demand_scales=(1.0,), seeds=(None,), duration=DURATION,
+                    sample_interval=SAMPLE_INTERVAL, fmt='columnar'):
+    """Cartesian product of route files x demand scales x seeds as a list of scenario dicts."""
+    variants = []
+    for route_file, scale, seed in itertools.product(route_files or [None], demand_scales, seeds):
+        parts = []
+        if route_file:
+            parts.append(os.path.splitext(os.path.basename(route_file))[0])
+        parts.append(f"x{scale:g}")
+        if seed is not None:
+            parts.append(f"s{seed}")
+        variants.append({
+            'name': "_".join(parts), 'route_file': route_file, 'demand_scale': scale, 'seed': seed,
+            'duration': duration, 'sample_interval': sample_interval, 'fmt': fmt,
+        })
+    return variants
+
+
+def _route_files(sumo_cfg, scenario):
+    if scenario.get('route_file'):
+        return [scenario['route_file']]
+    base = os.path.dirname(os.path.abspath(sumo_cfg))
+    root = ET.parse(sumo_cfg).getroot()
+    return [name.strip() if os.path.isabs(name.strip()) else os.path.join(base, name.strip())
+            for node in root.iter('route-files') for name in node.get('value', '').split(',') if name.strip()]
+
+
+def scenario_key(sumo_cfg, scenario):
+    files = scenario_files_from_sumocfg(sumo_cfg)
+    if scenario.get('route_file'):
+        files.append(scenario['route_file'])
+    config = {k: v for k, v in scenario.items() if k not in ('name', 'seed')}
+    return config_key(config, files, scenario.get('seed'))
+
+
+def run_scenario(sumo_cfg, scenario, output_dir):
+    """
+    Run one scenario in its own SUMO instance and export all controlled lanes
+    (NetworkExporter) to <output_dir>/<name>/samples.{csv,cols}. Runs in a worker process.
+    """
+    start = time.perf_counter()
+    part_dir = os.path.join(output_dir, scenario['name'])
+    os.makedirs(part_dir, exist_ok=True)
+    route_files = _route_files(sumo_cfg, scenario)
+    scale = scenario.get('demand_scale', 1.0)
+    if scale != 1.0:
+        route_files = [scale_route_file(path, scale, os.path.join(part_dir, f"scaled_{i}.rou.xml"))
+                       for i, path in enumerate(route_files)]
+    cmd = [os.path.join(os.environ['SUMO_HOME'], 'bin', 'sumo'), '-c', sumo_cfg,
+           '--route-files', ",".join(os.path.abspath(p) for p in route_files),
+           '--no-step-log', 'true', '--end', str(scenario['duration'])]
+    if scenario.get('seed') is not None:
+        cmd += ['--seed', str(scenario['seed'])]
+    traci.start(cmd)
+    writer = None
+    try:
+        writer = open_writer(os.path.join(part_dir, "samples"), scenario.get('fmt', 'columnar'),
+                             header=NETWORK_HEADER)
+        exporter = NetworkExporter(writer, scenario.get('sample_interval', SAMPLE_INTERVAL))
+        step = 0
+        while traci.simulation.getTime() < scenario['duration']:
+            traci.simulationStep()
+            if exporter.due(step):
+                exporter.sample()
+            step += 1
+    finally:
+        # Đóng writer cả khi lấy mẫu lỗi giữa chừng
+        if writer is not None:
+            writer.close()
+        traci.close()
+    with open(os.path.join(part_dir, "scenario.json"), 'w') as f:
+        json.dump(scenario, f, indent=2)
+    return {'rows': writer.rows_written, 'lanes': len(exporter.lanes), 'steps': step,
+            'elapsed': round(time.perf_counter() - start, 2)}
+
+
+def _run_task(task):
+    sumo_cfg, scenario, output_dir = task
+    try:
+        return scenario, {'status': 'ok', **run_scenario(sumo_cfg, scenario, output_dir)}
+    except Exception as e:
+        return scenario, {'status': f"error: {e}"}
+
+
+def load_manifest(output_dir=BATCH_DIR):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {'scenarios': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(manifest, output_dir=BATCH_DIR):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def run_batch(scenarios, sumo_cfg=DEFAULT_SUMO_CFG, output_dir=BATCH_DIR, workers=None, force=False):
+    """
+    Generate one dataset partition per scenario on a process pool (one SUMO per
+    worker) and record them in <output_dir>/manifest.json. Scenarios whose inputs
+    are unchanged since a completed run (same key) are skipped unless force=True.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count()
+    manifest = load_manifest(output_dir)
+    manifest['sumo_cfg'] = os.path.abspath(sumo_cfg)
+    entries = manifest['scenarios']
+
+    tasks = []
+    for scenario in scenarios:
+        key = scenario_key(sumo_cfg, scenario)
+        done = entries.get(scenario['name'])
+        if not force and done and done.get('key') == key and done.get('status') == 'ok':
+            print(f"Skip {scenario['name']} (up to date)")
+            continue
+        entries[scenario['name']] = {'key': key, 'status': 'pending', 'scenario': scenario}
+        tasks.append((sumo_cfg, scenario, output_dir))
+    write_manifest(manifest, output_dir)
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('spawn')) as pool:
+        futures = [pool.submit(_run_task, task) for task in tasks]
+        for i, future in enumerate(as_completed(futures), 1):
+            scenario, result = future.result()
+            entry = entries[scenario['name']]
+            entry.update(result)
+            fmt = scenario.get('fmt', 'columnar')
+            entry['path'] = os.path.join(scenario['name'], "samples.cols" if fmt == 'columnar' else "samples.csv")
+            write_manifest(manifest, output_dir)
+            print(f"[{i}/{len(tasks)}] {scenario['name']}: {result['status']} "
+                  f"({result.get('rows', 0)} rows, {result.get('elapsed', 0)} s)")
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate datasets for many demand scenarios in parallel")
+    parser.add_argument("--sumo-cfg", default=DEFAULT_SUMO_CFG)
+    parser.add_argument("--route-files", nargs='*', default=None, help="Alternative route files")
+    parser.add_argument("--scales", type=float, nargs='+', default=EXAMPLE_DEMAND_SCALES)
+    parser.add_argument("--seeds", type=int, nargs='+', default=EXAMPLE_SEEDS)
+    parser.add_argument("--duration", type=float, default=DURATION)
+    parser.add_argument("--sample-interval", type=int, default=SAMPLE_INTERVAL)
+    parser.add_argument("--format", choices=['csv', 'columnar'], default='columnar')
+    parser.add_argument("--output", default=BATCH_DIR)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action='store_true')
+    args = parser.parse_args(argv)
+    scenarios = expand_variants(args.route_files, args.scales, args.seeds, args.duration,
+                                args.sample_interval, args.format)
+    run_batch(scenarios, args.sumo_cfg, args.output, args.workers, args.force)
+
+
+if __name__ == "__main__":
+    main()
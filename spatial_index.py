@@ -0,0 +1,369 @@
+import time
+import argparse
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import traci
+import traci.constants as tc
+
+CELL_SIZE = 50.0        # Cạnh ô lưới (m); nên cùng cỡ với bán kính truy vấn thường dùng
+VEHICLE_VARS = [tc.VAR_POSITION, tc.VAR_SPEED, tc.VAR_ROAD_ID]
+
+
+def _parse_shape(text):
+    """'x1,y1 x2,y2 ...' -> (k, 2) float array."""
+    return np.array([tuple(map(float, p.split(',')[:2])) for p in text.split()], dtype=np.float64)
+
+
+def _segments(shape):
+    """(k, 2) polyline -> (k-1, 4) segments x1, y1, x2, y2 (a single point becomes a zero-length segment)."""
+    if len(shape) == 1:
+        shape = np.vstack([shape, shape])
+    return np.hstack([shape[:-1], shape[1:]])
+
+
+def segment_distance(points, segments):
+    """Distance from each of n points (n, 2) to each of m segments (m, 4): (n, m) array."""
+    p = points[:, None, :]
+    a, b = segments[None, :, :2], segments[None, :, 2:]
+    ab = b - a
+    denom = np.einsum('...i,...i', ab, ab)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = np.clip(np.einsum('...i,...i', p - a, ab) / denom, 0.0, 1.0)
+    t = np.nan_to_num(t)
+    closest = a + t[..., None] * ab
+    return np.linalg.norm(p - closest, axis=-1)
+
+
+def inside_polygon(points, polygon):
+    """Ray casting: bool array, True where a point (n, 2) lies inside the closed polygon (k, 2)."""
+    if len(polygon) < 3:
+        return np.zeros(len(points), dtype=bool)
+    x, y = points[:, 0:1], points[:, 1:2]
+    x1, y1 = polygon[:, 0], polygon[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        crosses = ((y1 > y) != (y2 > y)) & (x < (x2 - x1) * (y - y1) / (y2 - y1) + x1)
+    return crosses.sum(axis=1) % 2 == 1
+
+
+class UniformGrid:
+    """Static uniform grid: each item is stored in every cell its bounding box overlaps."""
+
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def _range(self, xmin, ymin, xmax, ymax):
+        cs = self.cell_size
+        return (range(int(np.floor(xmin / cs)), int(np.floor(xmax / cs)) + 1),
+                range(int(np.floor(ymin / cs)), int(np.floor(ymax / cs)) + 1))
+
+    def insert(self, item, xmin, ymin, xmax, ymax):
+        xs, ys = self._range(xmin, ymin, xmax, ymax)
+        for cx in xs:
+            for cy in ys:
+                self.cells.setdefault((cx, cy), []).append(item)
+
+    def query(self, xmin, ymin, xmax, ymax):
+        """Items whose cells overlap the box (candidates; callers test the exact distance)."""
+        xs, ys = self._range(xmin, ymin, xmax, ymax)
+        found = set()
+        for cx in xs:
+            for cy in ys:
+                found.update(self.cells.get((cx, cy), ()))
+        return found
+
+
+class SpatialIndex:
+    """
+    Uniform-grid index over a SUMO network: junction polygons, lane shapes and the stop
+    line (last shape point) of every normal lane, built once from the .net.xml. Vehicle
+    positions are bucketed into the same grid by update(), which reads one vehicle
+    subscription result per step, so proximity queries touch only nearby cells and make
+    no per-vehicle TraCI calls.
+    """
+
+    def __init__(self, cell_size=CELL_SIZE, conn=None):
+        self.cell_size = cell_size
+        # conn: traci module (default) or a named connection from traci.getConnection()
+        self.conn = conn if conn is not None else traci
+        self.junction_ids = []
+        self.junction_index = {}
+        self.junction_center = np.empty((0, 2))
+        self.junction_polygons = []
+        self.junction_incoming = {}
+        self.lane_ids = []
+        self.lane_segments = np.empty((0, 4))
+        self.segment_lane = np.empty(0, dtype=np.int64)
+        self.stop_lane = []
+        self.stop_junction = []
+        self.stop_xy = np.empty((0, 2))
+        self.junction_grid = UniformGrid(cell_size)
+        self.lane_grid = UniformGrid(cell_size)
+        self.stop_grid = UniformGrid(cell_size)
+        self.clear_vehicles()
+
+    # ------------------------------------------------------------------ static part
+
+    def _add_junction(self, elem):
+        center = (float(elem.get('x')), float(elem.get('y')))
+        polygon = _parse_shape(elem.get('shape')) if elem.get('shape') else np.array([center])
+        index = len(self.junction_ids)
+        self.junction_index[elem.get('id')] = index
+        self.junction_ids.append(elem.get('id'))
+        self.junction_polygons.append(polygon)
+        self.junction_incoming[elem.get('id')] = {lane.rsplit('_', 1)[0] for lane in elem.get('incLanes', '').split()}
+        (xmin, ymin), (xmax, ymax) = polygon.min(axis=0), polygon.max(axis=0)
+        self.junction_grid.insert(index, xmin, ymin, xmax, ymax)
+        return center
+
+    def _add_lane(self, lane, to_junction, segments, segment_lane):
+        shape = _parse_shape(lane.get('shape'))
+        index = len(self.lane_ids)
+        self.lane_ids.append(lane.get('id'))
+        for seg in _segments(shape):
+            self.lane_grid.insert(len(segment_lane), min(seg[0], seg[2]), min(seg[1], seg[3]),
+                                  max(seg[0], seg[2]), max(seg[1], seg[3]))
+            segments.append(seg)
+            segment_lane.append(index)
+        if to_junction is not None:
+            x, y = shape[-1]
+            self.stop_grid.insert(len(self.stop_lane), x, y, x, y)
+            self.stop_lane.append(lane.get('id'))
+            self.stop_junction.append(to_junction)
+            return (x, y)
+        return None
+
+    @classmethod
+    def from_net(cls, net_file, cell_size=CELL_SIZE, conn=None):
+        """Stream the net file once and index every junction, lane and stop line."""
+        index = cls(cell_size, conn)
+        centers, segments, segment_lane, stops = [], [], [], []
+        context = ET.iterparse(net_file, events=('start', 'end'))
+        _, root = next(context)
+        for event, elem in context:
+            if event != 'end':
+                continue
+            if elem.tag == 'junction':
+                if elem.get('type') != 'internal':
+                    centers.append(index._add_junction(elem))
+                root.clear()
+            elif elem.tag == 'edge':
+                # Chỉ làn thường có vạch dừng; làn nội bộ vẫn được đánh chỉ mục hình dạng
+                to_junction = elem.get('to') if elem.get('function') is None else None
+                for lane in elem.findall('lane'):
+                    if lane.get('shape'):
+                        stop = index._add_lane(lane, to_junction, segments, segment_lane)
+                        if stop is not None:
+                            stops.append(stop)
+                root.clear()
+            elif elem.tag in ('connection', 'tlLogic', 'type', 'roundabout', 'location', 'request'):
+                root.clear()
+        index.junction_center = np.array(centers, dtype=np.float64).reshape(-1, 2)
+        index.lane_segments = np.array(segments, dtype=np.float64).reshape(-1, 4)
+        index.segment_lane = np.array(segment_lane, dtype=np.int64)
+        index.stop_xy = np.array(stops, dtype=np.float64).reshape(-1, 2)
+        return index
+
+    def junction_distance(self, junction_id, points):
+        """Distance from points (n, 2) to the junction polygon (0 inside it)."""
+        polygon = self.junction_polygons[self.junction_index[junction_id]]
+        if len(points) == 0:
+            return np.empty(0)
+        closed = np.vstack([polygon, polygon[:1]])
+        dist = segment_distance(points, _segments(closed)).min(axis=1)
+        dist[inside_polygon(points, polygon)] = 0.0
+        return dist
+
+    def junctions_near(self, x, y, radius):
+        """[(junction_id, distance)] within radius of (x, y), nearest first."""
+        candidates = self.junction_grid.query(x - radius, y - radius, x + radius, y + radius)
+        point = np.array([[x, y]])
+        found = [(self.junction_ids[i], float(self.junction_distance(self.junction_ids[i], point)[0]))
+                 for i in candidates]
+        return sorted((item for item in found if item[1] <= radius), key=lambda item: item[1])
+
+    def lanes_near(self, x, y, radius):
+        """[(lane_id, distance)] of lanes whose shape passes within radius of (x, y), nearest first."""
+        candidates = np.fromiter(self.lane_grid.query(x - radius, y - radius, x + radius, y + radius), dtype=np.int64)
+        if len(candidates) == 0:
+            return []
+        dist = segment_distance(np.array([[x, y]]), self.lane_segments[candidates])[0]
+        best = {}
+        for lane, d in zip(self.segment_lane[candidates].tolist(), dist.tolist()):
+            if d <= radius and d < best.get(lane, np.inf):
+                best[lane] = d
+        return sorted(((self.lane_ids[lane], d) for lane, d in best.items()), key=lambda item: item[1])
+
+    def nearest_stop_line(self, x, y, max_distance=None, junction_id=None):
+        """
+        (lane_id, junction_id, distance) of the closest stop line to (x, y), optionally
+        only those of one junction, or None. Rings of cells are searched outwards and the
+        search stops once no unvisited cell can hold anything closer.
+        """
+        cs = self.cell_size
+        cx, cy = int(np.floor(x / cs)), int(np.floor(y / cs))
+        max_ring = int(np.ceil(max_distance / cs)) + 1 if max_distance is not None else None
+        cells = self.stop_grid.cells
+        if not cells:
+            return None
+        if max_ring is None:
+            keys = np.array(list(cells))
+            max_ring = int(np.abs(keys - (cx, cy)).max())
+        best, best_dist = None, np.inf if max_distance is None else float(max_distance)
+        for ring in range(max_ring + 1):
+            # Mọi ô ngoài vòng `ring` cách điểm ít nhất (ring - 1) * cs
+            if (ring - 1) * cs > best_dist:
+                break
+            for gx in range(cx - ring, cx + ring + 1):
+                for gy in range(cy - ring, cy + ring + 1):
+                    if max(abs(gx - cx), abs(gy - cy)) != ring:
+                        continue
+                    for i in cells.get((gx, gy), ()):
+                        if junction_id is not None and self.stop_junction[i] != junction_id:
+                            continue
+                        d = float(np.hypot(*(self.stop_xy[i] - (x, y))))
+                        if d <= best_dist:
+                            best, best_dist = i, d
+        if best is None:
+            return None
+        return self.stop_lane[best], self.stop_junction[best], best_dist
+
+    # ----------------------------------------------------------------- vehicle part
+
+    def clear_vehicles(self):
+        self.vehicle_ids = np.empty(0, dtype=object)
+        self.vehicle_xy = np.empty((0, 2))
+        self.vehicle_speed = np.empty(0)
+        self.vehicle_road = np.empty(0, dtype=object)
+        self.vehicle_cells = {}
+        self.time = None
+        self._subscribed = False
+
+    def update(self):
+        """
+        Refresh vehicle positions after a simulation step. Vehicles are subscribed once
+        when they depart; each step then costs one simulation and one vehicle subscription
+        read. Callers need not update every step: on the first call, and whenever the
+        clock has moved on by more than one step since the last update (departures of
+        the skipped steps are not reported), the running vehicles are re-synced against
+        vehicle.getIDList(). Repeated calls within the same step return immediately.
+        """
+        conn = self.conn
+        resync = not self._subscribed
+        if resync:
+            conn.simulation.subscribe([tc.VAR_TIME, tc.VAR_DEPARTED_VEHICLES_IDS])
+            self.step_length = conn.simulation.getDeltaT()
+            self._subscribed = True
+        sim = conn.simulation.getSubscriptionResults()
+        now = sim.get(tc.VAR_TIME)
+        if now is not None and now == self.time:
+            return self
+        if self.time is not None and (now is None or now - self.time > 1.5 * self.step_length):
+            resync = True
+        if resync:
+            known = set(self.vehicle_ids.tolist())
+            new = [veh_id for veh_id in conn.vehicle.getIDList() if veh_id not in known]
+        else:
+            new = sim.get(tc.VAR_DEPARTED_VEHICLES_IDS, ())
+        for veh_id in new:
+            conn.vehicle.subscribe(veh_id, VEHICLE_VARS)
+        results = conn.vehicle.getAllSubscriptionResults()
+        self.set_vehicles(
+            list(results),
+            [r.get(tc.VAR_POSITION, (np.nan, np.nan)) for r in results.values()],
+            [r.get(tc.VAR_SPEED, 0.0) for r in results.values()],
+            [r.get(tc.VAR_ROAD_ID, '') for r in results.values()])
+        self.time = now
+        return self
+
+    def set_vehicles(self, ids, positions, speeds=None, roads=None):
+        """Bucket vehicle positions into the grid (one sort, no per-vehicle work in Python)."""
+        n = len(ids)
+        self.vehicle_ids = np.array(ids, dtype=object).reshape(n)
+        self.vehicle_xy = np.asarray(positions, dtype=np.float64).reshape(n, 2)
+        self.vehicle_speed = np.zeros(n) if speeds is None else np.asarray(speeds, dtype=np.float64)
+        self.vehicle_road = np.array([''] * n if roads is None else roads, dtype=object).reshape(n)
+        self.vehicle_cells = {}
+        if n == 0:
+            return
+        cells = np.floor(np.nan_to_num(self.vehicle_xy, nan=np.inf, posinf=np.inf) / self.cell_size)
+        valid = np.isfinite(cells).all(axis=1)
+        cells = cells[valid].astype(np.int64)
+        rows = np.flatnonzero(valid)
+        order = np.lexsort((cells[:, 1], cells[:, 0]))
+        cells, rows = cells[order], rows[order]
+        change = np.flatnonzero(np.any(np.diff(cells, axis=0) != 0, axis=1)) + 1
+        starts = np.concatenate([[0], change])
+        ends = np.concatenate([change, [len(rows)]])
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            self.vehicle_cells[(int(cells[start, 0]), int(cells[start, 1]))] = rows[start:end]
+
+    def _vehicle_candidates(self, xmin, ymin, xmax, ymax):
+        cs = self.cell_size
+        chunks = [self.vehicle_cells.get((gx, gy))
+                  for gx in range(int(np.floor(xmin / cs)), int(np.floor(xmax / cs)) + 1)
+                  for gy in range(int(np.floor(ymin / cs)), int(np.floor(ymax / cs)) + 1)]
+        chunks = [c for c in chunks if c is not None]
+        return np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+
+    def vehicles_near(self, junction_ids=None, radius=CELL_SIZE, approaching_only=False):
+        """
+        {junction_id: (vehicle_ids, distances)} for vehicles within radius meters of each
+        junction polygon (all junctions by default). approaching_only keeps vehicles on
+        the junction's incoming edges or its internal lanes.
+        """
+        if junction_ids is None:
+            junction_ids = self.junction_ids
+        elif isinstance(junction_ids, str):
+            junction_ids = [junction_ids]
+        result = {}
+        for junction_id in junction_ids:
+            polygon = self.junction_polygons[self.junction_index[junction_id]]
+            (xmin, ymin), (xmax, ymax) = polygon.min(axis=0), polygon.max(axis=0)
+            rows = self._vehicle_candidates(xmin - radius, ymin - radius, xmax + radius, ymax + radius)
+            dist = self.junction_distance(junction_id, self.vehicle_xy[rows])
+            keep = dist <= radius
+            if approaching_only and keep.any():
+                incoming = self.junction_incoming[junction_id]
+                prefix = f":{junction_id}_"
+                keep &= np.array([road in incoming or road.startswith(prefix)
+                                  for road in self.vehicle_road[rows].tolist()], dtype=bool)
+            result[junction_id] = (self.vehicle_ids[rows[keep]], dist[keep])
+        return result
+
+    def vehicle_stop_line(self, veh_id, max_distance=None):
+        """nearest_stop_line() for a tracked vehicle, or None if it is not in the index."""
+        rows = np.flatnonzero(self.vehicle_ids == veh_id)
+        if len(rows) == 0:
+            return None
+        x, y = self.vehicle_xy[rows[0]]
+        return self.nearest_stop_line(x, y, max_distance)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a spatial index over a SUMO network and time queries")
+    parser.add_argument("net_file")
+    parser.add_argument("--cell-size", type=float, default=CELL_SIZE)
+    parser.add_argument("--radius", type=float, default=CELL_SIZE)
+    parser.add_argument("--vehicles", type=int, default=10000, help="Random vehicle positions for the benchmark")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    index = SpatialIndex.from_net(args.net_file, args.cell_size)
+    print(f"Indexed {len(index.junction_ids)} junctions, {len(index.lane_ids)} lanes, "
+          f"{len(index.stop_lane)} stop lines in {(time.perf_counter() - start) * 1000:.1f} ms")
+    rng = np.random.default_rng(0)
+    lo, hi = index.lane_segments[:, :2].min(axis=0), index.lane_segments[:, :2].max(axis=0)
+    positions = rng.uniform(lo, hi, size=(args.vehicles, 2))
+    start = time.perf_counter()
+    index.set_vehicles([f"veh{i}" for i in range(args.vehicles)], positions)
+    near = index.vehicles_near(radius=args.radius)
+    print(f"{args.vehicles} vehicles bucketed and queried around every junction in "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms "
+          f"({sum(len(ids) for ids, _ in near.values())} within {args.radius:g} m)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import os
+import csv
+import glob
+import time
+
+import numpy as np
+
+from dataset_io import read_dataset_csv
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_GLOB = os.path.join(BASE_DIR, "csv", "dataset*.csv")
+SWEEP_RESULTS = os.path.join("sweep_results", "sweep_results.csv")
+
+DATASET_FEATURES = ['greenTime', 'cycleTime']
+DATASET_TARGETS = ['queue', 'waitingTime']
+SWEEP_TARGETS = ['mean_wait', 'mean_queue']
+RIDGE = 1e-3
+DEGREE = 2
+
+
+class RidgeSurrogate:
+    """
+    Quadratic ridge regression (all pairwise products of the standardized
+    features). Fitting is one linear solve; predict() is a couple of matrix
+    products, so thousands of candidates take milliseconds.
+    """
+
+    def __init__(self, feature_names, target_names, degree=DEGREE, ridge=RIDGE):
+        self.feature_names = list(feature_names)
+        self.target_names = list(target_names)
+        self.degree = degree
+        self.ridge = ridge
+        n = len(self.feature_names)
+        self._pairs = np.triu_indices(n)
+
+    def _design(self, X):
+        Z = (np.asarray(X, dtype=np.float64) - self.mean) / self.scale
+        parts = [np.ones((len(Z), 1)), Z]
+        if self.degree >= 2:
+            parts.append(Z[:, self._pairs[0]] * Z[:, self._pairs[1]])
+        return np.hstack(parts)
+
+    def fit(self, X, Y):
+        X = np.asarray(X, dtype=np.float64)
+        Y = np.asarray(Y, dtype=np.float64).reshape(len(X), -1)
+        ok = np.isfinite(X).all(axis=1) & np.isfinite(Y).all(axis=1)
+        X, Y = X[ok], Y[ok]
+        self.mean = X.mean(axis=0)
+        self.scale = X.std(axis=0)
+        constant = [name for name, sd in zip(self.feature_names, self.scale) if sd == 0]
+        if constant:
+            # Đặc trưng hằng (vd. greenTime/cycleTime cố định trong log) -> mô hình chỉ còn là giá trị trung bình
+            raise ValueError(f"Features with zero variance cannot be learned: {', '.join(constant)}")
+        A = self._design(X)
+        reg = self.ridge * np.eye(A.shape[1])
+        reg[0, 0] = 0.0  # Không phạt hệ số chặn
+        self.coef = np.linalg.solve(A.T @ A + reg, A.T @ Y)
+        residual = Y - A @ self.coef
+        self.rmse = np.sqrt(np.mean(residual ** 2, axis=0))
+        self.n_samples = len(X)
+        return self
+
+    def predict(self, X):
+        return self._design(X) @ self.coef
+
+
+def fit_dataset_surrogates(paths=None, features=DATASET_FEATURES, targets=DATASET_TARGETS):
+    """
+    One surrogate per approach (edge) from csv/dataset*.csv style logs. The logs must
+    vary the features (e.g. exports from a scenario_batch / green_allocation sweep);
+    fixed-timing logs raise ValueError. Use fit_sweep_surrogate() for screening.
+    """
+    if paths is None:
+        paths = sorted(glob.glob(DATASET_GLOB))
+    samples = {}
+    for path in paths:
+        cols = read_dataset_csv(path)
+        edges = cols['edge'] if 'edge' in cols else np.full(len(cols['step']), os.path.basename(path), dtype=object)
+        X = np.stack([cols[f] for f in features], axis=1)
+        Y = np.stack([cols[t] for t in targets], axis=1)
+        for edge in np.unique(edges):
+            mask = edges == edge
+            samples.setdefault(edge, []).append((X[mask], Y[mask]))
+    models = {}
+    for edge, parts in samples.items():
+        X = np.vstack([p[0] for p in parts])
+        Y = np.vstack([p[1] for p in parts])
+        models[edge] = RidgeSurrogate(features, targets).fit(X, Y)
+    return models
+
+
+def load_sweep_results(path=SWEEP_RESULTS):
+    """Read param_sweep.py results; only completed runs are returned."""
+    with open(path, newline='') as f:
+        rows = [row for row in csv.DictReader(f) if row.get('status') == 'ok']
+    return rows
+
+
+def fit_sweep_surrogate(param_names, path=SWEEP_RESULTS, targets=SWEEP_TARGETS):
+    rows = load_sweep_results(path)
+    X = np.array([[float(row[name]) for name in param_names] for row in rows])
+    Y = np.array([[float(row[t]) if row[t] else np.nan for t in targets] for row in rows])
+    return RidgeSurrogate(param_names, targets).fit(X, Y)
+
+
+def sample_space(space, n, seed=0):
+    """Vectorized candidate sampling: list = discrete values, (low, high) = range (int if both ints)."""
+    rng = np.random.default_rng(seed)
+    columns = []
+    for dim in space.values():
+        if isinstance(dim, list):
+            columns.append(np.asarray(dim, dtype=np.float64)[rng.integers(len(dim), size=n)])
+        elif isinstance(dim[0], int) and isinstance(dim[1], int):
+            columns.append(rng.integers(dim[0], dim[1] + 1, size=n).astype(np.float64))
+        else:
+            columns.append(rng.uniform(dim[0], dim[1], size=n))
+    return np.stack(columns, axis=1)
+
+
+def screen(model, space, n_candidates=10000, top_k=5, objective=None, seed=0):
+    """
+    Predict KPIs for n_candidates random configurations and return the top_k
+    (lowest weighted objective) as parameter dicts, ready for param_sweep.run_sweep(candidates=...).
+    """
+    if objective is None:
+        objective = {model.target_names[0]: 1.0}
+    names = list(space)
+    X = sample_space(space, n_candidates, seed)
+    start = time.perf_counter()
+    Y = model.predict(X)
+    elapsed = (time.perf_counter() - start) * 1000
+    score = sum(w * Y[:, model.target_names.index(t)] for t, w in objective.items())
+    best = np.argsort(score)[:top_k]
+    print(f"Screened {n_candidates} candidates in {elapsed:.1f} ms")
+    candidates = []
+    for i in best:
+        params = {}
+        for j, name in enumerate(names):
+            dim = space[name]
+            value = X[i, j]
+            if isinstance(dim, list):
+                value = dim[int(np.argmin(np.abs(np.asarray(dim, dtype=np.float64) - value)))]
+            elif isinstance(dim[0], int) and isinstance(dim[1], int):
+                value = int(value)
+            else:
+                value = float(value)
+            params[name] = value
+        candidates.append({'params': params,
+                           'predicted': dict(zip(model.target_names, Y[i].tolist()))})
+    return candidates
+
+
+if __name__ == "__main__":
+    try:
+        models = fit_dataset_surrogates()
+    except ValueError as e:
+        print(f"⚠️  Dataset surrogate skipped: {e}")
+        models = {}
+    for edge, model in models.items():
+        print(f"{edge}: {model.n_samples} samples, RMSE " +
+              ", ".join(f"{t}={e:.2f}" for t, e in zip(model.target_names, model.rmse)))
+    if os.path.exists(SWEEP_RESULTS):
+        from param_sweep import EXAMPLE_SPACE
+        sweep_model = fit_sweep_surrogate(list(EXAMPLE_SPACE))
+        for c in screen(sweep_model, EXAMPLE_SPACE):
+            print(c)
@@ -0,0 +1,97 @@
+import os
+import csv
+import time
+import queue
+import threading
+from datetime import datetime
+
+TELEMETRY_DIR = "telemetry"
+CHUNK_SIZE = 1000       # Số dòng mỗi lần ghi xuống đĩa
+FLUSH_INTERVAL = 5.0    # Giây; ghi phần còn lại nếu chunk chưa đầy để vẫn theo dõi được khi chạy chậm
+
+
+class TelemetryWriter:
+    """
+    Streams training scalars to two append-only CSV logs:
+      <run>_steps.csv     one row per simulation step
+      <run>_episodes.csv  one row per episode
+    log_step()/log_episode() only put a dict on a queue; a background thread
+    writes rows in chunks of chunk_size (or every FLUSH_INTERVAL seconds), so
+    the training loop never waits on disk and keeps no per-step history.
+    Render the logs with telemetry_view.py.
+    """
+
+    def __init__(self, log_dir=TELEMETRY_DIR, run_name=None, chunk_size=CHUNK_SIZE,
+                 flush_interval=FLUSH_INTERVAL):
+        os.makedirs(log_dir, exist_ok=True)
+        if run_name is None:
+            run_name = datetime.now().strftime("run_%Y%m%d_%H%M%S")
+        self.run_name = run_name
+        self.paths = {
+            'step': os.path.join(log_dir, f"{run_name}_steps.csv"),
+            'episode': os.path.join(log_dir, f"{run_name}_episodes.csv"),
+        }
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+        self._thread.start()
+
+    def log_step(self, **scalars):
+        self._queue.put(('step', scalars))
+
+    def log_episode(self, **scalars):
+        self._queue.put(('episode', scalars))
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write_chunk(self, kind, rows, headers):
+        path = self.paths[kind]
+        if kind not in headers:
+            if os.path.exists(path) and os.path.getsize(path) > 0:
+                # Ghi nối tiếp: dùng lại header của file đã có
+                with open(path, newline='') as f:
+                    headers[kind] = next(csv.reader(f))
+            else:
+                headers[kind] = list(rows[0].keys())
+                with open(path, 'w', newline='') as f:
+                    csv.writer(f).writerow(headers[kind])
+        with open(path, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=headers[kind], restval='', extrasaction='ignore')
+            writer.writerows(rows)
+
+    def _run(self):
+        buffers = {'step': [], 'episode': []}
+        headers = {}
+        closing = False
+        last_flush = time.monotonic()
+        while not closing:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = False
+            if item is None:
+                closing = True
+            elif item:
+                kind, scalars = item
+                buffers[kind].append(scalars)
+                if (len(buffers[kind]) < self.chunk_size
+                        and time.monotonic() - last_flush < self.flush_interval):
+                    continue
+            # Chunk đầy, quá FLUSH_INTERVAL hoặc đang đóng: ghi mọi buffer còn dữ liệu
+            last_flush = time.monotonic()
+            for kind, rows in buffers.items():
+                if rows:
+                    try:
+                        self._write_chunk(kind, rows, headers)
+                    except OSError as e:
+                        print(f"Telemetry write error ({self.paths[kind]}): {e}")
+                    buffers[kind] = []
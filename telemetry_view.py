@@ -0,0 +1,98 @@
+import os
+import sys
+import csv
+import glob
+import argparse
+
+import numpy as np
+
+from telemetry import TELEMETRY_DIR
+from plotting import downsample
+
+MAX_POINTS = 5000  # Số điểm tối đa vẽ cho mỗi chuỗi theo bước
+
+
+def load_log(path):
+    """Read a telemetry CSV into a dict of float columns (non-numeric cells become NaN)."""
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        rows = list(reader)
+    columns = {}
+    for i, name in enumerate(header):
+        values = np.empty(len(rows))
+        for j, row in enumerate(rows):
+            try:
+                values[j] = float(row[i])
+            except (ValueError, IndexError):
+                values[j] = np.nan
+        columns[name] = values
+    return columns
+
+
+def latest_run(log_dir):
+    runs = sorted(glob.glob(os.path.join(log_dir, "*_episodes.csv")) +
+                  glob.glob(os.path.join(log_dir, "*_steps.csv")), key=os.path.getmtime)
+    if not runs:
+        return None
+    return os.path.basename(runs[-1]).rsplit('_', 1)[0]
+
+
+def render(log_dir, run_name, output=None, show=False):
+    import matplotlib
+    if not show:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    panels = []
+    episode_path = os.path.join(log_dir, f"{run_name}_episodes.csv")
+    step_path = os.path.join(log_dir, f"{run_name}_steps.csv")
+    if os.path.exists(episode_path):
+        episodes = load_log(episode_path)
+        x = episodes.get('episode', np.arange(len(next(iter(episodes.values()), []))))
+        panels += [('Episode', x, name, values) for name, values in episodes.items() if name != 'episode']
+    if os.path.exists(step_path):
+        steps = load_log(step_path)
+        n = len(next(iter(steps.values()), []))
+        series = {name: values for name, values in steps.items() if name not in ('episode', 'step')}
+        # LTTB giữ các đỉnh của chuỗi dài thay vì lấy mẫu cách đều
+        for name, values in series.items():
+            x, reduced = downsample(np.arange(n), {name: values}, MAX_POINTS)
+            panels.append(('Step (all episodes)', x, name, reduced[name]))
+    if not panels:
+        print(f"Không tìm thấy dữ liệu telemetry cho '{run_name}' trong {log_dir}")
+        return None
+
+    fig, axes = plt.subplots(len(panels), 1, figsize=(12, 3 * len(panels)), squeeze=False)
+    for ax, (xlabel, x, name, values) in zip(axes[:, 0], panels):
+        ax.plot(x, values, linewidth=1)
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel(name)
+        ax.grid(True)
+    fig.suptitle(run_name)
+    plt.tight_layout()
+    if output is None:
+        output = os.path.join(log_dir, f"{run_name}.png")
+    fig.savefig(output)
+    print(f"Saved telemetry plot to {output}")
+    if show:
+        plt.show()
+    plt.close(fig)
+    return output
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render plots from a telemetry log")
+    parser.add_argument('run', nargs='?', help="run name (default: most recent run in the log directory)")
+    parser.add_argument('--log-dir', default=TELEMETRY_DIR)
+    parser.add_argument('--output', help="PNG file to write")
+    parser.add_argument('--show', action='store_true', help="also open an interactive window")
+    args = parser.parse_args(argv)
+    run_name = args.run or latest_run(args.log_dir)
+    if run_name is None:
+        sys.exit(f"Không có log telemetry nào trong {args.log_dir}")
+    render(args.log_dir, run_name, args.output, args.show)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+In-memory stand-in for a TraCI connection: two traffic lights with two incoming
+lanes each and fixed lane values, plus vehicles added with depart(). Counts every
+call so tests can check the number of round trips a sample costs.
+"""
+from collections import Counter, namedtuple
+
+from traci import constants as tc
+
+Phase = namedtuple('Phase', 'duration state')
+
+
+class Logic:
+    def __init__(self, program_id, phases):
+        self.programID = program_id
+        self.phases = phases
+
+    def getPhases(self):
+        return self.phases
+
+
+class _Domain:
+    def __init__(self, conn, name):
+        self._conn = conn
+        self._name = name
+
+    def _call(self, method):
+        self._conn.calls[f"{self._name}.{method}"] += 1
+
+
+class _Simulation(_Domain):
+    def getTime(self):
+        self._call('getTime')
+        return self._conn.time
+
+    def getDeltaT(self):
+        self._call('getDeltaT')
+        return 1.0
+
+    def subscribe(self, variables):
+        self._call('subscribe')
+        self._conn.sim_subscription = list(variables)
+
+    def getSubscriptionResults(self):
+        self._call('getSubscriptionResults')
+        values = {tc.VAR_TIME: self._conn.time, tc.VAR_DEPARTED_VEHICLES_IDS: list(self._conn.departed)}
+        return {v: values[v] for v in self._conn.sim_subscription}
+
+    def getMinExpectedNumber(self):
+        self._call('getMinExpectedNumber')
+        return 1
+
+    def saveState(self, path):
+        self._call('saveState')
+        with open(path, 'w') as f:
+            f.write(str(self._conn.time))
+
+    def loadState(self, path):
+        self._call('loadState')
+        with open(path) as f:
+            self._conn.time = float(f.read())
+
+
+class _Lane(_Domain):
+    def subscribe(self, lane_id, variables):
+        self._call('subscribe')
+        self._conn.lane_subscriptions[lane_id] = list(variables)
+
+    def getLength(self, lane_id):
+        self._call('getLength')
+        return 100.0
+
+    def getEdgeID(self, lane_id):
+        self._call('getEdgeID')
+        return lane_id.rsplit('_', 1)[0]
+
+    def getAllSubscriptionResults(self):
+        self._call('getAllSubscriptionResults')
+        values = {tc.LAST_STEP_VEHICLE_HALTING_NUMBER: 2, tc.VAR_WAITING_TIME: 12.5,
+                  tc.LAST_STEP_MEAN_SPEED: 3.0, tc.LAST_STEP_VEHICLE_NUMBER: 5}
+        return {lane: {v: values[v] for v in variables}
+                for lane, variables in self._conn.lane_subscriptions.items()}
+
+
+class _TrafficLight(_Domain):
+    def getIDList(self):
+        self._call('getIDList')
+        return list(self._conn.logics)
+
+    def getControlledLanes(self, tls_id):
+        self._call('getControlledLanes')
+        return [f"{tls_id}_in{i}_0" for i in range(2) for _ in range(2)]
+
+    def subscribe(self, tls_id, variables):
+        self._call('subscribe')
+        self._conn.tls_subscriptions[tls_id] = list(variables)
+
+    def getSubscriptionResults(self, tls_id):
+        self._call('getSubscriptionResults')
+        return self.getAllSubscriptionResults().get(tls_id, {})
+
+    def getAllSubscriptionResults(self):
+        self._call('getAllSubscriptionResults')
+        return {tls_id: {tc.TL_CURRENT_PROGRAM: self._conn.programs[tls_id]}
+                for tls_id in self._conn.tls_subscriptions}
+
+    def getProgram(self, tls_id):
+        self._call('getProgram')
+        return self._conn.programs[tls_id]
+
+    def getAllProgramLogics(self, tls_id):
+        self._call('getAllProgramLogics')
+        return self._conn.logics[tls_id]
+
+
+class _Vehicle(_Domain):
+    def getIDList(self):
+        self._call('getIDList')
+        return list(self._conn.vehicles)
+
+    def subscribe(self, veh_id, variables):
+        self._call('subscribe')
+        self._conn.vehicle_subscriptions[veh_id] = list(variables)
+
+    def getAllSubscriptionResults(self):
+        self._call('getAllSubscriptionResults')
+        results = {}
+        for veh_id, variables in self._conn.vehicle_subscriptions.items():
+            if veh_id in self._conn.vehicles:
+                x, y, road = self._conn.vehicles[veh_id]
+                values = {tc.VAR_POSITION: (x, y), tc.VAR_SPEED: 5.0, tc.VAR_ROAD_ID: road}
+                results[veh_id] = {v: values[v] for v in variables}
+        return results
+
+
+class StubConnection:
+    def __init__(self, tls_ids=('A', 'B')):
+        self.calls = Counter()
+        self.time = 0.0
+        self.lane_subscriptions = {}
+        self.tls_subscriptions = {}
+        self.sim_subscription = []
+        self.vehicles = {}
+        self.departed = []
+        self.vehicle_subscriptions = {}
+        self.programs = {tls_id: '0' for tls_id in tls_ids}
+        self.logics = {tls_id: [Logic('0', [Phase(30.0, 'GGrr'), Phase(3.0, 'yyrr'),
+                                            Phase(30.0, 'rrGG'), Phase(3.0, 'rryy')])]
+                       for tls_id in tls_ids}
+        self.simulation = _Simulation(self, 'simulation')
+        self.lane = _Lane(self, 'lane')
+        self.trafficlight = _TrafficLight(self, 'trafficlight')
+        self.vehicle = _Vehicle(self, 'vehicle')
+
+    def depart(self, veh_id, x, y, road=''):
+        """Insert a vehicle in the current step (reported in that step's departed list)."""
+        self.vehicles[veh_id] = (x, y, road)
+        self.departed.append(veh_id)
+
+    def simulationStep(self):
+        self.calls['simulationStep'] += 1
+        self.time += 1.0
+        self.departed = []
+
+    def close(self):
+        self.calls['close'] += 1
@@ -0,0 +1,70 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if 'SUMO_HOME' not in os.environ:
+    pytest.skip("SUMO_HOME is not set", allow_module_level=True)
+pytest.importorskip("traci")
+
+from dataset_io import load_columnar
+from dataset_exporter import NETWORK_HEADER, ExportCheckpoint, NetworkExporter, PlanStatsCache, open_writer
+from stub_sumo import Logic, Phase, StubConnection
+
+
+def test_network_exporter_samples_and_checkpoints(tmp_path):
+    conn = StubConnection()
+    writer = open_writer(str(tmp_path / "samples"), 'columnar', header=NETWORK_HEADER)
+    exporter = NetworkExporter(writer, sample_interval=1, conn=conn)
+    assert exporter.writers == {'network': writer}
+    assert len(exporter.lanes) == 4
+
+    exporter.sample(0)
+    checkpoint = ExportCheckpoint(str(tmp_path / "checkpoint"))
+    checkpoint.save(1, exporter.writers, conn)
+    assert checkpoint.load()['positions'] == {'network': {'rows': 4}}
+
+    conn.simulationStep()
+    exporter.sample(1)
+    exporter.close()
+    data = load_columnar(str(tmp_path / "samples.cols"))
+    assert len(data) == 8
+    assert data.strings('lane_id', [0])[0] == 'A_in0_0'
+    assert list(data['greenTime'][:2]) == [30.0, 30.0]
+
+
+def test_plan_stats_fetch_the_logic_only_when_the_program_changes():
+    conn = StubConnection()
+    plans = PlanStatsCache(conn)
+    plans.watch('A')
+    for _ in range(3):
+        assert plans.get('A')['cycle'] == 66.0
+    assert conn.calls['trafficlight.getAllProgramLogics'] == 1
+
+    conn.logics['A'].append(Logic('night', [Phase(50.0, 'GGrr'), Phase(50.0, 'rrGG')]))
+    conn.programs['A'] = 'night'
+    assert plans.get('A')['cycle'] == 100.0
+    assert conn.calls['trafficlight.getAllProgramLogics'] == 2
+
+    # Same program, new logic (setProgramLogic): only seen after invalidate()
+    conn.logics['A'][1] = Logic('night', [Phase(40.0, 'GGrr'), Phase(40.0, 'rrGG')])
+    assert plans.get('A')['cycle'] == 100.0
+    plans.invalidate('A')
+    assert plans.get('A')['cycle'] == 80.0
+    assert plans.lane_times('A', 'A_in0_0') == (40.0, 40.0, 80.0)
+
+
+def test_network_sample_cost_does_not_grow_with_lights(tmp_path):
+    conn = StubConnection(tls_ids=[f"T{i}" for i in range(41)])
+    writer = open_writer(str(tmp_path / "samples"), 'csv', header=NETWORK_HEADER)
+    exporter = NetworkExporter(writer, sample_interval=1, conn=conn)
+    exporter.sample(0)
+    conn.calls.clear()
+    for step in range(1, 4):
+        conn.simulationStep()
+        exporter.sample(step)
+    exporter.close()
+    assert conn.calls == {'simulationStep': 3, 'simulation.getTime': 3, 'lane.getAllSubscriptionResults': 3,
+                          'trafficlight.getAllSubscriptionResults': 3}
@@ -0,0 +1,61 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataset_io import HEADER, INDEX_FILE, LEGACY_HEADER, BufferedSampleWriter, ColumnarWriter
+from dataset_store import DatasetStore
+
+
+def write_rows(path, queue, append=False):
+    writer = ColumnarWriter(path, header=HEADER, append=append)
+    for step, q in enumerate(queue):
+        writer.write((step * 30, "E1", "E1_0", q, 0.0, 1.0, 0.1, 0, 30.0, 60.0, 90.0))
+    writer.close()
+
+
+def test_index_rebuilt_when_data_rewritten_with_same_row_count(tmp_path):
+    path = str(tmp_path / "dataset.cols")
+    write_rows(path, [1, 2, 3, 4])
+    assert list(DatasetStore(path).query(where={'queue': (3, None)})['queue']) == [3, 4]
+
+    # Same number of rows, different values: the old min/max chunks would skip every row
+    write_rows(path, [10, 20, 30, 40])
+    store = DatasetStore(path)
+    assert list(store.query(where={'queue': (30, None)})['queue']) == [30, 40]
+    assert list(store.tail(1, value="E1")['queue']) == [40]
+
+
+def test_truncating_writer_drops_index(tmp_path):
+    path = str(tmp_path / "dataset.cols")
+    write_rows(path, [1, 2])
+    DatasetStore(path)
+    assert os.path.exists(os.path.join(path, INDEX_FILE))
+    ColumnarWriter(path, header=HEADER).close()
+    assert not os.path.exists(os.path.join(path, INDEX_FILE))
+
+
+def test_index_reused_when_data_unchanged(tmp_path):
+    path = str(tmp_path / "dataset.cols")
+    write_rows(path, [1, 2, 3])
+    first = DatasetStore(path).index
+    mtime = os.stat(os.path.join(path, INDEX_FILE)).st_mtime_ns
+    second = DatasetStore(path).index
+    assert os.stat(os.path.join(path, INDEX_FILE)).st_mtime_ns == mtime
+    assert np.array_equal(first['order_edge'], second['order_edge'])
+
+
+def test_legacy_per_direction_file_is_one_edge(tmp_path):
+    path = str(tmp_path / "dataset1.csv")
+    writer = BufferedSampleWriter(path, header=LEGACY_HEADER)
+    for step, q in enumerate([1, 5, 2, 7]):
+        writer.write((step * 30, q, 10.0 * q, 1.5, 0.05, 3, 84.0, 90.0, 90.0))
+    writer.close()
+
+    store = DatasetStore(path)
+    assert list(store.values('edge')) == ["dataset1.csv"]
+    assert list(store.query(edges="dataset1.csv", where={'queue': (5, None)})['step']) == [30, 90]
+    assert list(store.tail(2, value="dataset1.csv")['queue']) == [2, 7]
+    assert list(DatasetStore(path, edge="E1-3").tail(1, value="E1-3")['waitingTime']) == [70.0]
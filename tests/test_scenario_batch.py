@@ -0,0 +1,54 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if 'SUMO_HOME' not in os.environ:
+    pytest.skip("SUMO_HOME is not set", allow_module_level=True)
+traci = pytest.importorskip("traci")
+
+import scenario_batch
+from dataset_io import load_columnar
+from stub_sumo import StubConnection
+
+SUMO_CFG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dataset.sumocfg")
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    """Route the module-level traci calls of scenario_batch / dataset_exporter to a stub."""
+    conn = StubConnection()
+    monkeypatch.setattr(traci, 'start', lambda cmd, **kwargs: None)
+    monkeypatch.setattr(traci, 'close', conn.close)
+    monkeypatch.setattr(traci, 'simulationStep', conn.simulationStep)
+    for domain in ('simulation', 'lane', 'trafficlight'):
+        monkeypatch.setattr(traci, domain, getattr(conn, domain))
+    return conn
+
+
+def test_run_scenario_exports_all_lanes(conn, tmp_path):
+    scenario = scenario_batch.expand_variants(duration=10, sample_interval=5)[0]
+    scenario, result = scenario_batch._run_task((SUMO_CFG, scenario, str(tmp_path)))
+    assert result['status'] == 'ok'
+    assert result['lanes'] == 4 and result['steps'] == 10
+    data = load_columnar(str(tmp_path / scenario['name'] / "samples.cols"))
+    assert len(data) == result['rows'] == 8
+    assert conn.calls['close'] == 1
+
+
+def test_run_scenario_closes_writer_on_error(conn, monkeypatch, tmp_path):
+    opened = []
+    open_writer = scenario_batch.open_writer
+    monkeypatch.setattr(scenario_batch, 'open_writer',
+                        lambda *args, **kwargs: opened.append(open_writer(*args, **kwargs)) or opened[-1])
+
+    def fail():
+        raise RuntimeError("connection lost")
+    monkeypatch.setattr(conn.lane, 'getAllSubscriptionResults', fail)
+    scenario = scenario_batch.expand_variants(duration=10, fmt='csv')[0]
+    _, result = scenario_batch._run_task((SUMO_CFG, scenario, str(tmp_path)))
+    assert result['status'] == 'error: connection lost'
+    assert opened[0].file.closed
+    assert conn.calls['close'] == 1
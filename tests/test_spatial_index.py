@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("traci")
+
+from spatial_index import SpatialIndex
+from stub_sumo import StubConnection
+
+
+def test_update_tracks_vehicles_that_departed_between_updates():
+    conn = StubConnection()
+    index = SpatialIndex(conn=conn)
+    conn.simulationStep()
+    conn.depart('a', 10.0, 10.0)
+    assert index.update().vehicle_ids.tolist() == ['a']
+
+    conn.simulationStep()
+    conn.depart('b', 20.0, 20.0)
+    assert sorted(index.update().vehicle_ids.tolist()) == ['a', 'b']
+
+    # No update() on steps 3 and 4: 'c', departed on step 3, must still be there on step 5
+    for step in range(3, 6):
+        conn.simulationStep()
+        if step == 3:
+            conn.depart('c', 30.0, 30.0)
+    assert sorted(index.update().vehicle_ids.tolist()) == ['a', 'b', 'c']
+
+
+def test_consecutive_updates_do_not_list_all_vehicles():
+    conn = StubConnection()
+    index = SpatialIndex(conn=conn)
+    conn.simulationStep()
+    index.update()
+    for step in range(5):
+        conn.simulationStep()
+        conn.depart(f"v{step}", 5.0 * step, 0.0)
+        index.update()
+    assert conn.calls['vehicle.getIDList'] == 1
+    assert len(index.vehicle_ids) == 5
@@ -0,0 +1,301 @@
+import os
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# light_control2 đã thêm SUMO_HOME/tools vào sys.path khi được import
+import light_control2 as lc
+import traci
+from vehicle_registry import VehicleRegistry
+
+SUMO_HEADLESS_BINARY = os.path.join(os.environ['SUMO_HOME'], 'bin', 'sumo')
+OBS_SIZE = 4  # ns_queue, ew_queue, density, is_ns_green
+DECISION_INTERVAL = 5  # Số bước mô phỏng tối thiểu giữa hai quyết định khi huấn luyện
+
+
+class TrafficSignalEnv:
+    """
+    Single-intersection environment around the Q-learning controller in light_control2.py.
+
+    backend='traci' talks to SUMO through a named TraCI connection (traci.getConnection(label)),
+    so several instances can live in one process. backend='libsumo' runs SUMO in-process and
+    therefore allows only one instance per process (see VecTrafficEnv workers).
+
+    step(action) applies the action only when the current green has lasted MIN_PHASE_DURATION
+    and no yellow is running, exactly like the training loop in light_control2.main().
+
+    decision_interval=None keeps that one-step-per-second behaviour. With an integer k the
+    env frame-skips: it advances at least k steps and then on until the action can take
+    effect again, so yellow and minimum-green steps never build an observation. The reward
+    is discounted within the skip (sum of gamma**i * r_i) and info['frames'] tells the
+    learner to bootstrap with gamma**frames. Only the frame the next decision is taken on
+    uses the per-vehicle get_reward(); skipped frames use lc.get_aggregate_reward(), which
+    reads detector/lane aggregates only. Its waiting term is the lanes' current total
+    waiting time (unweighted, not accumulated), so it is smaller than get_reward()'s and
+    a frame-skipped return is not on the same scale as a per-step one (separate Q-tables).
+    """
+
+    def __init__(self, sumo_cfg=lc.SUMO_CFG, label="default", backend='traci',
+                 sumo_binary=SUMO_HEADLESS_BINARY, max_step=lc.MAX_STEP, seed=None,
+                 decision_interval=None):
+        self.sumo_cfg = sumo_cfg
+        self.decision_interval = decision_interval
+        self.label = label
+        self.backend = backend
+        self.sumo_binary = sumo_binary
+        self.max_step = max_step
+        self.seed = seed
+        self.conn = None
+        self.registry = None
+
+    def _start(self):
+        sumo_cmd = [self.sumo_binary, "-c", self.sumo_cfg, "--no-step-log", "true"]
+        if self.seed is not None:
+            sumo_cmd += ["--seed", str(self.seed)]
+        if self.backend == 'libsumo':
+            import libsumo
+            libsumo.start(sumo_cmd)
+            self.conn = libsumo
+        else:
+            traci.start(sumo_cmd, label=self.label)
+            self.conn = traci.getConnection(self.label)
+        self.registry = VehicleRegistry(lc.WEIGHT_MAP, conn=self.conn)
+        self.detector_lanes = lc.detector_lanes(self.conn)
+
+    def reset(self):
+        self.close()
+        self._start()
+        self.step_count = 0
+        self.phase_duration = 0
+        self.in_yellow = False
+        self.yellow_timer = 0
+        self.current_phase = lc.GREEN_PHASE_1
+        self.action = 0
+        self.conn.trafficlight.setPhase(lc.TLS_ID, lc.GREEN_PHASE_1)
+        return np.array(lc.get_state(self.conn), dtype=np.int64)
+
+    def _apply_action(self, action):
+        """Chuyển pha theo action nếu được phép; trả về True khi action được chấp nhận."""
+        if self.in_yellow or self.phase_duration < lc.MIN_PHASE_DURATION:
+            return False
+        self.action = int(action)
+        target_phase = lc.GREEN_PHASE_1 if self.action == 0 else lc.GREEN_PHASE_2
+        if target_phase != self.current_phase:
+            yellow_phase = lc.YELLOW_PHASE_1 if self.current_phase == lc.GREEN_PHASE_1 else lc.YELLOW_PHASE_2
+            self.conn.trafficlight.setPhase(lc.TLS_ID, yellow_phase)
+            self.in_yellow = True
+            self.yellow_timer = 0
+        return True
+
+    def _advance(self):
+        """Cập nhật bộ đếm vàng/xanh rồi chạy một bước mô phỏng."""
+        if self.in_yellow:
+            self.yellow_timer += 1
+            if self.yellow_timer >= lc.YELLOW_DURATION:
+                self.current_phase = lc.GREEN_PHASE_1 if self.action == 0 else lc.GREEN_PHASE_2
+                self.conn.trafficlight.setPhase(lc.TLS_ID, self.current_phase)
+                self.in_yellow = False
+                self.phase_duration = 0
+        else:
+            self.phase_duration += 1
+        self.conn.simulationStep()
+        self.registry.update()
+        self.step_count += 1
+
+    def _is_done(self):
+        return self.conn.simulation.getMinExpectedNumber() <= 0 or self.step_count >= self.max_step
+
+    def _can_decide(self):
+        return not self.in_yellow and self.phase_duration >= lc.MIN_PHASE_DURATION
+
+    def step(self, action):
+        decision = self._apply_action(action)
+        if self.decision_interval is None:
+            self._advance()
+            reward = lc.get_reward(self.conn, self.registry)
+            done = self._is_done()
+            frames = 1
+        else:
+            reward = 0.0
+            frames = 0
+            while True:
+                self._advance()
+                frames += 1
+                done = self._is_done()
+                last = done or (frames >= self.decision_interval and self._can_decide())
+                if last:
+                    frame_reward = lc.get_reward(self.conn, self.registry)
+                else:
+                    # Bước bị bỏ qua: chỉ giá trị tổng hợp, không truy vấn từng xe
+                    frame_reward = lc.get_aggregate_reward(self.conn, self.detector_lanes)
+                reward += lc.gamma ** (frames - 1) * frame_reward
+                if last:
+                    break
+        obs = np.array(lc.get_state(self.conn), dtype=np.int64)
+        info = {'decision': decision, 'step': self.step_count, 'frames': frames}
+        return obs, reward, done, info
+
+    def close(self):
+        if self.conn is None:
+            return
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+        self.conn = None
+
+
+def _env_worker(remote, env_kwargs):
+    """Tiến trình con cho backend libsumo: mỗi tiến trình giữ một SUMO."""
+    env = TrafficSignalEnv(**env_kwargs)
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == 'step':
+                remote.send(env.step(data))
+            elif cmd == 'reset':
+                remote.send(env.reset())
+            elif cmd == 'close':
+                break
+    finally:
+        env.close()
+        remote.close()
+
+
+class VecTrafficEnv:
+    """
+    K independent SUMO instances stepped together.
+    reset() returns an (K, OBS_SIZE) int array; step(actions) returns stacked
+    observations, rewards (K,), dones (K,) and a list of info dicts.
+    Finished instances are reset automatically; their last observation is kept in
+    info['final_observation'].
+
+    backend='traci' steps named connections from a thread pool (TraCI waits on sockets,
+    so the SUMO processes run concurrently). backend='libsumo' uses one worker process
+    per instance.
+    """
+
+    def __init__(self, num_envs, sumo_cfg=lc.SUMO_CFG, backend='traci',
+                 sumo_binary=SUMO_HEADLESS_BINARY, max_step=lc.MAX_STEP, seeds=None,
+                 decision_interval=None):
+        self.num_envs = num_envs
+        self.backend = backend
+        if seeds is None:
+            seeds = list(range(num_envs))
+        env_kwargs = [
+            dict(sumo_cfg=sumo_cfg, label=f"vec{i}", backend=backend,
+                 sumo_binary=sumo_binary, max_step=max_step, seed=seeds[i],
+                 decision_interval=decision_interval)
+            for i in range(num_envs)
+        ]
+        if backend == 'libsumo':
+            ctx = mp.get_context('spawn')
+            self.remotes, self.processes = [], []
+            for kwargs in env_kwargs:
+                remote, worker_remote = ctx.Pipe()
+                proc = ctx.Process(target=_env_worker, args=(worker_remote, kwargs), daemon=True)
+                proc.start()
+                worker_remote.close()
+                self.remotes.append(remote)
+                self.processes.append(proc)
+        else:
+            self.envs = [TrafficSignalEnv(**kwargs) for kwargs in env_kwargs]
+            self.pool = ThreadPoolExecutor(max_workers=num_envs)
+
+    def _call_all(self, cmd, args):
+        if self.backend == 'libsumo':
+            for remote, arg in zip(self.remotes, args):
+                remote.send((cmd, arg))
+            return [remote.recv() for remote in self.remotes]
+        if cmd == 'reset':
+            return list(self.pool.map(lambda env: env.reset(), self.envs))
+        return list(self.pool.map(lambda pair: pair[0].step(pair[1]), zip(self.envs, args)))
+
+    def _reset_one(self, i):
+        if self.backend == 'libsumo':
+            self.remotes[i].send(('reset', None))
+            return self.remotes[i].recv()
+        return self.envs[i].reset()
+
+    def reset(self):
+        return np.stack(self._call_all('reset', [None] * self.num_envs))
+
+    def step(self, actions):
+        results = self._call_all('step', list(np.asarray(actions)))
+        obs, rewards, dones, infos = zip(*results)
+        obs = list(obs)
+        for i, done in enumerate(dones):
+            if done:
+                infos[i]['final_observation'] = obs[i]
+                obs[i] = self._reset_one(i)
+        return (np.stack(obs), np.asarray(rewards, dtype=np.float64),
+                np.asarray(dones, dtype=bool), list(infos))
+
+    def close(self):
+        if self.backend == 'libsumo':
+            for remote in self.remotes:
+                remote.send(('close', None))
+            for proc in self.processes:
+                proc.join()
+        else:
+            for env in self.envs:
+                env.close()
+            self.pool.shutdown()
+
+
+def train_vectorized(num_envs=4, episodes=lc.EPISODES, backend='traci',
+                     decision_interval=DECISION_INTERVAL):
+    """
+    Q-learning over num_envs SUMO instances with batched action selection and updates.
+    decision_interval=None trains on every simulation step, like light_control2.main().
+    Multi-step decisions are updated as an SMDP (bootstrap discounted by gamma**frames)
+    and saved to their own Q-table, since their values are not comparable with the
+    per-step table.
+    """
+    results_dir = "q_learning_results"
+    os.makedirs(results_dir, exist_ok=True)
+    if decision_interval in (None, 1):
+        qtable_file = os.path.join(results_dir, "qtable_traffic.npy")
+    else:
+        qtable_file = os.path.join(results_dir, f"qtable_traffic_k{decision_interval}.npy")
+    n_actions = 2
+    try:
+        Q = np.load(qtable_file)
+        print(f"Loaded previous Q-table from {qtable_file}")
+    except:
+        Q = np.zeros(lc.STATE_SPACE + (n_actions,))
+        print("Created new Q-table")
+
+    venv = VecTrafficEnv(num_envs, backend=backend, decision_interval=decision_interval)
+    current_epsilon = lc.epsilon
+    try:
+        states = venv.reset()
+        finished = 0
+        episode_rewards = np.zeros(num_envs)
+        while finished < episodes:
+            actions = lc.choose_actions(states, Q, n_actions, current_epsilon)
+            next_states, rewards, dones, infos = venv.step(actions)
+            decisions = np.array([info['decision'] for info in infos])
+            # Với môi trường vừa kết thúc, dùng quan sát cuối thay vì quan sát sau reset
+            bootstrap = next_states.copy()
+            for i in np.flatnonzero(dones):
+                bootstrap[i] = infos[i]['final_observation']
+            discounts = lc.gamma ** np.array([info['frames'] for info in infos], dtype=np.float64)
+            lc.update_q_batch(Q, states, actions, rewards, bootstrap, mask=decisions, discounts=discounts)
+            episode_rewards += rewards
+            for i in np.flatnonzero(dones):
+                finished += 1
+                print(f"Episode {finished}/{episodes} (env {i}) reward: {episode_rewards[i]:.2f}, epsilon: {current_epsilon:.3f}")
+                episode_rewards[i] = 0
+                current_epsilon = max(lc.epsilon_min, current_epsilon * lc.epsilon_decay)
+                np.save(qtable_file, Q)
+            states = next_states
+    finally:
+        venv.close()
+    np.save(qtable_file, Q)
+    print(f"Saved Q-table to {qtable_file}")
+
+
+if __name__ == "__main__":
+    train_vectorized()
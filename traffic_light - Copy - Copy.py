@@ -2,10 +2,11 @@ import os
 import sys
 import traci
 import numpy as np
-import matplotlib.pyplot as plt
 from collections import defaultdict
 import time
 
+from plotting import pyplot, submit, downsample
+
 # Thêm SUMO vào đường dẫn Python
 if 'SUMO_HOME' in os.environ:
     tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
@@ -596,7 +597,7 @@ def run_global_lane_simulation():
             
         # Call the new plotting function if data was collected
         if tracking_data['time']:
-            plot_congestion_graph(tracking_data)
+            submit(plot_congestion_graph, tracking_data)  # Vẽ trong tiến trình nền
         
         try:
             traci.close()
@@ -609,11 +610,12 @@ def plot_congestion_graph(tracking_data):
     This function is designed to replicate the style of the user-provided image.
     """
     try:
+        plt = pyplot()
         plt.style.use('default')
         fig, ax = plt.subplots(figsize=(16, 8))
 
-        time = tracking_data['time']
-        statuses = tracking_data['direction_statuses']
+        # Giảm mẫu LTTB: giữ hình dạng đường cong với tối đa MAX_POINTS điểm mỗi hướng
+        time, statuses = downsample(tracking_data['time'], tracking_data['direction_statuses'])
         
         # Plot data for each direction
         ax.plot(time, statuses['North'], color='blue', linewidth=2, label='Hướng Bắc')
@@ -628,7 +630,7 @@ def plot_congestion_graph(tracking_data):
         # Find the max value from all statuses to set a proper upper y-limit
         max_y = 0
         for direction in statuses:
-            if statuses[direction]:
+            if len(statuses[direction]):
                 max_y = max(max_y, max(statuses[direction]))
         # Set y-axis limit with some padding, ensuring it's at least 3.0 like the image
         ax.set_ylim(bottom=0, top=max(max_y * 1.1, 2.0))
@@ -643,7 +645,7 @@ def plot_congestion_graph(tracking_data):
         ax.set_ylabel('Chỉ Số Tắc Nghẽn', fontsize=12)
 
         # X-axis limit
-        if time:
+        if len(time):
             ax.set_xlim(left=0, right=max(time))
 
         # Grid style
@@ -672,14 +674,13 @@ def plot_congestion_graph(tracking_data):
 
         plt.tight_layout(rect=[0, 0.01, 1, 0.97]) # Adjust layout to prevent elements from overlapping
         
-        # Save and show the plot
+        # Save the plot
         from datetime import datetime
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f'traffic_congestion_status_{timestamp}.png'
         plt.savefig(filename, dpi=150)
+        plt.close(fig)
         print(f"📊 Đã lưu biểu đồ trạng thái tắc nghẽn: '{filename}'")
-        
-        plt.show()
 
     except Exception as e:
         print(f"❌ Lỗi khi vẽ biểu đồ tắc nghẽn: {e}")
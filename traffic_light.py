@@ -2,10 +2,12 @@ import os
 import sys
 import traci
 import numpy as np
-import matplotlib.pyplot as plt
 from collections import defaultdict
 import time
 
+from plotting import pyplot, submit, downsample
+from spatial_index import SpatialIndex
+
 # Thêm SUMO vào đường dẫn Python
 if 'SUMO_HOME' in os.environ:
     tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
@@ -21,6 +23,9 @@ YELLOW_TIME = 7      # Thời gian đèn vàng
 COOLDOWN_PERIOD = 10 # Thời gian làm mát sau khi thay đổi pha
 THRESHOLD = 0.7      # Ngưỡng cho trạng thái được coi là "TỐT"
 JUNCTION_CLEARING_DISTANCE = 30  # Khoảng cách kiểm tra phương tiện tại nút giao
+NET_FILE = r"C:\Users\Admin\Downloads\sumo test\New folder\dataset.net.xml"
+
+_spatial_index = None
 
 def start_sumo():
     """Khởi động SUMO"""
@@ -212,8 +217,22 @@ def is_safe_to_change_phase(direction_detectors, junction_id='E3'):
         
     return True
 
+def get_spatial_index():
+    """Chỉ mục không gian của mạng lưới (tạo một lần từ NET_FILE), None nếu không có file"""
+    global _spatial_index
+    if _spatial_index is None and os.path.exists(NET_FILE):
+        _spatial_index = SpatialIndex.from_net(NET_FILE)
+    return _spatial_index
+
 def get_vehicles_in_junction(junction_id):
     """Lấy tất cả các xe hiện đang ở trong hoặc gần giao lộ"""
+    index = get_spatial_index()
+    if index is not None and junction_id in index.junction_index:
+        # Xe trong bán kính JUNCTION_CLEARING_DISTANCE quanh giao lộ, đang đi vào hoặc ở bên trong
+        index.update()
+        vehicle_ids, _ = index.vehicles_near(junction_id, JUNCTION_CLEARING_DISTANCE, approaching_only=True)[junction_id]
+        return vehicle_ids.tolist()
+
     junction_vehicles = []
     
     # Lấy tất cả các xe trong mô phỏng
@@ -270,7 +289,10 @@ def wait_for_junction_clearing(junction_id='E3', max_wait=3):
     return wait_steps
 
 def plot_traffic_status(status_data, threshold):
-    """Vẽ biểu đồ trạng thái giao thông so với ngưỡng"""
+    """Vẽ biểu đồ trạng thái giao thông so với ngưỡng (giảm mẫu LTTB, lưu ra file)"""
+    plt = pyplot()
+    time_axis, series = downsample(status_data['time'], {d: status_data[d] for d in ['North', 'South', 'East', 'West']})
+    status_data = dict(series, time=time_axis)
     plt.figure(figsize=(15, 10))
     
     # Vẽ biểu đồ trạng thái giao thông vs ngưỡng
@@ -286,7 +308,7 @@ def plot_traffic_status(status_data, threshold):
     # Thêm vùng màu để thể hiện trạng thái TỐT/XẤU
     max_status = 0
     for d in ['North', 'South', 'East', 'West']:
-        if status_data[d]:  # Kiểm tra danh sách không rỗng
+        if len(status_data[d]):  # Kiểm tra danh sách không rỗng
             max_status = max(max_status, max(status_data[d]))
     
     plt.fill_between(status_data['time'], threshold, max_status * 1.1, 
@@ -302,8 +324,8 @@ def plot_traffic_status(status_data, threshold):
     
     plt.tight_layout()
     plt.savefig('trang_thai_giao_thong.png', dpi=150)
+    plt.close()
     print("Đã lưu biểu đồ dưới dạng 'trang_thai_giao_thong.png'")
-    plt.show()
 
 def run_simulation():
     """Chạy mô phỏng"""
@@ -493,8 +515,8 @@ def run_simulation():
         dir_name = direction_names[direction]
         print(f"Hướng {dir_name}: Chờ TB = {avg_wait:.2f}s, Hàng đợi TB = {avg_queue_lengths[direction]:.2f}")
     
-    # Tạo biểu đồ
-    plot_traffic_status(status_data, THRESHOLD)
+    # Tạo biểu đồ trong tiến trình nền, không chặn mô phỏng
+    submit(plot_traffic_status, status_data, THRESHOLD)
 
     traci.close()
 
@@ -3,6 +3,8 @@ import sys
 import traci
 import numpy as np
 
+from network_model import load_network
+
 # ====== SUMO PATH SETUP ======
 # This section ensures that the SUMO tools are available in the Python path.
 if 'SUMO_HOME' in os.environ:
@@ -12,6 +14,10 @@ else:
     sys.exit("Vui lòng khai báo biến môi trường 'SUMO_HOME'")
 
 # ====== CONFIGURATION ======
+SUMO_CFG = r"C:\Users\Admin\Downloads\sumo test\New folder\20 node\20e.sumocfg"
+# Bộ dò E2 cho mạng của SUMO_CFG (20e.net.xml), nạp qua --additional-files
+DETECTOR_FILE = r"C:\Users\Admin\Downloads\sumo test\New folder\20 node\20e.det.add.xml"
+
 # Define minimum and maximum values for signal phases and cycles.
 MIN_GREEN_TIME = 15         # Minimum green phase duration (seconds)
 MAX_GREEN_TIME = 120        # Maximum green phase duration (seconds)
@@ -34,21 +40,34 @@ def start_sumo():
     If the file does not exist, exit with an error.
     """
     sumoBinary = os.path.join(os.environ['SUMO_HOME'], 'bin/sumo-gui')
-    sumo_config_path = r"C:\Users\Admin\Downloads\sumo test\New folder\20 node\20e.sumocfg"
+    sumo_config_path = SUMO_CFG
     if not os.path.exists(sumo_config_path):
         print(f"Lỗi: Không tìm thấy file cấu hình SUMO tại '{sumo_config_path}'")
         sys.exit(1)
     sumoCmd = [sumoBinary, '-c', sumo_config_path, '--step-length', '0.1']
+    if os.path.exists(DETECTOR_FILE):
+        sumoCmd += ['--additional-files', DETECTOR_FILE]
     traci.start(sumoCmd)
 
-def auto_detect_intersection_structure():
+def auto_detect_intersection_structure(sumo_cfg=SUMO_CFG, detector_file=DETECTOR_FILE):
     """
     Automatically detect all traffic lights and their approaches in the SUMO network.
     Returns a dictionary with per-traffic-light information.
+    When the scenario files are available, the structure comes from the compiled
+    network model (network_model.py, cached by file hash) without any TraCI calls.
     """
+    if sumo_cfg and os.path.exists(sumo_cfg):
+        additional = [detector_file] if detector_file and os.path.exists(detector_file) else []
+        return load_network(sumocfg=sumo_cfg, additional_files=additional).intersection_data()
+
     tl_ids = traci.trafficlight.getIDList()
-    detector_ids = traci.lanearea.getIDList()
-    lane_ids = traci.lane.getIDList()
+    # Làn của mỗi bộ dò chỉ cần hỏi một lần, không lặp lại cho từng đèn
+    detector_lanes = {}
+    for detector_id in traci.lanearea.getIDList():
+        try:
+            detector_lanes[detector_id] = traci.lanearea.getLaneID(detector_id)
+        except:
+            continue
     intersection_data = {}
 
     for tl_id in tl_ids:
@@ -58,13 +77,9 @@ def auto_detect_intersection_structure():
         lane_to_detector = {}
 
         # Map detectors to lanes if detectors exist in the SUMO network
-        for detector_id in detector_ids:
-            try:
-                detector_lane = traci.lanearea.getLaneID(detector_id)
-                if detector_lane in controlled_lanes:
-                    lane_to_detector[detector_lane] = detector_id
-            except:
-                continue
+        for detector_id, detector_lane in detector_lanes.items():
+            if detector_lane in controlled_lanes:
+                lane_to_detector[detector_lane] = detector_id
 
         # Group controlled lanes into approaches by edge
         for lane_id in set(controlled_lanes):
@@ -104,40 +119,36 @@ def get_traffic_parameters(lane_id, detector_id=None, api_data=None):
         # Real-time/API mode: expect api_data as a dict keyed by lane_id
         return api_data.get(lane_id, {'l': 0, 'td': 0, 'm': 0, 'v': 0, 'g': 0, 'raw_count': 0})
     try:
-        if detector_id and detector_id in traci.lanearea.getIDList():
-            # Use detector data if available
-            l = traci.lanearea.getJamLengthVehicle(detector_id)
-            m = traci.lanearea.getLastStepOccupancy(detector_id) / 100.0
-            vehicle_ids = traci.lanearea.getLastStepVehicleIDs(detector_id)
-            vehicle_count = len(vehicle_ids)
-            wait_times = []
-            velocities = []
-            for veh_id in vehicle_ids:
-                try:
-                    wait_times.append(traci.vehicle.getWaitingTime(veh_id))
-                    velocities.append(traci.vehicle.getSpeed(veh_id))
-                except:
-                    continue
-            td = np.mean(wait_times) if wait_times else 0.0
-            v = np.mean(velocities) if velocities else 0.0
-            g = vehicle_count * 3600 / EVAL_INTERVAL if vehicle_count > 0 else 0.0
-        else:
-            # Fallback: use full lane data
-            vehicle_ids = traci.lane.getLastStepVehicleIDs(lane_id)
-            vehicle_count = len(vehicle_ids)
-            l = vehicle_count
-            m = traci.lane.getLastStepOccupancy(lane_id) / 100.0
-            wait_times = []
-            velocities = []
-            for veh_id in vehicle_ids:
-                try:
-                    wait_times.append(traci.vehicle.getWaitingTime(veh_id))
-                    velocities.append(traci.vehicle.getSpeed(veh_id))
-                except:
-                    continue
-            td = np.mean(wait_times) if wait_times else 0.0
-            v = np.mean(velocities) if velocities else 0.0
-            g = vehicle_count * 3600 / EVAL_INTERVAL if vehicle_count > 0 else 0.0
+        if detector_id:
+            # Detector aggregates: a fixed number of calls per lane, none per vehicle
+            try:
+                vehicle_count = traci.lanearea.getLastStepVehicleNumber(detector_id)
+                l = traci.lanearea.getJamLengthVehicle(detector_id)
+                m = traci.lanearea.getLastStepOccupancy(detector_id) / 100.0
+                v = max(traci.lanearea.getLastStepMeanSpeed(detector_id), 0.0)
+                lane_count = traci.lane.getLastStepVehicleNumber(lane_id)
+                td = traci.lane.getWaitingTime(lane_id) / lane_count if lane_count else 0.0
+                g = vehicle_count * 3600 / EVAL_INTERVAL if vehicle_count > 0 else 0.0
+                return {'l': l, 'td': td, 'm': m, 'v': v, 'g': g, 'raw_count': vehicle_count}
+            except traci.TraCIException:
+                # Detector not loaded in this simulation: use the lane data below
+                pass
+        # Fallback: use full lane data
+        vehicle_ids = traci.lane.getLastStepVehicleIDs(lane_id)
+        vehicle_count = len(vehicle_ids)
+        l = vehicle_count
+        m = traci.lane.getLastStepOccupancy(lane_id) / 100.0
+        wait_times = []
+        velocities = []
+        for veh_id in vehicle_ids:
+            try:
+                wait_times.append(traci.vehicle.getWaitingTime(veh_id))
+                velocities.append(traci.vehicle.getSpeed(veh_id))
+            except:
+                continue
+        td = np.mean(wait_times) if wait_times else 0.0
+        v = np.mean(velocities) if velocities else 0.0
+        g = vehicle_count * 3600 / EVAL_INTERVAL if vehicle_count > 0 else 0.0
         return {'l': l, 'td': td, 'm': m, 'v': v, 'g': g, 'raw_count': vehicle_count}
     except Exception as e:
         print(f"⚠️  Lỗi khi lấy tham số từ {lane_id}: {e}")
@@ -280,10 +291,8 @@ def evaluate_intersection_status(intersection_data, tl_id):
     intersection = intersection_data[tl_id]
     for approach_name, approach_data in intersection['approaches'].items():
         approach_statuses = []
-        for i, lane_id in enumerate(approach_data['lanes']):
-            detector_id = None
-            if i < len(approach_data['detectors']):
-                detector_id = approach_data['detectors'][i]
+        for lane_id in approach_data['lanes']:
+            detector_id = intersection.get('lane_to_detector', {}).get(lane_id)
             traffic_params = get_traffic_parameters(lane_id, detector_id)
             lane_status = calculate_status_t(traffic_params)
             approach_statuses.append(lane_status)
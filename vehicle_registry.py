@@ -0,0 +1,78 @@
+import traci
+
+
+class VehicleRegistry:
+    """
+    Cache of immutable per-vehicle attributes (type, vClass, route, weight).
+    Each vehicle is queried once when it appears in getDepartedIDList() and
+    evicted when it appears in getArrivedIDList(), so lookups afterwards are
+    a dict access with no TraCI traffic.
+
+    Call update() once after every simulationStep().
+    """
+
+    def __init__(self, weight_map=None, default_weight=1, conn=None):
+        self.weight_map = weight_map or {}
+        self.default_weight = default_weight
+        # conn: traci module (default) or a named connection from traci.getConnection()
+        self.conn = conn if conn is not None else traci
+        self.vehicles = {}
+
+    def _fetch(self, veh_id):
+        veh_type = self.conn.vehicle.getTypeID(veh_id)
+        entry = {
+            'type': veh_type,
+            'vclass': self.conn.vehicle.getVehicleClass(veh_id),
+            'route': self.conn.vehicle.getRouteID(veh_id),
+            'weight': self.weight_map.get(veh_type, self.default_weight),
+        }
+        self.vehicles[veh_id] = entry
+        return entry
+
+    def update(self):
+        """Register vehicles that departed and evict those that arrived in the last step."""
+        for veh_id in self.conn.simulation.getDepartedIDList():
+            try:
+                self._fetch(veh_id)
+            except traci.exceptions.TraCIException:
+                continue  # Xe đã rời mạng ngay trong bước này
+        for veh_id in self.conn.simulation.getArrivedIDList():
+            self.vehicles.pop(veh_id, None)
+
+    def get(self, veh_id):
+        """
+        Return the static attribute dict for a vehicle.
+        Vehicles that were already running before the registry started are
+        fetched lazily on first access.
+        """
+        entry = self.vehicles.get(veh_id)
+        if entry is None:
+            entry = self._fetch(veh_id)
+        return entry
+
+    def weight(self, veh_id):
+        entry = self.vehicles.get(veh_id)
+        if entry is not None:
+            return entry['weight']
+        try:
+            return self._fetch(veh_id)['weight']
+        except traci.exceptions.TraCIException:
+            return self.default_weight
+
+    def type_of(self, veh_id):
+        return self.get(veh_id)['type']
+
+    def vclass_of(self, veh_id):
+        return self.get(veh_id)['vclass']
+
+    def route_of(self, veh_id):
+        return self.get(veh_id)['route']
+
+    def clear(self):
+        self.vehicles.clear()
+
+    def __contains__(self, veh_id):
+        return veh_id in self.vehicles
+
+    def __len__(self):
+        return len(self.vehicles)